@@ -0,0 +1,126 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+ACCESS_FIELDS = ("ip", "method", "path", "route", "status", "latency_ms", "user_id")
+
+# Queued by close(): the writer thread finishes the batch in hand and exits.
+STOP = object()
+
+
+# ------------------- JSON Lines Formatter -------------------------
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, message and any access-log fields on the record."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for field in ACCESS_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, separators=(",", ":"))
+
+
+# ------------------- Queued File Handler -------------------------
+class QueuedRotatingFileHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background thread instead of writing on the caller's thread.
+
+    The thread drains up to ``batch_size`` records at a time, formats them and
+    writes the batch with a single write and flush to a size-rotated file.
+    Each process writes its own file (``<name>.<pid><ext>``) so gunicorn
+    workers never rotate a file out from under each other.
+    """
+
+    def __init__(self, filename, maxBytes=50 * 1024 * 1024, backupCount=5, batch_size=500, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.base_filename = filename
+        self.max_bytes = maxBytes
+        self.backup_count = backupCount
+        self.batch_size = batch_size
+        self._writer = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread; keep the request path to a queue put.
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging; drop the record under overload.
+            pass
+
+    def _start(self):
+        # Started lazily (and again after fork) so preloaded masters don't own the thread.
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            root, ext = os.path.splitext(self.base_filename)
+            os.makedirs(os.path.dirname(root) or ".", exist_ok=True)
+            self._writer = logging.handlers.RotatingFileHandler(
+                f"{root}.{os.getpid()}{ext}",
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+            self._writer.setFormatter(self.formatter)
+            self._thread = threading.Thread(target=self._drain, name="access-log-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _drain(self):
+        while True:
+            batch, stopping = [self.queue.get()], False
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if STOP in batch:
+                batch, stopping = [record for record in batch if record is not STOP], True
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        writer = self._writer
+        writer.acquire()
+        try:
+            for record in batch:
+                line = writer.format(record) + writer.terminator
+                if writer.stream is None:
+                    writer.stream = writer._open()
+                if self.max_bytes and writer.stream.tell() + len(line) >= self.max_bytes:
+                    writer.doRollover()
+                    writer.stream = writer.stream or writer._open()
+                writer.stream.write(line)
+            writer.stream.flush()
+        except Exception:
+            writer.handleError(batch[-1])
+        finally:
+            writer.release()
+
+    def close(self):
+        """Write what's queued, stop the writer thread and close the file."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            # Blocks if the queue is full, but only until the writer makes room.
+            self.queue.put(STOP)
+            self._thread.join()
+            self._writer.close()
+        super().close()
@@ -4,4 +4,6 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
-    
\ No newline at end of file
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,213 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import login, realtime, replicas, response_cache
+from .authentication import CachedJWTAuthentication, aget_user
+from .instrumentation import count
+from .models import Project
+from .views import NotificationViewSet, ProjectViewSet, TaskViewSet, TimelineViewSet
+
+
+async def aauthenticate(request):
+    """Resolve the bearer token's user through the auth cache. Returns None when no token is sent."""
+    auth = CachedJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    return await aget_user(auth.get_validated_token(raw_token))
+
+
+def error_response(exc):
+    # Same body shape as DRF's exception handler: field errors as-is, otherwise {"detail": ...}.
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return JsonResponse(data, status=exc.status_code, safe=False)
+
+
+# ------------------- Async List Views -------------------------
+class AsyncListView(View):
+    """
+    Native async ``list`` for a read-heavy viewset.
+
+    The wrapped viewset still owns the queryset, serializer, pagination and
+    response-cache scopes; only the I/O (auth lookup, cache and page fetch)
+    is awaited instead of blocking a worker thread. Other methods on the same
+    URL (e.g. ``POST`` to create) are handed to the synchronous viewset.
+    """
+    viewset_class = None
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+        except APIException as exc:
+            return error_response(exc)
+        if user is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+                headers={"WWW-Authenticate": 'Bearer realm="api"'},
+            )
+
+        request.user = user
+        drf_request = Request(request)
+        drf_request.user = user
+        viewset = self.viewset_class(
+            request=drf_request, args=args, kwargs=kwargs, format_kwarg=None, action="list"
+        )
+        viewset.basename = self.basename
+        # The viewset's permission classes only look at the request and user
+        # (no queries), so they're safe to run inline here.
+        try:
+            viewset.check_permissions(drf_request)
+        except APIException as exc:
+            return error_response(exc)
+
+        scopes = None
+        if response_cache.get_config()["ENABLED"] and hasattr(viewset, "get_cache_scopes"):
+            scopes = viewset.get_cache_scopes(drf_request)
+        if not scopes:
+            return await self.render(viewset, drf_request, replica=await replicas.achoose_replica(user))
+
+        key, etag = response_cache.fingerprint(
+            self.basename, drf_request, scopes, await response_cache.aget_versions(scopes)
+        )
+        if etag in request.headers.get("If-None-Match", ""):
+            count("cache_not_modified")
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        cache = response_cache.get_cache()
+        data = await cache.aget(key)
+        if data is not None:
+            count("cache_hit")
+            response = JsonResponse(data)
+        else:
+            count("cache_miss")
+            response = await self.render(viewset, drf_request)
+            if response.status_code == status.HTTP_200_OK:
+                await cache.aset(key, response.data, timeout=response_cache.get_config()["TIMEOUT"])
+        response["ETag"] = etag
+        return response
+
+    async def render(self, viewset, drf_request, replica=None):
+        # Cache misses stay on the primary, as in CachedListMixin.
+        token = replicas.route_reads(replica)
+        try:
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            page = await viewset.paginator.apaginate_queryset(queryset, drf_request, view=viewset)
+            if page is None:
+                data = viewset.get_serializer([obj async for obj in queryset], many=True).data
+            else:
+                data = viewset.paginator.get_paginated_data(viewset.get_serializer(page, many=True).data)
+        except APIException as exc:
+            return error_response(exc)
+        finally:
+            replicas.end_routing(token)
+
+        response = JsonResponse(data, safe=False)
+        response.data = data
+        return response
+
+
+class AsyncListCreateView(AsyncListView):
+    async def post(self, request, *args, **kwargs):
+        view = self.viewset_class.as_view({"get": "list", "post": "create"}, basename=self.basename)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+
+class AsyncProjectListView(AsyncListCreateView):
+    viewset_class = ProjectViewSet
+    basename = "project"
+
+
+class AsyncTaskListView(AsyncListCreateView):
+    viewset_class = TaskViewSet
+    basename = "task"
+
+
+class AsyncTimelineListView(AsyncListView):
+    viewset_class = TimelineViewSet
+    basename = "timeline"
+
+
+class AsyncNotificationListView(AsyncListView):
+    viewset_class = NotificationViewSet
+    basename = "notifications"
+
+
+# ------------------- Async Login -------------------------
+class AsyncLoginView(View):
+    """
+    ``UserViewSet.login`` as a native async view. The password hash is
+    awaited on the login hash pool, so a burst of logins never holds the one
+    thread Django runs synchronous views on under ASGI.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        drf_request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+        try:
+            data = drf_request.data
+        except APIException as exc:
+            return error_response(exc)
+
+        try:
+            user = await login.averify(request, data.get("email"), data.get("password"))
+        except login.LoginBusy as exc:
+            return JsonResponse(
+                {"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"}
+            )
+
+        if user is None:
+            return JsonResponse({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        return JsonResponse(await sync_to_async(login.issue_tokens)(user))
+
+
+# ------------------- Notification Stream -------------------------
+class NotificationStreamView(View):
+    """
+    ``GET /api/notifications/stream/``: server-sent events pushing the user's
+    new notifications and the timeline events of their projects (or of the
+    ``?project=`` ids given), so clients stop polling the list endpoints.
+    Reconnects resume from ``Last-Event-ID``. Browsers, whose ``EventSource``
+    can't send the bearer token, pass a ``?ticket=`` from
+    ``POST /api/notifications/stream/ticket/`` instead.
+    """
+
+    async def get(self, request):
+        try:
+            user = await aauthenticate(request)
+            if user is None and request.GET.get("ticket"):
+                user = await realtime.aredeem_ticket(request.GET["ticket"])
+        except APIException as exc:
+            return error_response(exc)
+        if user is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        try:
+            requested = [int(pk) for pk in request.GET.getlist("project")]
+        except ValueError:
+            return JsonResponse({"detail": "Invalid project id."}, status=status.HTTP_400_BAD_REQUEST)
+        projects = Project.objects.filter(owner=user)
+        if requested:
+            projects = projects.filter(id__in=requested)
+        project_ids = [pk async for pk in projects.values_list("id", flat=True)]
+
+        cursor = realtime.StreamCursor.parse(
+            request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+        )
+        response = StreamingHttpResponse(
+            realtime.event_stream(user, project_ids, cursor), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Tell nginx not to buffer the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from redis import RedisError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION_CLAIM = "ver"
+# What requests read off request.user. Other fields are deferred, so touching
+# one still works; it just costs the query this cache exists to avoid.
+CACHED_FIELDS = ("id", "email", "role", "is_active", "is_staff", "is_superuser", "token_version")
+# Left in Redis by ``forget_user`` in place of an invalidated entry, see FORGET_SECONDS.
+FORGOTTEN = "forgotten"
+
+
+def get_config():
+    return {
+        "ENABLED": True,
+        # Per-process LRU in front of Redis. Another process's change to a
+        # user reaches this one within LOCAL_TTL seconds.
+        "LOCAL_SIZE": 10_000,
+        "LOCAL_TTL": 5,
+        "TTL": 300,
+        # How long an invalidated entry stays blocked from being refilled. A
+        # request that read the user from the database just before the change
+        # committed would otherwise cache what it read after forget_user ran.
+        # Keep it above the slowest gap between a miss's query and its fill.
+        "FORGET_SECONDS": 30,
+        "CACHE_ALIAS": "default",
+        **getattr(settings, "AUTH_CACHE", {}),
+    }
+
+
+def cache_key(user_id, version):
+    return f"auth:user:{user_id}:{version}"
+
+
+# ------------------- Local LRU -------------------------
+class LocalUserCache:
+    """Thread-safe LRU of user fields by ``(user_id, token version)``; entries expire after ``ttl`` seconds."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, fields = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return fields
+
+    def set(self, key, fields):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def get_local_cache():
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                config = get_config()
+                _local = LocalUserCache(config["LOCAL_SIZE"], config["LOCAL_TTL"])
+    return _local
+
+
+# ------------------- User Resolution -------------------------
+def user_fields(user_id, version):
+    """
+    ``CACHED_FIELDS`` of the user a token names, from the local LRU, then
+    Redis, then the users table. None if there's no such user.
+
+    A miss is filled with ``add``, so it can't overwrite the marker
+    ``forget_user`` leaves behind, and a miss on that marker isn't cached at
+    all. If Redis is unreachable the users table answers.
+    """
+    config = get_config()
+    users = get_user_model().objects.filter(pk=user_id).values(*CACHED_FIELDS)
+    if not config["ENABLED"]:
+        return users.first()
+    local, key = get_local_cache(), (str(user_id), version)
+    fields = local.get(key)
+    if fields is not None:
+        count("auth_cache_local_hit")
+        return fields
+
+    cache = caches[config["CACHE_ALIAS"]]
+    try:
+        cached = cache.get(cache_key(*key))
+        if cached is None or cached == FORGOTTEN:
+            count("auth_cache_miss")
+            fields = users.first()
+            if fields is None or cached == FORGOTTEN or not cache.add(cache_key(*key), fields, timeout=config["TTL"]):
+                return fields
+        else:
+            count("auth_cache_hit")
+            fields = cached
+    except RedisError:
+        count("auth_cache_redis_error")
+        logger.warning("User lookup fell back to the database", exc_info=True)
+        return users.first()
+    local.set(key, fields)
+    return fields
+
+
+async def auser_fields(user_id, version):
+    config = get_config()
+    users = get_user_model().objects.filter(pk=user_id).values(*CACHED_FIELDS)
+    if not config["ENABLED"]:
+        return await users.afirst()
+    local, key = get_local_cache(), (str(user_id), version)
+    fields = local.get(key)
+    if fields is not None:
+        count("auth_cache_local_hit")
+        return fields
+
+    cache = caches[config["CACHE_ALIAS"]]
+    try:
+        cached = await cache.aget(cache_key(*key))
+        if cached is None or cached == FORGOTTEN:
+            count("auth_cache_miss")
+            fields = await users.afirst()
+            if fields is None or cached == FORGOTTEN or not await cache.aadd(
+                cache_key(*key), fields, timeout=config["TTL"]
+            ):
+                return fields
+        else:
+            count("auth_cache_hit")
+            fields = cached
+    except RedisError:
+        count("auth_cache_redis_error")
+        logger.warning("User lookup fell back to the database", exc_info=True)
+        return await users.afirst()
+    local.set(key, fields)
+    return fields
+
+
+def token_identity(validated_token):
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError as exc:
+        raise InvalidToken("Token contained no recognizable user identification") from exc
+    # Tokens issued before versioning carry no claim; they belong to version 0.
+    return user_id, validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+
+def build_user(fields, version):
+    """A ``User`` (other fields deferred) from cached ``fields``, after the same checks as ``JWTAuthentication``."""
+    if fields is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not fields["is_active"]:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    if fields["token_version"] != version:
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+    User = get_user_model()
+    # from_db takes the values of a partial row in model field order.
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+    return User.from_db(User.objects.db, names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that resolves the token's user from a short-lived
+    per-process LRU and Redis instead of a users-table query per request.
+
+    Entries are keyed by user id and the token's version claim, and dropped
+    whenever the user is saved or deleted (``forget_user``). Deactivating a
+    user bumps ``User.token_version``, so tokens issued before then stop
+    resolving.
+    """
+
+    def get_user(self, validated_token):
+        user_id, version = token_identity(validated_token)
+        return build_user(user_fields(user_id, version), version)
+
+
+async def aget_user(validated_token):
+    """``CachedJWTAuthentication.get_user`` for native async views."""
+    user_id, version = token_identity(validated_token)
+    return build_user(await auser_fields(user_id, version), version)
+
+
+# ------------------- Invalidation -------------------------
+def forget_user(user_id, version):
+    """
+    Drop cached entries for ``user_id`` at ``version`` and the one before it
+    (tokens issued before a bump still look up the old key), once the
+    current transaction commits. The Redis entries are replaced by a
+    ``FORGOTTEN`` marker for ``FORGET_SECONDS`` rather than deleted, so an
+    in-flight miss can't put back what it read before the change.
+    """
+    def forget():
+        config = get_config()
+        keys = [(str(user_id), v) for v in (version, version - 1) if v >= 0]
+        get_local_cache().discard(*keys)
+        try:
+            caches[config["CACHE_ALIAS"]].set_many(
+                {cache_key(*key): FORGOTTEN for key in keys}, timeout=config["FORGET_SECONDS"]
+            )
+        except RedisError:
+            logger.warning("Could not invalidate cached user %s", user_id, exc_info=True)
+
+    transaction.on_commit(forget)
@@ -0,0 +1,230 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import realtime, response_cache
+from .models import Project, TimelineEvent
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------- Synchronous Sink -------------------------
+class SyncEventSink:
+    """Writes every timeline event inline with the request that produced it."""
+
+    def emit(self, event):
+        event.save()
+
+    def emit_many(self, events):
+        events = TimelineEvent.objects.bulk_record(events)
+        response_cache.bump("project", *(event.project_id for event in events))
+        transaction.on_commit(lambda: realtime.publish_timeline_events(events))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ------------------- Buffered Sink -------------------------
+class BufferedEventSink:
+    """
+    Write-behind sink that buffers timeline events in process memory.
+
+    Events are queued once the surrounding transaction commits and written
+    with a single ``bulk_create`` when ``batch_size`` events are pending or
+    ``flush_interval`` seconds have passed. Batches that cannot be written are
+    appended to a JSON-lines spool file and replayed on a later flush (or by
+    the ``flush_timeline_events`` command), so a database hiccup never drops
+    events or fails the request.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, spool_path=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def emit(self, event):
+        self.emit_many([event])
+
+    def emit_many(self, events):
+        events = list(events)
+        if events:
+            transaction.on_commit(lambda: self._enqueue(events))
+
+    def _enqueue(self, events):
+        self._ensure_started()
+        with self._lock:
+            self._buffer.extend(events)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timeline-event-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Timeline event sink flush crashed")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                try:
+                    TimelineEvent.objects.bulk_record(chunk)
+                except DatabaseError:
+                    logger.exception("Timeline event flush failed; spooling %d events", len(chunk))
+                    self._spool(chunk)
+                else:
+                    self._announce(chunk)
+
+            # Only once this batch is written or spooled: a replay that fails can't lose it.
+            if self.spool_path and (os.path.exists(self.spool_path) or os.path.exists(self.replaying_path)):
+                try:
+                    self.replay_spool()
+                except Exception:
+                    logger.exception("Timeline spool replay failed; will retry on the next flush")
+
+    def _announce(self, events):
+        # The events are written; a cache or pub/sub failure mustn't cost the chunks after them.
+        try:
+            response_cache.bump("project", *(event.project_id for event in events))
+            realtime.publish_timeline_events(events)
+        except Exception:
+            logger.exception("Could not announce %d timeline events", len(events))
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    # ---- durable fallback ----
+    # Every worker process shares one spool file; appends and replays hold an
+    # exclusive lock on ``<spool>.lock`` so they never interleave.
+    @property
+    def replaying_path(self):
+        return f"{self.spool_path}.replaying"
+
+    @contextmanager
+    def _spool_lock(self):
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        with open(f"{self.spool_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _spool(self, events):
+        if not self.spool_path:
+            return
+        with self._spool_lock(), open(self.spool_path, "a", encoding="utf-8") as spool:
+            for event in events:
+                spool.write(json.dumps({
+                    "project_id": event.project_id,
+                    "user_id": event.user_id,
+                    "event_type": event.event_type,
+                    "description": event.description,
+                    "created_at": event.created_at.isoformat(),
+                }) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    def replay_spool(self):
+        """
+        Write spooled events back to the database. Returns the number replayed.
+
+        Spooled lines are first appended to ``<spool>.replaying``, which is only
+        removed once its events are written; a replay that fails (or a process
+        that dies mid-replay) leaves it for the next attempt.
+        """
+        with self._spool_lock():
+            if os.path.exists(self.spool_path):
+                with open(self.spool_path, encoding="utf-8") as spool, \
+                        open(self.replaying_path, "a", encoding="utf-8") as replaying:
+                    replaying.write(spool.read())
+                    replaying.flush()
+                    os.fsync(replaying.fileno())
+                os.remove(self.spool_path)
+            if not os.path.exists(self.replaying_path):
+                return 0
+
+            with open(self.replaying_path, encoding="utf-8") as replaying:
+                records = [json.loads(line) for line in replaying if line.strip()]
+
+            # Events whose project was deleted (or never committed) can't be restored.
+            live_projects = set(
+                Project.objects.filter(id__in={r["project_id"] for r in records}).values_list("id", flat=True)
+            )
+            events = [
+                TimelineEvent(
+                    project_id=r["project_id"],
+                    user_id=r["user_id"],
+                    event_type=r["event_type"],
+                    description=r["description"],
+                    created_at=parse_datetime(r["created_at"]),
+                )
+                for r in records if r["project_id"] in live_projects
+            ]
+            TimelineEvent.objects.bulk_record(events, batch_size=self.batch_size)
+            os.remove(self.replaying_path)
+
+        self._announce(events)
+        return len(events)
+
+
+# ------------------- Sink Factory -------------------------
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def build_event_sink(config):
+    if config.get("MODE", "sync") == "buffered":
+        return BufferedEventSink(
+            batch_size=config.get("BATCH_SIZE", 200),
+            flush_interval=config.get("FLUSH_INTERVAL", 1.0),
+            spool_path=config.get("SPOOL_PATH"),
+        )
+    return SyncEventSink()
+
+
+def get_event_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = build_event_sink(getattr(settings, "TIMELINE_EVENT_SINK", {}))
+                atexit.register(_sink.close)
+    return _sink
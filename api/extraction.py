@@ -0,0 +1,265 @@
+import codecs
+import logging
+import os
+import re
+import time
+import zlib
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from django.db.models import Q, Value
+from django.utils import timezone
+
+from .jobs import job
+from .models import Blob, BlobText, Document
+from .search import SEARCH_CONFIG
+from .storage import blob_name, document_storage
+
+logger = logging.getLogger(__name__)
+
+# Bump to re-extract every blob (e.g. after improving an extractor).
+EXTRACTOR_VERSION = 1
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+
+def get_config():
+    return {
+        "ON_UPLOAD": True,
+        "WORKERS": 2,
+        "NICE": 10,
+        "CHUNK_SIZE": 256 * 1024,
+        "MAX_TEXT_BYTES": 8 * 1024 * 1024,
+        "INDEX_CHARS": 300_000,
+        "THROTTLE_BYTES_PER_SECOND": 4 * 1024 * 1024,
+        **getattr(settings, "EXTRACTION", {}),
+    }
+
+
+def pending_blobs(retry_failed=False):
+    """Referenced blobs with no text from the current extractor version."""
+    stale = Q(text__isnull=True) | Q(text__extractor_version__lt=EXTRACTOR_VERSION)
+    if retry_failed:
+        stale |= Q(text__status=BlobText.FAILED)
+    return Blob.objects.filter(stale, ref_count__gt=0)
+
+
+# ------------------- Throttling -------------------------
+class Throttle:
+    """Caps read throughput at ``rate`` bytes/second by sleeping, so extraction never saturates the disk."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def __call__(self, nbytes):
+        if not self.rate:
+            return
+        self.consumed += nbytes
+        ahead = self.consumed / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+# ------------------- Text Sink -------------------------
+class TextSink:
+    """
+    Receives extracted text piece by piece and keeps only what's needed: a
+    zlib stream of up to ``max_bytes`` of UTF-8 for storage and the first
+    ``index_chars`` characters for the search vector. Memory stays bounded
+    however large the document is.
+    """
+
+    def __init__(self, max_bytes, index_chars):
+        self.max_bytes = max_bytes
+        self.index_chars = index_chars
+        self.compressor = zlib.compressobj(level=6)
+        self.compressed = []
+        self.indexed = []
+        self.indexed_chars = 0
+        self.text_bytes = 0
+        self.truncated = False
+
+    def write(self, text):
+        if self.truncated or not text:
+            return
+        data = text.encode("utf-8")
+        if self.text_bytes + len(data) > self.max_bytes:
+            data = data[:self.max_bytes - self.text_bytes].decode("utf-8", "ignore").encode("utf-8")
+            text = data.decode("utf-8")
+            self.truncated = True
+        self.text_bytes += len(data)
+        self.compressed.append(self.compressor.compress(data))
+        if self.indexed_chars < self.index_chars:
+            piece = text[:self.index_chars - self.indexed_chars]
+            self.indexed.append(piece)
+            self.indexed_chars += len(piece)
+
+    def content(self):
+        return b"".join(self.compressed) + self.compressor.flush()
+
+    def index_text(self):
+        return "".join(self.indexed)
+
+
+# ------------------- Extractors -------------------------
+MARKDOWN_RULES = [
+    (re.compile(r"^\s{0,3}(#{1,6}|>+|[-*+]|\d+[.)])\s+"), ""),
+    (re.compile(r"^\s{0,3}(```|~~~).*$"), ""),
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"<[^>\n]+>"), " "),
+    (re.compile(r"[*_`~]+"), ""),
+]
+
+
+def strip_markdown(line):
+    for pattern, replacement in MARKDOWN_RULES:
+        line = pattern.sub(replacement, line)
+    return line
+
+
+def extract_plain(chunks, sink, markdown=False):
+    """Decode UTF-8 chunks incrementally (bad bytes become U+FFFD), line by line for markdown."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    partial = ""
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if not markdown:
+            sink.write(text)
+        else:
+            lines = (partial + text).split("\n")
+            partial = lines.pop()
+            if len(partial) > len(chunk):
+                # A single huge line (minified or generated markdown): don't buffer it whole.
+                lines.append(partial)
+                partial = ""
+            sink.write("".join(strip_markdown(line) + "\n" for line in lines))
+        if sink.truncated:
+            return
+    rest = partial + decoder.decode(b"", final=True)
+    sink.write(strip_markdown(rest) if markdown else rest)
+
+
+def extract_pdf(file, sink):
+    """Text of each page in turn; pypdf reads objects from the file on demand rather than loading it whole."""
+    from pypdf import PdfReader
+
+    for page in PdfReader(file).pages:
+        sink.write((page.extract_text() or "") + "\n")
+        if sink.truncated:
+            return
+
+
+def detect_kind(head, names):
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if b"\x00" in head:
+        return None
+    if any(name.lower().endswith(MARKDOWN_SUFFIXES) for name in names):
+        return "markdown"
+    return "text"
+
+
+class ThrottledReader:
+    """File wrapper that charges every read against a ``Throttle``."""
+
+    def __init__(self, file, throttle):
+        self.file = file
+        self.throttle = throttle
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.throttle(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+# ------------------- Extraction -------------------------
+def extract_blob(sha256, force=False):
+    """
+    Extract the text of one blob into its ``BlobText`` row and refresh the
+    search vectors of the documents stored in it. Skips blobs already
+    extracted by the current ``EXTRACTOR_VERSION`` unless ``force``.
+    Returns the resulting status.
+    """
+    config = get_config()
+    if not force:
+        done = BlobText.objects.filter(pk=sha256, extractor_version__gte=EXTRACTOR_VERSION).exclude(
+            status=BlobText.FAILED
+        ).values_list("status", flat=True).first()
+        if done:
+            return done
+
+    names = list(Document.objects.filter(blob_id=sha256).values_list("name", flat=True))
+    sink = TextSink(config["MAX_TEXT_BYTES"], config["INDEX_CHARS"])
+    throttle = Throttle(config["THROTTLE_BYTES_PER_SECOND"])
+    status, error = BlobText.EXTRACTED, ""
+    try:
+        with document_storage.open(blob_name(sha256), "rb") as file:
+            head = file.read(8192)
+            file.seek(0)
+            kind = detect_kind(head, names)
+            if kind is None:
+                status = BlobText.UNSUPPORTED
+            elif kind == "pdf":
+                extract_pdf(ThrottledReader(file, throttle), sink)
+            else:
+                chunks = (throttle(len(chunk)) or chunk for chunk in file.chunks(config["CHUNK_SIZE"]))
+                extract_plain(chunks, sink, markdown=kind == "markdown")
+    except Exception as exc:
+        logger.warning("Text extraction failed for blob %s", sha256, exc_info=True)
+        status, error = BlobText.FAILED, f"{type(exc).__name__}: {exc}"[:1000]
+
+    save_text(sha256, sink, status, error)
+    return status
+
+
+def save_text(sha256, sink, status, error):
+    extracted = status == BlobText.EXTRACTED
+    with transaction.atomic():
+        BlobText.objects.update_or_create(
+            blob_id=sha256,
+            defaults={
+                "status": status,
+                "error": error,
+                "extractor_version": EXTRACTOR_VERSION,
+                "content": sink.content() if extracted else b"",
+                "text_bytes": sink.text_bytes if extracted else 0,
+                "truncated": sink.truncated,
+                "extracted_at": timezone.now(),
+            },
+        )
+        if connection.vendor == "postgresql":
+            BlobText.objects.filter(pk=sha256).update(
+                search_vector=SearchVector(Value(sink.index_text()), config=SEARCH_CONFIG) if extracted else None
+            )
+            # Touching search_vector re-runs the document trigger, which folds the blob's text in.
+            Document.objects.filter(blob_id=sha256).update(search_vector=None)
+
+
+def read_text(blob_text):
+    return zlib.decompress(bytes(blob_text.content)).decode("utf-8") if blob_text.content else ""
+
+
+class ExtractionFailed(Exception):
+    pass
+
+
+@job(queue="extraction")
+def extract_document_text(sha256):
+    """
+    ``extract_blob`` on a worker. A failed extraction raises so the job is
+    retried with backoff, up to the queue's ``MAX_RETRIES``; after that the
+    blob stays failed until ``manage.py extract_documents --retry-failed``.
+    """
+    if extract_blob(sha256) == BlobText.FAILED:
+        raise ExtractionFailed(f"Text extraction failed for blob {sha256}")
+
+
+def lower_priority(nice):
+    """Process pool initializer: run extraction below request-serving processes."""
+    if nice:
+        os.nice(nice)
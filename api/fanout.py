@@ -0,0 +1,246 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import realtime, response_cache
+from .jobs import job
+from .models import Notification, Project
+
+logger = logging.getLogger(__name__)
+
+# How a burst of one kind of event on one project reads once coalesced.
+COALESCED_MESSAGES = {
+    "comment_added": "{count} new comments on {project}",
+    "task_created": "{count} new tasks in {project}",
+    "task_updated": "{count} tasks updated in {project}",
+    "document_uploaded": "{count} documents uploaded to {project}",
+}
+DEFAULT_COALESCED_MESSAGE = "{count} new updates in {project}"
+MESSAGE_LENGTH = Notification._meta.get_field("message").max_length
+
+
+def recipients_for(project, actor, notify=()):
+    """The project owner plus any extra users (e.g. the task assignee), never the actor themselves."""
+    recipients = {project.owner_id, *notify}
+    recipients.discard(getattr(actor, "pk", None))
+    recipients.discard(None)
+    return recipients
+
+
+class PendingGroup:
+    """Events of one type on one project, waiting to be sent to one recipient."""
+
+    def __init__(self, project, event_type):
+        self.project = project
+        self.event_type = event_type
+        self.descriptions = []
+
+    def message(self):
+        if len(self.descriptions) == 1:
+            text = f"{self.project.name}: {self.descriptions[0]}"
+        else:
+            template = COALESCED_MESSAGES.get(self.event_type, DEFAULT_COALESCED_MESSAGE)
+            text = template.format(count=len(self.descriptions), project=self.project.name)
+        return text[:MESSAGE_LENGTH]
+
+
+def collect_groups(items):
+    """Group ``(project, actor, event_type, description, notify)`` items per recipient."""
+    groups = {}
+    for project, actor, event_type, description, notify in items:
+        for recipient_id in recipients_for(project, actor, notify):
+            group = groups.setdefault((recipient_id, project.pk, event_type), PendingGroup(project, event_type))
+            group.descriptions.append(description)
+    return groups
+
+
+def deliver(groups):
+    """
+    Write one notification per ``(recipient, project, event_type)`` group with
+    a single ``bulk_create`` (plus the unread-counter update), then invalidate
+    the recipients' cached lists and push the notifications to live streams.
+    """
+    notifications = [
+        Notification(user_id=recipient_id, message=group.message())
+        for (recipient_id, _, _), group in groups.items()
+    ]
+    if not notifications:
+        return []
+    notifications = Notification.objects.bulk_notify(notifications)
+    # The rows are written; a cache or pub/sub failure mustn't get them written twice.
+    try:
+        response_cache.bump("user", *{n.user_id for n in notifications})
+        realtime.publish_notifications(notifications)
+    except Exception:
+        logger.exception("Could not announce %d notifications", len(notifications))
+    return notifications
+
+
+def deliver_or_requeue(groups):
+    """
+    ``deliver`` in this process, handing the groups to the ``notifications``
+    job queue (and its retries) if the write fails. ``bulk_notify`` is one
+    transaction, so a failed write left nothing behind to duplicate.
+    """
+    try:
+        deliver(groups)
+    except Exception:
+        logger.exception("Notification fan-out failed; requeueing %d notifications", len(groups))
+        deliver_notifications.delay(serialize_groups(groups))
+
+
+def serialize_groups(groups):
+    return [
+        {
+            "user_id": recipient_id,
+            "project_id": project_id,
+            "project_name": group.project.name,
+            "event_type": event_type,
+            "descriptions": group.descriptions,
+        }
+        for (recipient_id, project_id, event_type), group in groups.items()
+    ]
+
+
+# ------------------- Synchronous Fan-out -------------------------
+class SyncFanout:
+    """Creates notifications as soon as the triggering transaction commits."""
+
+    def notify(self, items):
+        groups = collect_groups(items)
+        if groups:
+            transaction.on_commit(lambda: deliver_or_requeue(groups))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ------------------- Queued Fan-out -------------------------
+class QueuedFanout:
+    """Hands each committed batch to the ``notifications`` job queue (see ``manage.py runworker``)."""
+
+    def notify(self, items):
+        groups = collect_groups(items)
+        if groups:
+            deliver_notifications.delay(serialize_groups(groups))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@job(queue="notifications")
+def deliver_notifications(groups):
+    pending = {}
+    for item in groups:
+        group = PendingGroup(Project(pk=item["project_id"], name=item["project_name"]), item["event_type"])
+        group.descriptions = item["descriptions"]
+        pending[(item["user_id"], item["project_id"], item["event_type"])] = group
+    deliver(pending)
+
+
+# ------------------- Background Fan-out -------------------------
+class BackgroundFanout:
+    """
+    Turns timeline activity into notifications off the request path.
+
+    Committed events are grouped in memory per ``(recipient, project,
+    event_type)`` for ``window`` seconds, so a burst of twelve comments
+    becomes a single "12 new comments on X" notification instead of twelve.
+    Each window's groups are split into ``batch_size`` chunks and written by
+    a pool of ``workers`` threads, so a large fan-out never delays requests
+    or the next window. A chunk whose write fails goes to the job queue
+    rather than being dropped.
+    """
+
+    def __init__(self, window=2.0, workers=2, batch_size=500):
+        self.window = window
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notification-fanout")
+
+    def notify(self, items):
+        groups = collect_groups(items)
+        if groups:
+            transaction.on_commit(lambda: self._enqueue(groups))
+
+    def _enqueue(self, groups):
+        self._ensure_started()
+        with self._lock:
+            for key, group in groups.items():
+                pending = self._pending.setdefault(key, PendingGroup(group.project, group.event_type))
+                pending.descriptions.extend(group.descriptions)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-fanout", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.window):
+            for chunk in self._take_chunks():
+                self._pool.submit(self._deliver, chunk)
+
+    def _take_chunks(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        return [dict(items[start:start + self.batch_size]) for start in range(0, len(items), self.batch_size)]
+
+    def _deliver(self, groups):
+        close_old_connections()
+        deliver_or_requeue(groups)
+
+    def flush(self):
+        """Deliver everything pending now, on the calling thread."""
+        for chunk in self._take_chunks():
+            self._deliver(chunk)
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.window + 5)
+        self._pool.shutdown(wait=True)
+        self.flush()
+
+
+# ------------------- Fan-out Factory -------------------------
+_fanout = None
+_fanout_lock = threading.Lock()
+
+
+def build_fanout(config):
+    if config.get("MODE", "sync") == "queue":
+        return QueuedFanout()
+    if config.get("MODE", "sync") == "background":
+        return BackgroundFanout(
+            window=config.get("WINDOW", 2.0),
+            workers=config.get("WORKERS", 2),
+            batch_size=config.get("BATCH_SIZE", 500),
+        )
+    return SyncFanout()
+
+
+def get_fanout():
+    global _fanout
+    if _fanout is None:
+        with _fanout_lock:
+            if _fanout is None:
+                _fanout = build_fanout(getattr(settings, "NOTIFICATION_FANOUT", {}))
+                atexit.register(_fanout.close)
+    return _fanout
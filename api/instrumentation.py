@@ -0,0 +1,282 @@
+import contextvars
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+# Raises a hash field to ARGV[1] unless it already holds at least that much.
+# KEYS[1] hash, ARGV: value, field
+HASH_MAX_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[2]) or '-1')
+if tonumber(ARGV[1]) > current then
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[1])
+end
+"""
+
+
+def get_config():
+    return {
+        "ENABLED": True,
+        # Who gets the Server-Timing header: "staff", "all" or "off".
+        "SERVER_TIMING": "staff",
+        "FLUSH_INTERVAL": 10,
+        "DUPLICATE_QUERY_THRESHOLD": 5,
+        "CACHE_ALIAS": "default",
+        **getattr(settings, "PERFORMANCE_METRICS", {}),
+    }
+
+
+# ------------------- Per-request Metrics -------------------------
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.timings = defaultdict(float)
+        self.statements = Counter()
+        self.counters = Counter()
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def server_timing(self, total_ms):
+        parts = [f'db;dur={self.db_ms:.1f};desc="{self.queries} queries, {self.duplicate_queries} duplicate"']
+        parts += [f"{name};dur={ms:.1f}" for name, ms in self.timings.items()]
+        parts += [f'{name};desc="{count}"' for name, count in self.counters.items()]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def track_request():
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def record_timing(name):
+    """Add the duration of the block to the current request's ``name`` timing."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += (time.perf_counter() - start) * 1000
+
+
+def count(name, amount=1):
+    """Increment a named counter on the current request (aggregated per route)."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[name] += amount
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` hook counting queries, DB time and repeated statements."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.db_ms += (time.perf_counter() - start) * 1000
+            self.metrics.queries += 1
+            self.metrics.statements[sql] += 1
+
+
+# ------------------- Serializer Timing -------------------------
+class InstrumentedSerializerMixin:
+    """Reports the time spent building ``.data`` as the request's ``serialize`` timing."""
+
+    @property
+    def data(self):
+        with record_timing("serialize"):
+            return super().data
+
+
+class InstrumentedListSerializer(InstrumentedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+# ------------------- Per-route Histograms -------------------------
+class RouteHistograms:
+    """
+    Aggregates request metrics per route in process memory. A background
+    thread merges them into Redis hashes (``perf:<route>``) every
+    ``FLUSH_INTERVAL`` seconds, so every worker's data can be read back from
+    one place without requests waiting on Redis.
+    """
+    key_prefix = "perf:"
+
+    def __init__(self):
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._max_script = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="route-histograms", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopped.wait(get_config()["FLUSH_INTERVAL"]):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+    def observe(self, route, metrics, total_ms):
+        bucket = next((f"le_{b}" for b in LATENCY_BUCKETS if total_ms <= b), "le_inf")
+        with self._lock:
+            stats = self._pending[route]
+            stats["count"] += 1
+            stats[bucket] += 1
+            stats["total_ms"] += total_ms
+            stats["db_ms"] += metrics.db_ms
+            stats["queries"] += metrics.queries
+            stats["duplicate_queries"] += metrics.duplicate_queries
+            stats["serialize_ms"] += metrics.timings.get("serialize", 0.0)
+            stats["max_queries"] = max(stats["max_queries"], metrics.queries)
+            for name, amount in metrics.counters.items():
+                stats[f"counter:{name}"] += amount
+        self._ensure_started()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        if not pending:
+            return
+        try:
+            client = self._client()
+            if self._max_script is None:
+                self._max_script = client.register_script(HASH_MAX_SCRIPT)
+            pipe = client.pipeline(transaction=False)
+            for route, stats in pending.items():
+                key = f"{self.key_prefix}{route}"
+                for field, value in stats.items():
+                    if field == "max_queries":
+                        self._max_script(keys=[key], args=[value, field], client=pipe)
+                    elif isinstance(value, float):
+                        pipe.hincrbyfloat(key, field, round(value, 3))
+                    else:
+                        pipe.hincrby(key, field, value)
+                pipe.sadd(f"{self.key_prefix}routes", route)
+            pipe.execute()
+        except Exception:
+            logger.warning("Could not flush performance metrics", exc_info=True)
+
+    def snapshot(self):
+        """Return ``{route: stats}`` aggregated across all workers, with per-request averages."""
+        self.flush()
+        client = self._client()
+        routes = sorted(r.decode() for r in client.smembers(f"{self.key_prefix}routes"))
+        result = {}
+        for route in routes:
+            raw = client.hgetall(f"{self.key_prefix}{route}")
+            stats = {k.decode(): float(v) for k, v in raw.items()}
+            requests = stats.get("count", 0) or 1
+            result[route] = {
+                "count": int(stats.get("count", 0)),
+                "avg_ms": round(stats.get("total_ms", 0) / requests, 2),
+                "avg_db_ms": round(stats.get("db_ms", 0) / requests, 2),
+                "avg_serialize_ms": round(stats.get("serialize_ms", 0) / requests, 2),
+                "avg_queries": round(stats.get("queries", 0) / requests, 2),
+                "max_queries": int(stats.get("max_queries", 0)),
+                "duplicate_queries": int(stats.get("duplicate_queries", 0)),
+                "counters": {
+                    field.split(":", 1)[1]: int(value)
+                    for field, value in stats.items() if field.startswith("counter:")
+                },
+                "latency_buckets": {
+                    bucket: int(stats.get(bucket, 0))
+                    for bucket in [f"le_{b}" for b in LATENCY_BUCKETS] + ["le_inf"]
+                },
+            }
+        return result
+
+    def reset(self):
+        client = self._client()
+        routes = client.smembers(f"{self.key_prefix}routes")
+        client.delete(f"{self.key_prefix}routes", *[f"{self.key_prefix}{r.decode()}" for r in routes])
+
+    def _client(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(get_config()["CACHE_ALIAS"])
+
+
+route_histograms = RouteHistograms()
+
+
+# ------------------- Database Connections -------------------------
+_connects = Counter()
+_connects_lock = threading.Lock()
+
+
+def note_connection(connection):
+    """
+    Count a new DB session: a real connect without a pool, a checkout
+    (usually of an already open connection) with one.
+    """
+    if getattr(connection, "pool", None) is not None:
+        count("db_pool_checkout")
+        return
+    count("db_connect")
+    with _connects_lock:
+        _connects[connection.alias] += 1
+
+
+def connection_stats():
+    """How this process reuses DB connections, per alias; pool sizes and utilization when pooled."""
+    result = {}
+    for alias in connections:
+        wrapper = connections[alias]
+        pool = getattr(wrapper, "pool", None)
+        entry = {
+            "mode": "pool" if pool is not None else ("persistent" if wrapper.settings_dict["CONN_MAX_AGE"] else "none"),
+            "conn_max_age": wrapper.settings_dict["CONN_MAX_AGE"],
+            "health_checks": wrapper.settings_dict["CONN_HEALTH_CHECKS"],
+            "connects": _connects[alias],
+            "pool": None,
+        }
+        if pool is not None:
+            stats = pool.get_stats()
+            in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+            entry["pool"] = {
+                **stats,
+                "in_use": in_use,
+                "utilization": round(in_use / pool.max_size, 3),
+            }
+            entry["connects"] = stats.get("connections_num", 0)
+        result[alias] = entry
+    return {"pid": os.getpid(), "databases": result}
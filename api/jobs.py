@@ -0,0 +1,307 @@
+import functools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils.module_loading import import_string
+from redis import RedisError
+
+from .instrumentation import QueryRecorder, count, route_histograms, track_request
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        "MODE": "redis",
+        "KEY_PREFIX": "jobs",
+        "QUEUES": {"default": {"CONCURRENCY": 4}},
+        "MAX_RETRIES": 3,
+        "BACKOFF": 2.0,
+        "MAX_BACKOFF": 300,
+        "IDEMPOTENCY_TTL": 24 * 60 * 60,
+        "HEARTBEAT": 10,
+        **getattr(settings, "JOBS", {}),
+    }
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def redis_key(*parts):
+    return ":".join([get_config()["KEY_PREFIX"], *map(str, parts)])
+
+
+# Moves every delayed job whose retry time has come onto its ready list.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, payload in ipairs(due) do
+    redis.call('ZREM', KEYS[1], payload)
+    redis.call('LPUSH', KEYS[2], payload)
+end
+return #due
+"""
+
+# Claims the idempotency key and queues the job in one step, so a push that
+# fails can't leave the key behind to drop every retry as a duplicate.
+PUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+# ------------------- Enqueueing -------------------------
+class Job:
+    """A function registered with ``@job``; call ``.delay()`` to run it on a worker."""
+
+    def __init__(self, func, queue, max_retries):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.queue = queue
+        self.max_retries = max_retries
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, idempotency_key=None, idempotency_ttl=None, **kwargs):
+        return enqueue(
+            self.name, args, kwargs, queue=self.queue, max_retries=self.max_retries,
+            idempotency_key=idempotency_key, idempotency_ttl=idempotency_ttl,
+        )
+
+
+def job(queue="default", max_retries=None):
+    def decorator(func):
+        return Job(func, queue, max_retries)
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, queue="default", idempotency_key=None, max_retries=None,
+            idempotency_ttl=None):
+    """
+    Queue ``name`` (a dotted path to a ``@job``) to run with JSON-serializable
+    ``args``/``kwargs`` once the current transaction commits. A job whose
+    ``idempotency_key`` was already queued within ``idempotency_ttl`` seconds
+    (``IDEMPOTENCY_TTL`` by default) is dropped. Returns the job id.
+
+    The push happens after the commit, so it can't fail the request that
+    queued it: if Redis is unreachable the job is dropped, counted as
+    ``job_push_failed`` and logged with its payload. Jobs are for work that
+    can be redone (a later save, ``extract_documents``, the next warm-up).
+    """
+    config = get_config()
+    payload = {
+        "id": uuid.uuid4().hex,
+        "name": name,
+        "args": list(args),
+        "kwargs": kwargs or {},
+        "queue": queue,
+        "attempt": 0,
+        "max_retries": config["MAX_RETRIES"] if max_retries is None else max_retries,
+        "idempotency_key": idempotency_key,
+        "idempotency_ttl": idempotency_ttl,
+        "enqueued_at": time.time(),
+    }
+    if config["MODE"] == "eager":
+        transaction.on_commit(lambda: execute(payload))
+    else:
+        transaction.on_commit(lambda: push_committed(payload))
+    return payload["id"]
+
+
+def push_committed(payload):
+    try:
+        push(payload)
+    except (RedisError, NotImplementedError):
+        count("job_push_failed")
+        logger.error("Could not queue job %s; dropped: %s", payload["name"], json.dumps(payload), exc_info=True)
+
+
+def push(payload):
+    client = get_redis()
+    key = payload["idempotency_key"]
+    ttl = payload.get("idempotency_ttl") or get_config()["IDEMPOTENCY_TTL"]
+    ready = redis_key(payload["queue"], "ready")
+    if not key:
+        client.lpush(ready, json.dumps(payload))
+    elif not client.register_script(PUSH_SCRIPT)(
+        keys=[ready, redis_key("idem", key)], args=[json.dumps(payload), payload["id"], ttl]
+    ):
+        count("job_duplicate")
+        return False
+    count("job_enqueued")
+    return True
+
+
+# ------------------- Execution -------------------------
+def execute(payload):
+    """
+    Run one job, recording its queries, run time and queue wait under the
+    ``job:<name>`` entry of the route histograms. Returns True on success.
+    """
+    close_old_connections()
+    wait_ms = max(0.0, (time.time() - payload["enqueued_at"]) * 1000)
+    start = time.perf_counter()
+    ok = True
+    with track_request() as metrics, ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(QueryRecorder(metrics)))
+        try:
+            import_string(payload["name"])(*payload["args"], **payload["kwargs"])
+        except Exception:
+            ok = False
+            logger.exception("Job %s (%s) failed on attempt %d", payload["name"], payload["id"], payload["attempt"] + 1)
+        count("wait_ms", int(wait_ms))
+        count("succeeded" if ok else "failed")
+    route_histograms.observe(f"job:{payload['name']}", metrics, (time.perf_counter() - start) * 1000)
+    return ok
+
+
+def retry_delay(attempt):
+    config = get_config()
+    delay = min(config["BACKOFF"] * 2 ** attempt, config["MAX_BACKOFF"])
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    """
+    Consumes jobs from Redis with ``CONCURRENCY`` threads per queue.
+
+    Each job is moved atomically from the queue's ready list onto this
+    worker's own processing list while it runs, so a worker that dies mid-job
+    doesn't lose it: a live worker notices the missing heartbeat and puts
+    those jobs back. Failed jobs are retried with exponential backoff via a
+    delayed sorted set and, once out of retries, parked on a dead list.
+    Delivery is at-least-once, so jobs must be safe to run twice.
+    """
+
+    def __init__(self, queues=None, concurrency=None):
+        config = get_config()
+        self.queues = {
+            name: concurrency or options.get("CONCURRENCY", 1)
+            for name, options in config["QUEUES"].items()
+            if queues is None or name in queues
+        }
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.heartbeat = config["HEARTBEAT"]
+        self.stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        client = get_redis()
+        client.sadd(redis_key("workers"), self.id)
+        self._beat(client)
+        self._threads.append(threading.Thread(target=self._maintain, name="jobs-maintenance", daemon=True))
+        for queue, slots in self.queues.items():
+            for slot in range(slots):
+                self._threads.append(
+                    threading.Thread(target=self._consume, args=(queue,), name=f"jobs-{queue}-{slot}", daemon=True)
+                )
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=30):
+        """Stop taking jobs and wait for the running ones to finish."""
+        self.stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        client = get_redis()
+        client.delete(redis_key("worker", self.id))
+        client.srem(redis_key("workers"), self.id)
+        route_histograms.flush()
+
+    def _consume(self, queue):
+        client = get_redis()
+        ready, processing = redis_key(queue, "ready"), redis_key(queue, "processing", self.id)
+        while not self.stopped.is_set():
+            try:
+                raw = client.blmove(ready, processing, 1, "RIGHT", "LEFT")
+            except Exception:
+                logger.exception("Could not fetch from job queue %s", queue)
+                time.sleep(1)
+                continue
+            if raw is not None:
+                self._process(client, queue, raw, processing)
+
+    def _process(self, client, queue, raw, processing):
+        payload = json.loads(raw)
+        ok = execute(payload)
+        pipe = client.pipeline()
+        if not ok:
+            payload["attempt"] += 1
+            if payload["attempt"] <= payload["max_retries"]:
+                pipe.zadd(redis_key(queue, "delayed"), {json.dumps(payload): time.time() + retry_delay(payload["attempt"])})
+            else:
+                logger.error("Job %s (%s) exhausted its retries", payload["name"], payload["id"])
+                pipe.lpush(redis_key(queue, "dead"), json.dumps(payload))
+        pipe.lrem(processing, 1, raw)
+        pipe.execute()
+
+    def _maintain(self):
+        client = get_redis()
+        promote = client.register_script(PROMOTE_SCRIPT)
+        last_beat = time.monotonic()
+        while not self.stopped.wait(0.5):
+            try:
+                for queue in self.queues:
+                    promote(keys=[redis_key(queue, "delayed"), redis_key(queue, "ready")], args=[time.time()])
+                if time.monotonic() - last_beat >= self.heartbeat:
+                    self._beat(client)
+                    self._recover(client)
+                    last_beat = time.monotonic()
+            except Exception:
+                logger.exception("Job worker maintenance failed")
+
+    def _beat(self, client):
+        client.set(redis_key("worker", self.id), 1, ex=self.heartbeat * 3)
+
+    def _recover(self, client):
+        """Requeue jobs held by workers whose heartbeat has expired."""
+        for worker_id in client.smembers(redis_key("workers")):
+            worker_id = worker_id.decode()
+            if worker_id == self.id or client.exists(redis_key("worker", worker_id)):
+                continue
+            for queue in get_config()["QUEUES"]:
+                processing = redis_key(queue, "processing", worker_id)
+                while client.rpoplpush(processing, redis_key(queue, "ready")) is not None:
+                    count("job_recovered")
+            client.srem(redis_key("workers"), worker_id)
+            logger.warning("Recovered jobs from dead worker %s", worker_id)
+
+
+# ------------------- Queue Depth -------------------------
+def queue_depths():
+    """Ready, delayed, running and dead job counts per configured queue."""
+    client = get_redis()
+    workers = [w.decode() for w in client.smembers(redis_key("workers"))]
+    pipe = client.pipeline(transaction=False)
+    queues = list(get_config()["QUEUES"])
+    for queue in queues:
+        pipe.llen(redis_key(queue, "ready"))
+        pipe.zcard(redis_key(queue, "delayed"))
+        pipe.llen(redis_key(queue, "dead"))
+        for worker_id in workers:
+            pipe.llen(redis_key(queue, "processing", worker_id))
+    results = iter(pipe.execute())
+    depths = {}
+    for queue in queues:
+        ready, delayed, dead = next(results), next(results), next(results)
+        running = sum(next(results) for _ in workers)
+        depths[queue] = {"ready": ready, "delayed": delayed, "running": running, "dead": dead}
+    return {"workers": len(workers), "queues": depths}
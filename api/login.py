@@ -0,0 +1,128 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
+from django.db import close_old_connections
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .instrumentation import count
+from .serializers import TokenSerializer
+
+
+def get_config():
+    return {
+        # Threads hashing passwords at once, per process. hashlib's PBKDF2
+        # releases the GIL, so each one can keep a core busy.
+        "HASH_WORKERS": 2,
+        # Logins allowed to queue for a hash thread before the rest get 503.
+        "MAX_PENDING": 32,
+        # Seconds a login waits for its hash (queueing included) before it
+        # gets 503 too, so a stalled pool can't hold request threads forever.
+        "TIMEOUT": 10,
+        **getattr(settings, "LOGIN", {}),
+    }
+
+
+class LoginBusy(Exception):
+    pass
+
+
+# ------------------- Hash Pool -------------------------
+class HashPool:
+    """
+    Runs ``authenticate()`` (one password hash, plus a re-hash when the
+    stored hash is from an outdated hasher) on a small fixed pool of threads.
+
+    Request threads (and under ASGI, the one thread Django runs every sync
+    view on) never hash themselves, so a login spike costs at most
+    ``workers`` cores and other requests keep being served. At most
+    ``max_pending`` logins wait their turn; beyond that ``submit`` raises
+    ``LoginBusy`` instead of queuing without bound.
+    """
+
+    def __init__(self, workers=2, max_pending=32):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, request, email, password):
+        if not self._slots.acquire(blocking=False):
+            count("login_busy")
+            raise LoginBusy("Too many logins in progress; retry shortly")
+        future = self._pool.submit(self._authenticate, request, email, password)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _authenticate(self, request, email, password):
+        # Pool threads outlive requests, so nothing else closes their connections.
+        close_old_connections()
+        try:
+            return authenticate(request, email=email, password=password)
+        finally:
+            close_old_connections()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                config = get_config()
+                _hash_pool = HashPool(workers=config["HASH_WORKERS"], max_pending=config["MAX_PENDING"])
+                atexit.register(_hash_pool.close)
+    return _hash_pool
+
+
+# ------------------- Login -------------------------
+def verify(request, email, password):
+    """
+    The active user ``email``/``password`` identify, or None. Blocks until a
+    hash thread is free, for up to ``TIMEOUT`` seconds; raises ``LoginBusy``
+    if the pool is full or the hash doesn't finish in time.
+    """
+    if not email or not password:
+        return None
+    future = get_hash_pool().submit(request, email, password)
+    try:
+        return future.result(timeout=get_config()["TIMEOUT"])
+    except FutureTimeoutError:
+        future.cancel()
+        raise timed_out() from None
+
+
+async def averify(request, email, password):
+    if not email or not password:
+        return None
+    future = asyncio.wrap_future(get_hash_pool().submit(request, email, password))
+    try:
+        # wait_for cancels the hash too, if it hasn't started yet.
+        return await asyncio.wait_for(future, get_config()["TIMEOUT"])
+    except asyncio.TimeoutError:
+        raise timed_out() from None
+
+
+def timed_out():
+    count("login_timeout")
+    return LoginBusy("Login timed out; retry shortly")
+
+
+def issue_tokens(user):
+    """
+    The login response for an already authenticated ``user``: what
+    ``TokenSerializer`` returns, minted directly instead of authenticating
+    (and hashing the password) a second time.
+    """
+    refresh = TokenSerializer.get_token(user)
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    return {"refresh": str(refresh), "access": str(refresh.access_token), "email": user.email, "role": user.role}
@@ -0,0 +1,108 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from api import instrumentation
+from api.models import User
+from api.serializers import TokenSerializer
+
+MODES = ("none", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request DB connection overhead on GET /api/notifications/ with DB_CONNECTION_MODE "
+        "none, persistent and pool. Each mode runs in its own process, since the mode is read at startup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--path", default="/api/notifications/")
+        parser.add_argument("--child", action="store_true", help="Run a single mode in this process.")
+
+    def handle(self, *args, **options):
+        if options["child"]:
+            return self.run_child(options)
+
+        results = {}
+        for mode in MODES:
+            env = {**os.environ, "DB_CONNECTION_MODE": mode, "SERVER_MODE": "wsgi"}
+            proc = subprocess.run(
+                [sys.executable, sys.argv[0], "bench_db_connections", "--child",
+                 "--requests", str(options["requests"]), "--path", options["path"]],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode:
+                raise CommandError(f"{mode} run failed:\n{proc.stderr}")
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+            self.report(mode, results[mode])
+
+        baseline = results["none"]["mean"]
+        for mode in MODES[1:]:
+            saved = baseline - results[mode]["mean"]
+            self.stdout.write(f"{mode:>10}: {saved:.2f}ms less per request than connecting every time")
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f"{mode:>10}: n={result['requests']} mean={result['mean']:.2f}ms p50={result['p50']:.2f}ms "
+            f"p95={result['p95']:.2f}ms connects={result['connects']}"
+        )
+
+    def run_child(self, options):
+        # Through the real handler, not the test client: the client disconnects
+        # close_old_connections, which is exactly what decides reuse here.
+        middleware = [m for m in settings.MIDDLEWARE if "rate_limiting" not in m]
+        user = User.objects.create_user(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password=None)
+        token = str(TokenSerializer.get_token(user).access_token)
+        try:
+            # With the response and auth caches on, a warm GET never reaches the DB.
+            with override_settings(
+                MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"],
+                RESPONSE_CACHE={**settings.RESPONSE_CACHE, "ENABLED": False},
+                AUTH_CACHE={**settings.AUTH_CACHE, "ENABLED": False},
+            ):
+                handler = WSGIHandler()
+                self.request(handler, options["path"], token)  # warm-up
+                before = self.connects()
+                timings = []
+                for _ in range(options["requests"]):
+                    start = time.perf_counter()
+                    status_code = self.request(handler, options["path"], token)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if status_code != 200:
+                        raise CommandError(f"GET {options['path']} returned {status_code}")
+                connects = self.connects() - before
+        finally:
+            user.delete()
+
+        cuts = statistics.quantiles(timings, n=100)
+        self.stdout.write(json.dumps({
+            "requests": len(timings), "mean": statistics.fmean(timings), "p50": cuts[49], "p95": cuts[94],
+            "connects": connects,
+        }))
+
+    def connects(self):
+        return instrumentation.connection_stats()["databases"]["default"]["connects"]
+
+    def request(self, handler, path, token):
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": "bench",
+            "SERVER_PORT": "80", "wsgi.url_scheme": "http", "wsgi.input": BytesIO(), "wsgi.errors": sys.stderr,
+            "HTTP_AUTHORIZATION": f"Bearer {token}",
+        }
+        status = []
+        response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        b"".join(response)
+        # Fires request_finished, which (like a real server) closes or returns the connection.
+        response.close()
+        return int(status[0].split()[0])
@@ -0,0 +1,47 @@
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api import event_sink
+from api.models import Project, User
+
+
+class Command(BaseCommand):
+    help = "Measure write-endpoint latency (POST /api/tasks/) with the sync and buffered timeline sinks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        middleware = [m for m in settings.MIDDLEWARE if "rate_limiting" not in m]
+        user = User.objects.create_user(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password=None)
+        try:
+            project = Project.objects.create(name="bench", owner=user)
+            client = APIClient()
+            client.force_authenticate(user)
+
+            with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+                for mode in ("sync", "buffered"):
+                    sink = event_sink.build_event_sink({**settings.TIMELINE_EVENT_SINK, "MODE": mode})
+                    event_sink._sink = sink
+                    timings = []
+                    for i in range(options["requests"]):
+                        start = time.perf_counter()
+                        client.post("/api/tasks/", {"project": project.id, "title": f"task {i}"})
+                        timings.append((time.perf_counter() - start) * 1000)
+                    sink.close()
+                    self.report(mode, timings)
+        finally:
+            event_sink._sink = None
+            user.delete()
+
+    def report(self, mode, timings):
+        cuts = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"{mode:>9}: n={len(timings)} p50={cuts[49]:.2f}ms p99={cuts[98]:.2f}ms max={max(timings):.2f}ms"
+        )
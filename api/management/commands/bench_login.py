@@ -0,0 +1,78 @@
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api import login
+from api.models import User
+from api.serializers import TokenSerializer
+
+PASSWORD = "bench-login-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure POST /api/users/login/ throughput: logins/sec overall and per CPU core (logins per "
+        "CPU-second of this process), optionally against the old authenticate-twice flow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=8, help="Clients logging in at once.")
+        parser.add_argument("--compare", action="store_true", help="Also time authenticate() + TokenSerializer.")
+
+    def handle(self, *args, **options):
+        hasher = get_hasher()
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        config = login.get_config()
+        self.stdout.write(
+            f"hasher={hasher.algorithm} iterations={getattr(hasher, 'iterations', '-')} cores={cores} "
+            f"hash_workers={config['HASH_WORKERS']} max_pending={config['MAX_PENDING']}"
+        )
+
+        middleware = [m for m in settings.MIDDLEWARE if "rate_limiting" not in m]
+        user = User.objects.create_user(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password=PASSWORD)
+        try:
+            with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=["*"]):
+                self.run("login", options, lambda: self.post_login(user.email))
+                if options["compare"]:
+                    self.run("double-hash", options, lambda: self.legacy_login(user.email))
+        finally:
+            user.delete()
+
+    def post_login(self, email):
+        response = APIClient().post("/api/users/login/", {"email": email, "password": PASSWORD}, format="json")
+        return response.status_code
+
+    def legacy_login(self, email):
+        # What UserViewSet.login used to do: authenticate, then let the serializer authenticate again.
+        close_old_connections()
+        if authenticate(None, email=email, password=PASSWORD) is None:
+            return 401
+        serializer = TokenSerializer(data={"email": email, "password": PASSWORD})
+        serializer.is_valid(raise_exception=True)
+        return 200
+
+    def run(self, label, options, attempt):
+        statuses = Counter()
+        wall, cpu = time.perf_counter(), time.process_time()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as clients:
+            for status_code in clients.map(lambda _: attempt(), range(options["logins"])):
+                statuses[status_code] += 1
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+        ok = statuses[200]
+        summary = ", ".join(f"{count}x{code}" for code, count in sorted(statuses.items()))
+        self.stdout.write(
+            f"{label:>11}: {ok / wall:7.1f} logins/s, {ok / cpu if cpu else 0:6.1f} logins/s per core "
+            f"({cpu / max(ok, 1) * 1000:.0f}ms CPU each; {summary})"
+        )
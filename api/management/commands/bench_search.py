@@ -0,0 +1,130 @@
+import itertools
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import search
+from api.models import Comment, Document, Project, Task, User
+
+DOMAIN_WORDS = (
+    "invoice payment gateway release deploy rollback migration schema index cache redis postgres "
+    "login session token refresh upload download preview thumbnail export import report dashboard "
+    "chart metric alert incident outage latency timeout retry queue worker notification email "
+    "design review sprint backlog estimate roadmap milestone customer onboarding billing refund "
+    "discount coupon tax currency rounding audit permission role admin settings profile avatar"
+).split()
+SYLLABLES = "ka lo mi nu pe ra si to vu ze bra cle dri fro gli pla sto tri".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a synthetic dataset of tasks, comments and documents spread over --owners users and time "
+        "owner-scoped /api/search/ queries against it. Requires PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--owners", type=int, default=100)
+        parser.add_argument("--projects", type=int, default=10, help="Projects per owner.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--keep", action="store_true", help="Leave the synthetic data in place afterwards.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Full-text search needs PostgreSQL.")
+
+        rng = random.Random(42)
+        # Real text is Zipf-distributed: a few words are everywhere, most are rare.
+        # Domain words first, then pronounceable filler, weighted 1 / (rank + 50).
+        filler = {"".join(rng.choices(SYLLABLES, k=3)) for _ in range(6000)} - set(DOMAIN_WORDS)
+        self.vocabulary = DOMAIN_WORDS + sorted(filler)
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 50) for rank in range(len(self.vocabulary))))
+        users = User.objects.bulk_create(
+            User(email=f"bench-search-{uuid.uuid4().hex[:8]}@example.com") for _ in range(options["owners"])
+        )
+        try:
+            started = time.perf_counter()
+            self.load(users, rng, options)
+            with connection.cursor() as cursor:
+                for table in ("api_project", "api_task", "api_comment", "api_document"):
+                    cursor.execute(f"ANALYZE {table}")
+            self.stdout.write(f"Loaded {options['rows']} rows in {time.perf_counter() - started:.1f}s")
+
+            timings = []
+            for _ in range(max(options["queries"], 2)):
+                user, text = rng.choice(users), " ".join(self.words(rng, rng.choice((1, 1, 2))))
+                start = time.perf_counter()
+                search.search(user, text)
+                timings.append((time.perf_counter() - start) * 1000)
+            cuts = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f"search (all types): n={len(timings)} p50={cuts[49]:.2f}ms p95={cuts[94]:.2f}ms "
+                f"p99={cuts[98]:.2f}ms max={max(timings):.2f}ms"
+            )
+        finally:
+            if not options["keep"]:
+                self.cleanup(users)
+
+    def words(self, rng, k):
+        return rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=k)
+
+    def sentence(self, rng, words):
+        return " ".join(self.words(rng, words))
+
+    def load(self, users, rng, options):
+        projects = Project.objects.bulk_create(
+            Project(name=self.sentence(rng, 3), description=self.sentence(rng, 12), owner=user)
+            for user in users for _ in range(options["projects"])
+        )
+        # 70% tasks, 25% comments, 5% documents.
+        remaining = {"task": int(options["rows"] * 0.7), "comment": int(options["rows"] * 0.25)}
+        remaining["document"] = options["rows"] - remaining["task"] - remaining["comment"]
+        batch_size = options["batch_size"]
+
+        while remaining["task"] > 0:
+            n = min(batch_size, remaining["task"])
+            Task.objects.bulk_create(
+                Task(project=rng.choice(projects), title=self.sentence(rng, 5), description=self.sentence(rng, 25))
+                for _ in range(n)
+            )
+            remaining["task"] -= n
+
+        tasks = list(
+            Task.objects.filter(project__in=projects).order_by("?").values_list("id", "project__owner_id")[:50_000]
+        )
+        while remaining["comment"] > 0:
+            n = min(batch_size, remaining["comment"])
+            comments = []
+            for _ in range(n):
+                task_id, owner_id = rng.choice(tasks)
+                comments.append(Comment(user_id=owner_id, task_id=task_id, content=self.sentence(rng, 20)))
+            Comment.objects.bulk_create(comments)
+            remaining["comment"] -= n
+
+        while remaining["document"] > 0:
+            n = min(batch_size, remaining["document"])
+            documents = []
+            for _ in range(n):
+                project = rng.choice(projects)
+                documents.append(Document(
+                    project=project, uploaded_by_id=project.owner_id, file=f"documents/bench-{uuid.uuid4().hex}",
+                    name=self.sentence(rng, 4), description=self.sentence(rng, 15),
+                ))
+            Document.objects.bulk_create(documents)
+            remaining["document"] -= n
+
+    def cleanup(self, users):
+        # Plain DELETEs: the ORM cascade would load and signal every row.
+        ids = [user.pk for user in users]
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_comment WHERE user_id = ANY(%s)", [ids])
+            cursor.execute("DELETE FROM api_document WHERE uploaded_by_id = ANY(%s)", [ids])
+            cursor.execute(
+                "DELETE FROM api_task WHERE project_id IN (SELECT id FROM api_project WHERE owner_id = ANY(%s))", [ids]
+            )
+        User.objects.filter(pk__in=ids).delete()
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.db.models import Max
+
+from api import replicas
+from api.models import Notification, Task, TimelineEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Check each read replica: that it's reachable, its replay lag (Postgres standbys) and whether it "
+        "has caught up with the primary's newest tasks, timeline events and notifications."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-lag", type=float, default=30.0, help="Seconds of replay lag to tolerate.")
+
+    def handle(self, *args, **options):
+        aliases = replicas.get_config()["ALIASES"]
+        if not aliases:
+            self.stdout.write("No read replicas configured (set DB_REPLICA_HOSTS).")
+            return
+
+        newest = self.newest("default")
+        failed = []
+        for alias in aliases:
+            try:
+                lag, standby = self.replay_lag(alias)
+                behind = {
+                    label: primary_id - replica_id
+                    for (label, primary_id), replica_id in zip(newest.items(), self.newest(alias).values())
+                    if primary_id != replica_id
+                }
+            except DatabaseError as exc:
+                failed.append(alias)
+                self.stdout.write(f"FAIL {alias}: {exc}")
+                continue
+
+            notes = []
+            if standby is False:
+                notes.append("not a standby")
+            if lag is not None:
+                notes.append(f"lag={lag:.1f}s")
+            notes += [f"{label} behind by {gap} ids" for label, gap in behind.items()]
+            ok = lag is None or lag <= options["max_lag"]
+            if not ok:
+                failed.append(alias)
+            self.stdout.write(f"{'ok  ' if ok else 'FAIL'} {alias}: {', '.join(notes) or 'caught up'}")
+
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(aliases)} replicas failed the check.")
+
+    def newest(self, alias):
+        return {
+            model._meta.model_name: model.objects.using(alias).aggregate(newest=Max("id"))["newest"] or 0
+            for model in (Task, TimelineEvent, Notification)
+        }
+
+    def replay_lag(self, alias):
+        """``(seconds behind, is a standby)``; both None on backends without streaming replication."""
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return None, None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_is_in_recovery(), "
+                "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+            )
+            standby, lag = cursor.fetchone()
+        return (float(lag) if lag is not None else None), standby
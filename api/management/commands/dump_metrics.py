@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+from api.instrumentation import route_histograms
+
+
+class Command(BaseCommand):
+    help = "Print per-route request metrics aggregated across all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the raw snapshot as JSON.")
+        parser.add_argument("--reset", action="store_true", help="Clear the metrics after printing them.")
+
+    def handle(self, *args, **options):
+        snapshot = route_histograms.snapshot()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(snapshot, indent=2))
+        else:
+            self.stdout.write(f"{'route':<32} {'count':>8} {'avg ms':>8} {'db ms':>8} {'ser ms':>8} {'queries':>8} {'max q':>6} {'dup':>6}")
+            for route, stats in sorted(snapshot.items(), key=lambda item: -item[1]["avg_ms"] * item[1]["count"]):
+                self.stdout.write(
+                    f"{route:<32} {stats['count']:>8} {stats['avg_ms']:>8} {stats['avg_db_ms']:>8} "
+                    f"{stats['avg_serialize_ms']:>8} {stats['avg_queries']:>8} {stats['max_queries']:>6} "
+                    f"{stats['duplicate_queries']:>6}"
+                )
+
+            depths = jobs.queue_depths()
+            self.stdout.write(f"\n{'job queue':<32} {'ready':>8} {'delayed':>8} {'running':>8} {'dead':>8}   ({depths['workers']} workers)")
+            for queue, depth in depths["queues"].items():
+                self.stdout.write(
+                    f"{queue:<32} {depth['ready']:>8} {depth['delayed']:>8} {depth['running']:>8} {depth['dead']:>8}"
+                )
+
+        if options["reset"]:
+            route_histograms.reset()
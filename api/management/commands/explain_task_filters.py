@@ -0,0 +1,107 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api.views import TaskViewSet
+
+# (query string, intended index). Each supported filter, alone and in the
+# combinations boards actually send. ``updated_since`` is recent, as a
+# polling client's would be.
+CASES = [
+    ({"project": "{project}"}, "task_project_created_idx"),
+    ({"project": "{project}", "is_completed": "false"}, "task_project_open_idx"),
+    ({"project": "{project}", "is_completed": "true", "ordering": "-updated_at"}, "task_project_updated_idx"),
+    # A range on updated_at alone: the delta-sync index has it right after project_id.
+    ({"project": "{project}", "updated_since": "{recent}"}, "task_project_synced_idx"),
+    ({"project": "{project}", "is_completed": "false", "updated_since": "{recent}"},
+     "task_project_updated_idx"),
+    ({"assigned_to": "me"}, "task_assignee_updated_idx"),
+    ({"assigned_to": "me", "is_completed": "false", "ordering": "-updated_at"}, "task_assignee_updated_idx"),
+    ({"assigned_to": "{user}", "updated_since": "{recent}"}, "task_assignee_updated_idx"),
+]
+
+
+def plan_indexes(node, table="api_task", bitmap_of=None):
+    """``(index names, seq scanned?)`` for ``table`` anywhere in an EXPLAIN (FORMAT JSON) plan."""
+    indexes, seq_scan = set(), False
+    relation = node.get("Relation Name", bitmap_of)
+    if relation == table:
+        if node.get("Index Name"):
+            indexes.add(node["Index Name"])
+        seq_scan = node["Node Type"] == "Seq Scan"
+    # Bitmap index scans name their index but not their table; that's on the heap scan above them.
+    inherited = relation if node["Node Type"] == "Bitmap Heap Scan" or bitmap_of else None
+    for child in node.get("Plans", ()):
+        child_indexes, child_seq_scan = plan_indexes(child, table, inherited)
+        indexes |= child_indexes
+        seq_scan = seq_scan or child_seq_scan
+    return indexes, seq_scan
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the first page of /api/tasks/ for every supported filter. Fails if any of them "
+        "has to seq scan api_task; warns (fails with --strict) if the planner picks a different "
+        "index than intended. Requires PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Email of the user to run as (default: the first project owner).")
+        parser.add_argument("--strict", action="store_true", help="Also fail when a filter skips its intended index.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print each plan.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Index checks need PostgreSQL.")
+
+        users = get_user_model().objects.filter(projects__isnull=False)
+        user = (users.filter(email=options["user"]) if options["user"] else users.order_by("pk")).first()
+        if user is None:
+            raise CommandError("Need a user who owns at least one project.")
+        # Their busiest project: on an empty one every plan looks the same.
+        project = user.projects.annotate(size=Count("tasks")).order_by("-size").values_list("pk", flat=True).first()
+
+        recent = (timezone.now() - timedelta(minutes=5)).isoformat()
+        failures = 0
+        for params, intended in CASES:
+            params = {key: value.format(project=project, user=user.pk, recent=recent) for key, value in params.items()}
+            plan = self.explain(user, params)
+            indexes, seq_scan = plan_indexes(plan)
+            label = "&".join(f"{key}={value}" for key, value in params.items() if key != "updated_since")
+            label += "&updated_since=<recent>" if "updated_since" in params else ""
+            used = ", ".join(sorted(indexes)) or "no index"
+            if seq_scan or not indexes:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {label:<60} seq scan ({used})"))
+            elif intended not in indexes:
+                failures += options["strict"]
+                self.stdout.write(self.style.WARNING(f"warn {label:<60} {used} (intended {intended})"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {label:<60} {used}"))
+            if options["verbose_plans"]:
+                self.stdout.write(json.dumps(plan, indent=2))
+
+        if failures:
+            raise CommandError(f"{failures} of {len(CASES)} task filters failed the index check.")
+
+    def explain(self, user, params):
+        request = Request(RequestFactory().get("/api/tasks/", params))
+        request.user = user
+        view = TaskViewSet(request=request, args=(), kwargs={}, format_kwarg=None, action="list")
+        queryset = view.paginator.get_page_queryset(view.filter_queryset(view.get_queryset()), request, view=view)
+        sql, sql_params = queryset.query.sql_with_params()
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # A small or freshly loaded table is cheaper to seq scan, which says
+            # nothing about whether the index *can* serve the query. Take seq
+            # scans off the table so the planner shows the index it would use.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", sql_params)
+            return cursor.fetchone()[0][0]["Plan"]
@@ -0,0 +1,77 @@
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.extraction import extract_blob, get_config, lower_priority, pending_blobs
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract searchable text from document blobs that have none yet (or only from an older extractor), "
+        "using a pool of low-priority, read-throttled worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Worker processes (default: EXTRACTION['WORKERS']).")
+        parser.add_argument("--limit", type=int, help="Stop after this many blobs.")
+        parser.add_argument("--retry-failed", action="store_true", help="Also retry blobs whose extraction failed.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        config = get_config()
+        pending = pending_blobs(options["retry_failed"])
+        if options["dry_run"]:
+            count = pending.count()
+            self.stdout.write(f"Would extract {min(count, options['limit'] or count)} blobs")
+            return
+
+        workers = options["workers"] or config["WORKERS"]
+        remaining = options["limit"] or float("inf")
+        statuses = Counter()
+        started = time.perf_counter()
+        batch = self.next_batch(pending, None, remaining)
+        # Workers are forked together on the first submit; close this process's
+        # connections first so none of them inherits (and shares) a socket.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+            initializer=lower_priority, initargs=(config["NICE"],),
+        ) as pool:
+            # Pending ids are paged by primary key and at most two per worker
+            # are in flight, so a backlog of millions never sits in memory.
+            in_flight = set()
+            while batch:
+                for sha256 in batch:
+                    in_flight.add(pool.submit(extract_blob, sha256))
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        self.tally(done, statuses)
+                remaining -= len(batch)
+                batch = self.next_batch(pending, batch[-1], remaining)
+            self.tally(wait(in_flight).done, statuses)
+
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())) or "nothing to do"
+        self.stdout.write(self.style.SUCCESS(
+            f"Extracted {sum(statuses.values())} blobs in {time.perf_counter() - started:.1f}s: {summary}"
+        ))
+
+    def next_batch(self, pending, after, remaining):
+        if remaining <= 0:
+            return []
+        if after is not None:
+            pending = pending.filter(pk__gt=after)
+        return list(pending.order_by("pk").values_list("pk", flat=True)[:min(BATCH_SIZE, remaining)])
+
+    def tally(self, futures, statuses):
+        for future in futures:
+            try:
+                statuses[future.result()] += 1
+            except Exception as exc:
+                self.stderr.write(f"Extraction crashed: {exc}")
+                statuses["crashed"] += 1
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from api.event_sink import BufferedEventSink
+
+
+class Command(BaseCommand):
+    help = "Replay timeline events spooled by the buffered event sink after failed flushes."
+
+    def handle(self, *args, **options):
+        config = settings.TIMELINE_EVENT_SINK
+        sink = BufferedEventSink(
+            batch_size=config.get("BATCH_SIZE", 200),
+            spool_path=config.get("SPOOL_PATH"),
+        )
+        try:
+            replayed = sink.replay_spool()
+        except DatabaseError as exc:
+            raise CommandError(f"Replay failed; spooled events kept in {sink.replaying_path}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} spooled timeline events"))
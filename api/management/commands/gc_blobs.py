@@ -0,0 +1,63 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Blob
+from api.storage import BLOB_PREFIX, blob_name, document_storage
+
+
+class Command(BaseCommand):
+    help = "Delete document blobs that no Document references, and stray files in the blob store."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="Only collect blobs unreferenced (or files untouched) for at least this long."
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        dry_run = options["dry_run"]
+        freed = deleted = 0
+
+        # Unreferenced blob rows. The grace period covers uploads that have
+        # written their blob but not yet committed the Document pointing at it.
+        candidates = Blob.objects.filter(ref_count=0, last_referenced_at__lt=cutoff).values_list("pk", flat=True)
+        for sha256 in candidates.iterator():
+            with transaction.atomic():
+                blob = (
+                    Blob.objects.select_for_update(skip_locked=True)
+                    .filter(pk=sha256, ref_count=0, last_referenced_at__lt=cutoff)
+                    .first()
+                )
+                if blob is None or blob.documents.exists():
+                    continue
+                if not dry_run:
+                    document_storage.delete(blob_name(blob.sha256))
+                    blob.delete()
+                freed += blob.size
+                deleted += 1
+
+        # Files with no blob row at all (e.g. a transaction rolled back after the write).
+        root = document_storage.path(BLOB_PREFIX)
+        known = set(Blob.objects.values_list("pk", flat=True))
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                sha256 = filename.split(".", 1)[0]
+                if sha256 in known or os.path.getmtime(path) >= cutoff.timestamp():
+                    continue
+                # Re-check: an upload may have adopted the file since ``known`` was read.
+                if Blob.objects.filter(pk=sha256).exists():
+                    continue
+                freed += os.path.getsize(path)
+                deleted += 1
+                if not dry_run:
+                    os.remove(path)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} blobs, {freed} bytes"))
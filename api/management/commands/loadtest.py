@@ -0,0 +1,73 @@
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a running server with concurrent GET requests and report throughput and latency. "
+        "Run it once against SERVER_MODE=wsgi and once against SERVER_MODE=asgi to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/api/tasks/")
+        parser.add_argument("--token", help="JWT access token sent as a Bearer header.")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run for.")
+        parser.add_argument("--label", default="", help="Tag printed with the results, e.g. 'asgi'.")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme not in ("http", "https"):
+            raise CommandError("--url must be an http(s) URL")
+        path = url.path + (f"?{url.query}" if url.query else "")
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+
+        deadline = time.perf_counter() + options["duration"]
+        timings, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            # One keep-alive connection per simulated client.
+            conn = connection_class(url.netloc, timeout=30)
+            local_timings, local_errors = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status >= 400:
+                        local_errors += 1
+                except (OSError, http.client.HTTPException):
+                    local_errors += 1
+                    conn.close()
+                    conn = connection_class(url.netloc, timeout=30)
+                    continue
+                local_timings.append((time.perf_counter() - start) * 1000)
+            conn.close()
+            with lock:
+                timings.extend(local_timings)
+                errors.append(local_errors)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if len(timings) < 2:
+            raise CommandError("Too few successful requests to report on; is the server running?")
+        cuts = statistics.quantiles(timings, n=100)
+        label = f"{options['label']}: " if options["label"] else ""
+        self.stdout.write(
+            f"{label}c={options['concurrency']} n={len(timings)} errors={sum(errors)} "
+            f"rps={len(timings) / elapsed:.1f} p50={cuts[49]:.2f}ms p99={cuts[98]:.2f}ms max={max(timings):.2f}ms"
+        )
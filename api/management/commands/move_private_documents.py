@@ -0,0 +1,36 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Everything the document storage and chunked uploads used to keep under MEDIA_ROOT.
+DIRECTORIES = ("blobs", "documents", "uploads")
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stored documents, blobs and staged uploads out of the public MEDIA_ROOT into "
+        "PRIVATE_MEDIA_ROOT. Run once after upgrading, before serving downloads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        moved = 0
+        for directory in DIRECTORIES:
+            source = os.path.join(settings.MEDIA_ROOT, directory)
+            target = os.path.join(settings.PRIVATE_MEDIA_ROOT, directory)
+            for root, _, filenames in os.walk(source):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    destination = os.path.join(target, os.path.relpath(path, source))
+                    moved += 1
+                    if options["dry_run"]:
+                        continue
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    shutil.move(path, destination)
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} files to {settings.PRIVATE_MEDIA_ROOT}"))
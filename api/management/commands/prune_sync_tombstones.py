@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import sync
+from api.models import Tombstone
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sync tombstones older than SYNC['TOMBSTONE_DAYS'], in batches. Clients holding a token "
+        "older than that get 410 from /api/sync/ and do a full sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Retention in days (default: SYNC['TOMBSTONE_DAYS']).")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"] or sync.get_config()["TOMBSTONE_DAYS"])
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+        pruned = 0
+        # Short batches keep each DELETE's locks and WAL burst small on a busy table.
+        while True:
+            batch = list(expired.order_by("deleted_at").values_list("id", flat=True)[:BATCH_SIZE])
+            if not batch:
+                break
+            pruned += Tombstone.objects.filter(id__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} sync tombstones"))
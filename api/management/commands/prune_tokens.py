@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding tokens (and their blacklist entries) in small batches, each in its "
+        "own short transaction. Replaces simplejwt's flushexpiredtokens, which deletes them all in one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.1, help="Pause between batches, in seconds.")
+        parser.add_argument(
+            "--grace-hours", type=int, default=1, help="Keep tokens this long past expiry (clock skew)."
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        expired = OutstandingToken.objects.filter(expires_at__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"Would prune {expired.count()} expired tokens")
+            return
+
+        pruned, started = 0, time.perf_counter()
+        while True:
+            # Walks outstanding_token_expires_idx; each batch locks at most batch-size rows.
+            batch = list(expired.order_by("expires_at", "id").values_list("id", flat=True)[:options["batch_size"]])
+            if not batch:
+                break
+            with transaction.atomic():
+                # Cascades to the batch's BlacklistedToken rows.
+                OutstandingToken.objects.filter(id__in=batch).delete()
+            pruned += len(batch)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {pruned} expired tokens in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import uploads
+from api.models import DocumentUpload
+
+
+class Command(BaseCommand):
+    help = "Delete chunked document uploads (and their staged files) that have not progressed recently."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        stale = DocumentUpload.objects.filter(updated_at__lt=cutoff)
+        purged = 0
+        for upload in stale.iterator():
+            uploads.discard_upload(upload)
+            upload.delete()
+            purged += 1
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} stale uploads"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Project
+
+
+class Command(BaseCommand):
+    help = "Rebuild every project's denormalized task, document and comment counters and last activity from the rows."
+
+    def handle(self, *args, **options):
+        updated = Project.objects.recount()
+        self.stdout.write(f"Recounted stats for {updated} projects.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Notification
+
+
+class Command(BaseCommand):
+    help = "Rebuild every user's denormalized unread-notification counter from the notification rows."
+
+    def handle(self, *args, **options):
+        updated = Notification.objects.recount()
+        self.stdout.write(f"Recounted unread notifications for {updated} users.")
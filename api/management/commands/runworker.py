@@ -0,0 +1,38 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.jobs import Worker, get_config
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the Redis job queues until interrupted (SIGINT/SIGTERM)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queues", help="Comma-separated queues to consume (default: every queue in settings.JOBS)."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, help="Threads per queue, overriding each queue's CONCURRENCY."
+        )
+
+    def handle(self, *args, **options):
+        configured = get_config()["QUEUES"]
+        queues = options["queues"].split(",") if options["queues"] else None
+        unknown = set(queues or ()) - set(configured)
+        if unknown:
+            raise CommandError(f"Unknown queues: {', '.join(sorted(unknown))}")
+
+        worker = Worker(queues=queues, concurrency=options["concurrency"])
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        worker.start()
+        summary = ", ".join(f"{queue} x{slots}" for queue, slots in worker.queues.items())
+        self.stdout.write(f"Worker {worker.id} consuming: {summary}")
+        stop.wait()
+
+        self.stdout.write("Stopping; waiting for running jobs to finish...")
+        worker.stop()
@@ -1,28 +1,57 @@
 import logging
-from datetime import datetime
-import os
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
 
-LOG_DIR = "logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+access_logger = logging.getLogger("api.access")
 
-log_file = os.path.join(LOG_DIR, "ip_log.log")
 
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s - %(message)s",
-    filemode="a",
-)
+class IPLoggingMiddleware:
+    """
+    Emits one structured access-log record per request.
 
+    The record is handed to the ``api.access`` logger, whose queued handler
+    (see ``settings.LOGGING``) formats and writes it off the request thread.
+    """
+
+    sync_capable = True
+    async_capable = True
 
-class IPLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        ip = request.META.get("REMOTE_ADDR")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        logging.info(f"IP: {ip} | Time: {timestamp}")
-        return self.get_response(request)
-    
\ No newline at end of file
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        if access_logger.isEnabledFor(logging.INFO):
+            # DRF copies the authenticated (JWT) user back onto the Django request.
+            self.log_request(request, response, start, getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        if access_logger.isEnabledFor(logging.INFO):
+            user = getattr(request, "user", None)
+            if type(user) is SimpleLazyObject:
+                # Still the session-backed lazy user; resolving it synchronously would block the loop.
+                user = await request.auser()
+            self.log_request(request, response, start, user)
+        return response
+
+    def log_request(self, request, response, start, user):
+        match = request.resolver_match
+        access_logger.info("request", extra={
+            "ip": request.META.get("REMOTE_ADDR"),
+            "method": request.method,
+            "path": request.path,
+            "route": match.view_name if match else None,
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+        })
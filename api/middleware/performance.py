@@ -0,0 +1,87 @@
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+
+from api.instrumentation import QueryRecorder, get_config, route_histograms, track_request
+
+logger = logging.getLogger("api.performance")
+
+
+class PerformanceMiddleware:
+    """
+    Records query count, DB time, duplicate queries, serializer time and total
+    time for each request. The numbers are sent back as a ``Server-Timing``
+    header (to staff users only, by default) and folded into per-route
+    histograms (see ``/api/_metrics/`` and ``manage.py dump_metrics``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.config["ENABLED"]:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with track_request() as metrics, ExitStack() as stack:
+            self.install_recorders(stack, metrics)
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if not self.config["ENABLED"]:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        # DB connections are thread-bound, and async ORM calls run on the
+        # request's thread-sensitive executor thread, so the recorders have to
+        # be installed (and removed) on that thread.
+        with track_request() as metrics:
+            stack = ExitStack()
+            await sync_to_async(self.install_recorders)(stack, metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        return self.finish(request, response, metrics, start)
+
+    def install_recorders(self, stack, metrics):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(QueryRecorder(metrics)))
+
+    def finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        route = match.view_name if match else "unresolved"
+
+        if metrics.duplicate_queries >= self.config["DUPLICATE_QUERY_THRESHOLD"]:
+            logger.warning(
+                "Possible N+1 on %s: %d queries, %d duplicate",
+                route, metrics.queries, metrics.duplicate_queries
+            )
+        if self.show_server_timing(request):
+            response["Server-Timing"] = metrics.server_timing(total_ms)
+        route_histograms.observe(route, metrics, total_ms)
+        return response
+
+    def show_server_timing(self, request):
+        mode = self.config["SERVER_TIMING"]
+        if mode != "staff":
+            return mode == "all"
+        # Only a user the view already resolved: a lazy session user would cost a
+        # query here, and can't be loaded at all on the async path.
+        user = getattr(request, "user", None)
+        if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+            return False
+        return user.is_staff
@@ -1,41 +1,219 @@
+import math
+import threading
 import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.core.cache import cache
 from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Sliding-window counter: the previous fixed window is weighted by how much of it
+# still overlaps the sliding window. Pending hits admitted by a worker's local
+# fast path are folded in first, so every request is counted exactly once.
+#
+# KEYS[1] current window counter, KEYS[2] previous window counter
+# ARGV: limit, window_ms, elapsed_ms (into current window), pending local hits
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local pending = tonumber(ARGV[4])
+
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if pending > 0 then
+    current = redis.call('INCRBY', KEYS[1], pending)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+end
+
+local weight = (window - elapsed) / window
+if previous * weight + current + 1 > limit then
+    local retry = window - elapsed
+    if previous > 0 and current + 1 <= limit then
+        retry = math.ceil(window * (1 - (limit - 1 - current) / previous)) - elapsed
+    end
+    return {0, math.floor(previous * weight + current), retry}
+end
+
+current = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(previous * weight + current), 0}
+"""
+
+DEFAULT_CONFIG = {
+    "CACHE_ALIAS": "default",
+    "DEFAULT": {"limit": 100, "window": 60},
+    "AUTHENTICATED": {"limit": 100, "window": 60},
+    "ROUTES": [],
+    "FAST_PATH_RATIO": 0.5,
+    "FAST_PATH_MAX_PENDING": 5,
+}
 
 
 class RateLimitingMiddleware:
+    """
+    Sliding-window rate limiting with one atomic Redis round trip per check.
+
+    Limits come from ``settings.RATE_LIMITING``: ``DEFAULT`` for anonymous
+    clients (keyed by IP), ``AUTHENTICATED`` for users (keyed by user id, read
+    from the session or the bearer token), and ``ROUTES`` entries that give a
+    path prefix its own, separately counted limit.
+
+    Clients that are well under their limit are admitted from a per-process
+    counter and their hits are pushed to Redis with the next real check. Every
+    hit is still counted exactly; enforcement can overshoot by at most
+    ``FAST_PATH_MAX_PENDING`` per worker process.
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.config = {**DEFAULT_CONFIG, **getattr(settings, "RATE_LIMITING", {})}
+        self._local = {}
+        self._lock = threading.Lock()
+        self._script = None
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        print("-- RateLimitingMiddleware triggered --")
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        identifier = self.get_identifier(request, getattr(request, "user", None))
+        scope, rule = self.get_rule(request, identifier)
+        allowed, retry_after = self.hit(f"rl:{scope}:{identifier}", rule["limit"], rule["window"])
+        if not allowed:
+            return self.limited_response(rule, retry_after)
+        return self.get_response(request)
 
-        # Use user ID if logged in, else use IP address
-        user = getattr(request, "user", None)
-        ip = request.META.get("REMOTE_ADDR")
-        identifier = str(user.id) if user and user.is_authenticated else ip
+    async def __acall__(self, request):
+        user = await request.auser() if hasattr(request, "auser") else None
+        identifier = self.get_identifier(request, user)
+        scope, rule = self.get_rule(request, identifier)
+        # The Redis round trip is blocking; keep it off the event loop.
+        allowed, retry_after = await sync_to_async(self.hit, thread_sensitive=False)(
+            f"rl:{scope}:{identifier}", rule["limit"], rule["window"]
+        )
+        if not allowed:
+            return self.limited_response(rule, retry_after)
+        return await self.get_response(request)
 
-        # Rate limit config
-        max_requests = 100
-        key = f"rl:{identifier}"
+    def limited_response(self, rule, retry_after):
+        response = JsonResponse(
+            {"detail": f"Rate limit exceeded. Max {rule['limit']} requests per {rule['window']} seconds."},
+            status=429
+        )
+        response["Retry-After"] = str(retry_after)
+        return response
+
+    def get_identifier(self, request, user):
+        if user and user.is_authenticated:
+            return f"user:{user.pk}"
+
+        # JWT users are only authenticated inside DRF views; read the claim without a DB hit.
+        header = request.META.get("HTTP_AUTHORIZATION", "").split()
+        if len(header) == 2 and header[0] in jwt_settings.AUTH_HEADER_TYPES:
+            try:
+                return f"user:{AccessToken(header[1])[jwt_settings.USER_ID_CLAIM]}"
+            except (TokenError, KeyError):
+                pass
+
+        return f"ip:{request.META.get('REMOTE_ADDR')}"
+
+    def get_rule(self, request, identifier):
+        for rule in self.config["ROUTES"]:
+            if request.path.startswith(rule["prefix"]):
+                return rule["prefix"], rule
+        if identifier.startswith("user:"):
+            return "default", self.config["AUTHENTICATED"]
+        return "default", self.config["DEFAULT"]
+
+    def hit(self, key, limit, window):
+        """Count one request against ``key``. Returns ``(allowed, retry_after_seconds)``."""
         now = time.time()
+        window_id = int(now // window)
+        # Fast-path hits admitted in windows that have since ended: (key, window_id, hits, window).
+        unpushed = []
 
-        data = cache.get(key, {"count": 0, "timestamp": now})
+        with self._lock:
+            state = self._local.get(key)
+            if state is None or state["window"] != window_id:
+                if state is not None and state["pending"]:
+                    unpushed.append((key, state["window"], state["pending"], window))
+                if len(self._local) > 10000:
+                    for k, v in self._local.items():
+                        if v["window"] != window_id and v["pending"] and k != key:
+                            unpushed.append((k, v["window"], v["pending"], v["span"]))
+                    self._local = {k: v for k, v in self._local.items() if v["window"] == window_id}
+                state = self._local[key] = {
+                    "window": window_id, "span": window, "known": 0, "pending": 0, "synced": False, "checking": 0
+                }
 
-        # Reset count if time window passed
-        if now - data["timestamp"] > 60:
-            data = {"count": 0, "timestamp": now}
+            if (
+                state["synced"]
+                and not state["checking"]
+                and state["pending"] < self.config["FAST_PATH_MAX_PENDING"]
+                and state["known"] + state["pending"] + 1 <= limit * self.config["FAST_PATH_RATIO"]
+            ):
+                state["pending"] += 1
+                return True, 0
 
-        if data["count"] >= max_requests:
-            print("Rate limit exceeded:", identifier)
-            return JsonResponse(
-                {"detail": "Rate limit exceeded. Max 100 requests per minute."},
-                status=429
-            )
+            pending, state["pending"] = state["pending"], 0
+            state["checking"] += 1
 
-        data["count"] += 1
-        cache.set(key, data, timeout=60)
-        print(f"Request #{data['count']} allowed for {identifier}")
+        try:
+            for args in unpushed:
+                self._push_pending(*args)
+            allowed, used, retry_ms = self._check(key, window_id, limit, window, now, pending)
+            with self._lock:
+                state["known"] = used
+                state["synced"] = True
+        finally:
+            with self._lock:
+                state["checking"] -= 1
 
-        return self.get_response(request)
-    
\ No newline at end of file
+        return allowed, max(1, math.ceil(retry_ms / 1000))
+
+    def _check(self, key, window_id, limit, window, now, pending):
+        window_ms = window * 1000
+        elapsed_ms = int(now * 1000 - window_id * window_ms)
+        keys = [f"{key}:{window_id}", f"{key}:{window_id - 1}"]
+
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection(self.config["CACHE_ALIAS"])
+        except (ImportError, NotImplementedError):
+            return self._check_cache(keys, limit, window, elapsed_ms, pending)
+
+        if self._script is None:
+            self._script = client.register_script(SLIDING_WINDOW_SCRIPT)
+        allowed, used, retry_ms = self._script(keys=keys, args=[limit, window_ms, elapsed_ms, pending], client=client)
+        return bool(allowed), int(used), int(retry_ms)
+
+    def _push_pending(self, key, window_id, pending, window):
+        """Add fast-path hits to the counter of the (now previous) window they were admitted in."""
+        counter = f"{key}:{window_id}"
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection(self.config["CACHE_ALIAS"])
+        except (ImportError, NotImplementedError):
+            cache.add(counter, 0, timeout=window * 2)
+            cache.incr(counter, pending)
+            return
+        client.pipeline().incrby(counter, pending).pexpire(counter, window * 2000).execute()
+
+    def _check_cache(self, keys, limit, window, elapsed_ms, pending):
+        # Non-Redis caches (local development): same algorithm via atomic incr.
+        cache.add(keys[0], 0, timeout=window * 2)
+        current = cache.incr(keys[0], pending + 1)
+        previous = cache.get(keys[1], 0)
+        window_ms = window * 1000
+        used = previous * (window_ms - elapsed_ms) / window_ms + current
+        if used > limit:
+            cache.decr(keys[0])
+            return False, int(used) - 1, window_ms - elapsed_ms
+        return True, int(used), 0
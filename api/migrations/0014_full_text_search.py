@@ -0,0 +1,98 @@
+# Generated by Django 5.2 on 2026-10-18 17:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# table -> (column, weight) pairs folded into its search_vector.
+SEARCHABLE = {
+    'api_project': [('name', 'A'), ('description', 'B')],
+    'api_task': [('title', 'A'), ('description', 'B')],
+    'api_comment': [('content', 'B')],
+    'api_document': [('name', 'A'), ('description', 'B')],
+}
+
+
+def vector_sql(columns, prefix):
+    return ' || '.join(
+        f"setweight(to_tsvector('pg_catalog.english', coalesce({prefix}{column}, '')), '{weight}')"
+        for column, weight in columns
+    )
+
+
+def create_triggers(apps, schema_editor):
+    # tsvector/GIN only exist on Postgres; other backends just get the unused column.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in SEARCHABLE.items():
+        schema_editor.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {vector_sql(columns, 'NEW.')};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF {', '.join(column for column, _ in columns)}, search_vector ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector();
+
+            UPDATE {table} SET search_vector = {vector_sql(columns, '')};
+        """)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCHABLE:
+        schema_editor.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table};
+            DROP FUNCTION IF EXISTS {table}_search_vector();
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_unread_notification_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='comment_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='project_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='task_search_idx'),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 17:54
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+METADATA_VECTOR = (
+    "setweight(to_tsvector('pg_catalog.english', coalesce(NEW.name, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B')"
+)
+# Extracted file text ranks below the document's own name and description.
+CONTENT_VECTOR = (
+    "coalesce(setweight((SELECT search_vector FROM api_blobtext WHERE blob_id = NEW.blob_id), 'C'), '')"
+)
+
+
+def document_trigger_sql(vector, columns):
+    return f"""
+        CREATE OR REPLACE FUNCTION api_document_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {vector};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS api_document_search_vector_update ON api_document;
+        CREATE TRIGGER api_document_search_vector_update
+        BEFORE INSERT OR UPDATE OF {columns} ON api_document
+        FOR EACH ROW EXECUTE FUNCTION api_document_search_vector();
+    """
+
+
+def include_content(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(document_trigger_sql(
+        f"{METADATA_VECTOR} || {CONTENT_VECTOR}", "name, description, blob_id, search_vector"
+    ))
+
+
+def exclude_content(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(document_trigger_sql(METADATA_VECTOR, "name, description, search_vector"))
+    schema_editor.execute("UPDATE api_document SET search_vector = NULL")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobText',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='api.blob')),
+                ('status', models.CharField(choices=[('extracted', 'Extracted'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], max_length=20)),
+                ('extractor_version', models.PositiveSmallIntegerField()),
+                ('content', models.BinaryField(blank=True)),
+                ('text_bytes', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('extracted_at', models.DateTimeField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+        ),
+        migrations.RunPython(include_content, exclude_content),
+    ]
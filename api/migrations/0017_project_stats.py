@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_project_stats(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    Task = apps.get_model('api', 'Task')
+    Document = apps.get_model('api', 'Document')
+    Comment = apps.get_model('api', 'Comment')
+    TimelineEvent = apps.get_model('api', 'TimelineEvent')
+    project = OuterRef('pk')
+
+    def total(queryset, function='COUNT', field='id'):
+        return Subquery(queryset.order_by().annotate(total=Func(F(field), function=function)).values('total'))
+
+    Project.objects.update(
+        task_count=Coalesce(total(Task.objects.filter(project=project)), 0),
+        completed_task_count=Coalesce(total(Task.objects.filter(project=project, is_completed=True)), 0),
+        document_count=Coalesce(total(Document.objects.filter(project=project)), 0),
+        comment_count=Coalesce(total(Comment.objects.filter(Q(project=project) | Q(task__project=project))), 0),
+        last_activity_at=total(TimelineEvent.objects.filter(project=project), 'MAX', 'created_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_task_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='completed_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='document_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='last_activity_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_project_stats, migrations.RunPython.noop),
+    ]
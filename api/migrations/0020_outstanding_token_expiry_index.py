@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# simplejwt's OutstandingToken has no index on expires_at; prune_tokens walks
+# expired rows in (expires_at, id) order, so give it one. The table takes a
+# row per login, so it's built CONCURRENTLY (outside a transaction) rather
+# than locking out logins for the length of the build.
+INDEX = 'outstanding_token_expires_idx'
+
+
+class RunPostgreSQL(migrations.RunSQL):
+    """``RunSQL`` that does nothing on other databases, like the vendor checks in 0014 and 0015."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0019_user_token_version'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        RunPostgreSQL(
+            sql=[
+                # A build that failed part way leaves an INVALID index behind; start over.
+                f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX}',
+                f'CREATE INDEX CONCURRENTLY {INDEX} ON token_blacklist_outstandingtoken (expires_at, id)',
+            ],
+            reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX}',
+        ),
+    ]
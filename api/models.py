@@ -1,7 +1,36 @@
+import uuid
+from collections import Counter, defaultdict
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, Count, DateTimeField, F, Func, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.base_user import BaseUserManager
 from django.conf import settings
+from django.utils import timezone
+from django.core.files import File
+from .storage import blob_name, blob_sha256, get_document_storage, hash_content
+
+# ------------------- Denormalized Counters -------------------------
+class CounterFieldsMixin:
+    """
+    Leaves ``counter_fields`` out of a full ``save()`` of an existing row.
+    They're maintained by relative UPDATEs (``F() + delta``), so the
+    instance's copy is whatever was loaded and writing it back would undo
+    every change made since. Inserts and explicit ``update_fields`` are
+    left alone.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
 
 # ------------------- USER Manager -------------------------
 class UserManager(BaseUserManager):
@@ -20,29 +49,149 @@ class UserManager(BaseUserManager):
          return self.create_user(email, password, role="project_manager", **extra_fields)
 
 # ------------------- USER Model -------------------------
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     ROLE_CHOICES = [
         ("project_manager", "Project Manager"),
     ]
     role = models.CharField(max_length=15, choices=ROLE_CHOICES, default="project_manager")
     email = models.EmailField(unique=True)
+    # Denormalized badge count, kept in step by NotificationManager.
+    unread_notification_count = models.PositiveIntegerField(default=0, editable=False)
+    # Stamped into every token (api/authentication.py); bumping it revokes all of them.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     username = None
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = [] 
+    counter_fields = ("unread_notification_count",)
 
     objects = UserManager()
 
     def __str__(self):
         return self.email
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_active = instance.__dict__.get("is_active")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Deactivating a user revokes the tokens they already hold.
+        if getattr(self, "_loaded_active", None) and not self.is_active:
+            self.token_version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "token_version"}
+        super().save(*args, **kwargs)
+        self._loaded_active = self.is_active
+
+    def revoke_tokens(self):
+        """Invalidate every access token issued to this user so far."""
+        self.token_version += 1
+        self.save(update_fields=["token_version"])
     
+# ------------------- PROJECT Manager -------------------------
+STAT_COUNTERS = ("task_count", "completed_task_count", "document_count", "comment_count")
+
+
+class ProjectManager(models.Manager):
+    def adjust_counters(self, deltas):
+        """Apply ``{project_id: {counter: delta}}`` to the projects' stat counters in one UPDATE."""
+        deltas = {
+            project_id: {name: amount for name, amount in counters.items() if amount}
+            for project_id, counters in deltas.items() if project_id is not None
+        }
+        deltas = {project_id: counters for project_id, counters in deltas.items() if counters}
+        if not deltas:
+            return
+        changes = {}
+        for name in STAT_COUNTERS:
+            whens = [
+                When(pk=project_id, then=Value(counters[name]))
+                for project_id, counters in deltas.items() if name in counters
+            ]
+            if whens:
+                delta = Case(*whens, default=Value(0), output_field=IntegerField())
+                changes[name] = Greatest(F(name) + delta, 0)
+        self.filter(pk__in=deltas).update(**changes)
+
+    def record_activity(self, latest):
+        """Move each project's ``last_activity_at`` forward to ``{project_id: timestamp}`` in one UPDATE."""
+        latest = {project_id: at for project_id, at in latest.items() if project_id is not None}
+        if not latest:
+            return
+        at = Case(
+            *(When(pk=project_id, then=Value(timestamp)) for project_id, timestamp in latest.items()),
+            output_field=DateTimeField(),
+        )
+        self.filter(pk__in=latest).update(last_activity_at=Greatest(Coalesce(F("last_activity_at"), at), at))
+
+    def recount(self, projects=None):
+        """Rebuild stat counters and last activity from the rows themselves. Returns the number of projects updated."""
+        projects = self.all() if projects is None else projects
+        return projects.update(**stat_expressions())
+
+
+def stat_expressions(project=OuterRef("pk")):
+    """One correlated subquery per stat, so every stat of every project comes back in a single query."""
+    def total(queryset, function="COUNT", field="id", default=0):
+        # A plain Func rather than an aggregate, so no GROUP BY is added and
+        # the subquery always returns exactly one row.
+        value = queryset.order_by().annotate(total=Func(F(field), function=function)).values("total")
+        return Coalesce(Subquery(value), default) if default is not None else Subquery(value)
+
+    return {
+        "task_count": total(Task.objects.filter(project=project)),
+        "completed_task_count": total(Task.objects.filter(project=project, is_completed=True)),
+        "document_count": total(Document.objects.filter(project=project)),
+        "comment_count": total(Comment.objects.filter(Q(project=project) | Q(task__project=project))),
+        "last_activity_at": total(
+            TimelineEvent.objects.filter(project=project), "MAX", "created_at", default=None
+        ),
+    }
+
+
+def task_counter_deltas(changes):
+    """
+    ``{project_id: {counter: delta}}`` for ``(before, after)`` task states,
+    each ``(project_id, is_completed)`` or None for a task that doesn't exist
+    on that side (created / deleted).
+    """
+    deltas = defaultdict(Counter)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                project_id, completed = state
+                deltas[project_id]["task_count"] += sign
+                deltas[project_id]["completed_task_count"] += sign * completed
+    return deltas
+
 # ------------------- PROJECT Model -------------------------
-class Project(models.Model):
+class Project(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="projects")
+    # Weighted full-text vector, maintained by a database trigger (see api/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized stats, kept in step by ProjectManager on every task/document/comment/timeline write.
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_task_count = models.PositiveIntegerField(default=0, editable=False)
+    document_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(null=True, editable=False)
+    counter_fields = (*STAT_COUNTERS, "last_activity_at")
+
+    objects = ProjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-id"], name="project_owner_created_idx"),
+            # Delta sync (api/sync.py) scans forward from a checkpoint.
+            models.Index(fields=["owner", "updated_at", "id"], name="project_owner_synced_idx"),
+            GinIndex(fields=["search_vector"], name="project_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -53,27 +202,186 @@ class Task(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     is_completed = models.BooleanField(default=False)
+    # Indexed by task_assignee_updated_idx, whose leading column it is.
     assigned_to = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="assigned_tasks"
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="assigned_tasks",
+        db_index=False,
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-created_at", "-id"], name="task_project_created_idx"),
+            GinIndex(fields=["search_vector"], name="task_search_idx"),
+            # Board filters (TaskViewSet.filter_tasks). Open tasks are the common case,
+            # so they get a small partial index of their own.
+            models.Index(
+                fields=["project", "-created_at", "-id"], condition=models.Q(is_completed=False),
+                name="task_project_open_idx",
+            ),
+            models.Index(fields=["project", "is_completed", "-updated_at", "-id"], name="task_project_updated_idx"),
+            models.Index(fields=["assigned_to", "is_completed", "-updated_at", "-id"], name="task_assignee_updated_idx"),
+            models.Index(fields=["project", "updated_at", "id"], name="task_project_synced_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted = instance.counted_state()
+        return instance
+
+    def counted_state(self):
+        """What this task contributes to its project's counters; None when those fields weren't loaded."""
+        if "project_id" not in self.__dict__ or "is_completed" not in self.__dict__:
+            return None
+        return (self.project_id, self.is_completed)
+
+    def save(self, *args, **kwargs):
+        before = None
+        if not self._state.adding:
+            before = getattr(self, "_counted", None) or (
+                Task.objects.filter(pk=self.pk).values_list("project_id", "is_completed").first()
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Project.objects.adjust_counters(task_counter_deltas([(before, self.counted_state())]))
+        self._counted = self.counted_state()
     
+# ------------------- BLOB Manager -------------------------
+class BlobManager(models.Manager):
+    def acquire(self, sha256, size):
+        """Count one more reference to a blob, creating its row on first use."""
+        now = timezone.now()
+        if not self.filter(pk=sha256).update(ref_count=F("ref_count") + 1, last_referenced_at=now):
+            _, created = self.get_or_create(
+                sha256=sha256, defaults={"size": size, "ref_count": 1, "last_referenced_at": now}
+            )
+            if not created:
+                self.filter(pk=sha256).update(ref_count=F("ref_count") + 1, last_referenced_at=now)
+
+    def lock(self, sha256):
+        """
+        Hold a blob's row until the transaction ends. gc_blobs skips locked
+        rows, so its file can't be collected between the caller checking it
+        exists and taking the reference; a collection already under way is
+        waited out, after which the file is simply written again.
+        """
+        list(self.select_for_update().filter(pk=sha256).values_list("pk", flat=True))
+
+    def release(self, sha256):
+        self.filter(pk=sha256, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1, last_referenced_at=timezone.now()
+        )
+
+# ------------------- BLOB Model -------------------------
+class Blob(models.Model):
+    """One stored file, shared by every Document with identical content."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_referenced_at = models.DateTimeField(default=timezone.now)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+# ------------------- BLOB TEXT Model -------------------------
+class BlobText(models.Model):
+    """Text extracted from a blob (see api/extraction.py), zlib-compressed, plus its search vector."""
+    EXTRACTED = "extracted"
+    UNSUPPORTED = "unsupported"
+    FAILED = "failed"
+    STATUS_CHOICES = [(EXTRACTED, "Extracted"), (UNSUPPORTED, "Unsupported"), (FAILED, "Failed")]
+
+    blob = models.OneToOneField(Blob, on_delete=models.CASCADE, primary_key=True, related_name="text")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    extractor_version = models.PositiveSmallIntegerField()
+    content = models.BinaryField(blank=True)
+    text_bytes = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    extracted_at = models.DateTimeField()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self):
+        return f"{self.blob_id} ({self.status})"
+
 # ------------------- DOCUMENT Model -------------------------    
 class Document(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='documents')
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=get_document_storage)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-uploaded_at", "-id"], name="document_project_uploaded_idx"),
+            GinIndex(fields=["search_vector"], name="document_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # Hash new content first so the blob it belongs to is known before the row is written.
+        pending = None
+        if self.file and not self.file._committed:
+            pending = File(self.file.file, self.file.name)
+            self.file.name = blob_name(hash_content(pending))
+        blob_id = blob_sha256(self.file.name)
+        previous, previous_project = None, None
+        adding = self._state.adding
+        if self.pk and not adding:
+            previous, previous_project = (
+                Document.objects.filter(pk=self.pk).values_list("blob_id", "project_id").first() or (None, None)
+            )
+
+        with transaction.atomic():
+            if pending is not None:
+                Blob.objects.lock(blob_id)
+                self.file.storage.save_blob(pending, blob_id)
+                self.file._committed = True
+            if blob_id != previous:
+                if blob_id:
+                    Blob.objects.acquire(blob_id, self.file.size)
+                if previous:
+                    Blob.objects.release(previous)
+            self.blob_id = blob_id
+            super().save(*args, **kwargs)
+            if adding or previous_project != self.project_id:
+                deltas = defaultdict(Counter, {self.project_id: Counter(document_count=1)})
+                if not adding:
+                    deltas[previous_project]["document_count"] -= 1
+                Project.objects.adjust_counters(deltas)
     
+# ------------------- DOCUMENT UPLOAD Model -------------------------
+class DocumentUpload(models.Model):
+    """A resumable, chunked upload in progress; becomes a Document on completion."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='uploads')
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)
+    received_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.size})"
+
 # ------------------- COMMENT Model ------------------------- 
 class Comment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -82,10 +390,56 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-created_at", "-id"], name="comment_project_created_idx"),
+            models.Index(fields=["task", "-created_at", "-id"], name="comment_task_created_idx"),
+            models.Index(fields=["project", "updated_at", "id"], name="comment_project_synced_idx"),
+            models.Index(fields=["task", "updated_at", "id"], name="comment_task_synced_idx"),
+            GinIndex(fields=["search_vector"], name="comment_search_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.content[:30]}"
+
+    def get_project_id(self):
+        """The project this comment counts towards: its own, or its task's."""
+        if self.project_id is not None or self.task_id is None:
+            return self.project_id
+        if Comment.task.is_cached(self):
+            return self.task.project_id
+        task_id, project_id = self.__dict__.get("_task_project", (None, None))
+        if task_id != self.task_id:
+            project_id = Task.objects.filter(pk=self.task_id).values_list("project_id", flat=True).first()
+            self._task_project = (self.task_id, project_id)
+        return project_id
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Project.objects.adjust_counters({self.get_project_id(): {"comment_count": 1}})
     
+# ------------------- TIMELINE Manager -------------------------
+def latest_activity(events):
+    latest = {}
+    for event in events:
+        if event.project_id not in latest or event.created_at > latest[event.project_id]:
+            latest[event.project_id] = event.created_at
+    return latest
+
+
+class TimelineEventManager(models.Manager):
+    def bulk_record(self, events, batch_size=None):
+        """``bulk_create`` timeline events and move their projects' ``last_activity_at`` forward."""
+        with transaction.atomic():
+            events = self.bulk_create(events, batch_size=batch_size)
+            Project.objects.record_activity(latest_activity(events))
+        return events
+
 # ------------------- TIMELINE Model -------------------------
 class TimelineEvent(models.Model):
     EVENT_CHOICES = [
@@ -100,7 +454,67 @@ class TimelineEvent(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     event_type = models.CharField(max_length=50, choices=EVENT_CHOICES)
     description = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Stamped when the event is built, not when a buffered sink writes it.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-created_at", "-id"], name="timeline_project_created_idx"),
+        ]
+
+    objects = TimelineEventManager()
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Project.objects.record_activity({self.project_id: self.created_at})
+
+# ------------------- NOTIFICATION Manager -------------------------
+class NotificationManager(models.Manager):
+    def adjust_unread(self, deltas):
+        """Apply ``{user_id: delta}`` to the users' unread counters in one UPDATE."""
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        delta = Case(
+            *(When(pk=user_id, then=Value(amount)) for user_id, amount in deltas.items()),
+            default=Value(0), output_field=IntegerField(),
+        )
+        User.objects.filter(pk__in=deltas).update(
+            unread_notification_count=Greatest(F("unread_notification_count") + delta, 0)
+        )
+
+    def bulk_notify(self, notifications, batch_size=None):
+        """``bulk_create`` unread notifications and count them in their users' unread counters."""
+        with transaction.atomic():
+            notifications = self.bulk_create(notifications, batch_size=batch_size)
+            self.adjust_unread(Counter(n.user_id for n in notifications if not n.is_read))
+        return notifications
+
+    def mark_read(self, user, ids=None):
+        """
+        Mark ``user``'s unread notifications read (all of them, or only
+        ``ids``) with a single UPDATE, and take them off the unread counter in
+        the same transaction. Returns the number of notifications changed.
+        """
+        unread = self.filter(user=user, is_read=False)
+        if ids is not None:
+            unread = unread.filter(id__in=ids)
+        with transaction.atomic():
+            updated = unread.update(is_read=True)
+            self.adjust_unread({user.pk: -updated})
+        return updated
+
+    def recount(self, users=None):
+        """Rebuild unread counters from the notification rows. Returns the number of users updated."""
+        unread = (
+            self.filter(user=OuterRef("pk"), is_read=False)
+            .order_by().values("user").annotate(total=Count("id")).values("total")
+        )
+        users = User.objects.all() if users is None else users
+        return users.update(unread_notification_count=Coalesce(Subquery(unread), 0))
 
 # ------------------- NOTIFICATION Model -------------------------
 class Notification(models.Model):
@@ -109,6 +523,64 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-id"], name="notification_user_created_idx"),
+        ]
+
+    objects = NotificationManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted = instance.counted_state()
+        return instance
+
+    def counted_state(self):
+        """``(user_id, is_read)`` as the unread counter sees it; None when those fields weren't loaded."""
+        if "user_id" not in self.__dict__ or "is_read" not in self.__dict__:
+            return None
+        return (self.user_id, self.is_read)
+
+    def save(self, *args, **kwargs):
+        before = None
+        if not self._state.adding:
+            before = getattr(self, "_counted", None) or (
+                Notification.objects.filter(pk=self.pk).values_list("user_id", "is_read").first()
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            deltas = Counter()
+            for state, sign in ((before, -1), (self.counted_state(), 1)):
+                if state is not None and not state[1]:
+                    deltas[state[0]] += sign
+            Notification.objects.adjust_unread(deltas)
+        self._counted = self.counted_state()
+
     def __str__(self):
         return f"{self.user.email} - {self.message[:30]}"
-    
\ No newline at end of file
+    
+# ------------------- TOMBSTONE Model -------------------------
+class Tombstone(models.Model):
+    """Records a deleted project, task or comment so delta sync (api/sync.py) can tell clients to drop it."""
+    KIND_CHOICES = [
+        ("project", "Project"),
+        ("task", "Task"),
+        ("comment", "Comment"),
+    ]
+
+    # Plain ids rather than foreign keys: the project (or its owner) may be deleted too.
+    owner_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    project_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner_id", "deleted_at", "id"], name="tombstone_owner_deleted_idx"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at}"
@@ -0,0 +1,154 @@
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple("Cursor", ["position", "pk", "reverse"])
+
+
+# ------------------- Keyset Pagination -------------------------
+class KeysetPagination(BasePagination):
+    """
+    Newest-first keyset pagination over ``(<cursor_field>, id)``.
+
+    Each page is fetched with a range predicate on the composite key instead of
+    an OFFSET, so page N costs the same index seek as page 1. Views can change
+    the timestamp column with a ``cursor_field`` attribute (defaults to
+    ``created_at``).
+    """
+    cursor_field = "created_at"
+    cursor_query_param = "cursor"
+    # None reads REST_FRAMEWORK["PAGE_SIZE"] per request rather than at import.
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async variant of ``paginate_queryset`` for native async views."""
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field = getattr(view, "cursor_field", self.cursor_field)
+        self.cursor = self.decode_cursor(request, queryset.model)
+
+        if self.cursor is None:
+            queryset = queryset.order_by(f"-{self.field}", "-id")
+        elif self.cursor.reverse:
+            queryset = queryset.filter(**{f"{self.field}__gte": self.cursor.position}).filter(
+                Q(**{f"{self.field}__gt": self.cursor.position}) | Q(id__gt=self.cursor.pk)
+            ).order_by(self.field, "id")
+        else:
+            queryset = queryset.filter(**{f"{self.field}__lte": self.cursor.position}).filter(
+                Q(**{f"{self.field}__lt": self.cursor.position}) | Q(id__lt=self.cursor.pk)
+            ).order_by(f"-{self.field}", "-id")
+
+        # Fetch one extra row to learn whether another page follows.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size if self.page_size is not None else api_settings.PAGE_SIZE
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            position = model._meta.get_field(self.field).to_python(tokens["p"][0])
+            pk = int(tokens["i"][0])
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(position=position, pk=pk, reverse=reverse)
+
+    def encode_cursor(self, instance, reverse):
+        position = instance._meta.get_field(self.field).value_to_string(instance)
+        tokens = {"p": position, "i": instance.pk}
+        if reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
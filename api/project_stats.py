@@ -0,0 +1,33 @@
+from django.conf import settings
+
+from .models import STAT_COUNTERS, stat_expressions
+
+STAT_FIELDS = (*STAT_COUNTERS, "last_activity_at")
+
+
+def get_config():
+    return {
+        # "counters" reads the denormalized columns on Project (O(projects), no
+        # joins); "aggregate" computes every stat live in the same query.
+        "SOURCE": "counters",
+        **getattr(settings, "PROJECT_STATS", {}),
+    }
+
+
+def with_stats(queryset, exact=False):
+    """
+    ``queryset`` ready for ``stats_for``. In aggregate mode (or when
+    ``exact``) each stat is a correlated subquery annotated as ``live_<stat>``,
+    so the whole page still comes back in one query.
+    """
+    if not exact and get_config()["SOURCE"] == "counters":
+        return queryset
+    return queryset.annotate(**{f"live_{name}": expression for name, expression in stat_expressions().items()})
+
+
+def stats_for(project):
+    prefix = "live_" if hasattr(project, "live_task_count") else ""
+    stats = {name: getattr(project, prefix + name) for name in STAT_FIELDS}
+    tasks = stats["task_count"]
+    stats["completion_ratio"] = round(stats["completed_task_count"] / tasks, 4) if tasks else None
+    return stats
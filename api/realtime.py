@@ -0,0 +1,349 @@
+import asyncio
+import json
+import logging
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+from redis import RedisError
+
+from .authentication import auser_fields, build_user, token_identity
+from .models import Notification, TimelineEvent
+from .serializers import NotificationSerializer, TimelineEventSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        "ENABLED": True,
+        "REDIS_URL": settings.CACHES["default"].get("LOCATION"),
+        "CHANNEL_PREFIX": "rt",
+        "HEARTBEAT": 15,
+        "QUEUE_SIZE": 256,
+        "CATCH_UP_LIMIT": 500,
+        "RETRY_MS": 3000,
+        "TICKET_SECONDS": 30,
+        **getattr(settings, "REALTIME", {}),
+    }
+
+
+def user_channel(user_id):
+    return f"{get_config()['CHANNEL_PREFIX']}:user:{user_id}"
+
+
+def project_channel(project_id):
+    return f"{get_config()['CHANNEL_PREFIX']}:project:{project_id}"
+
+
+def notification_message(notification):
+    return {"type": "notification", "id": notification.pk, "data": NotificationSerializer(notification).data}
+
+
+def timeline_message(event):
+    return {"type": "timeline", "id": event.pk, "data": TimelineEventSerializer(event).data}
+
+
+# ------------------- Publishing -------------------------
+def publish(messages):
+    """
+    Fan ``(channel, message)`` pairs out over Redis pub/sub in one round trip.
+
+    Delivery is best effort: the rows are already committed, so a subscriber
+    that misses a message (or a publish that fails) is repaired by the
+    stream's catch-up query on its next resync or reconnect.
+    """
+    if not messages or not get_config()["ENABLED"]:
+        return
+    try:
+        from django_redis import get_redis_connection
+
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for channel, message in messages:
+            pipe.publish(channel, json.dumps(message, default=str))
+        pipe.execute()
+    except (RedisError, NotImplementedError):
+        logger.warning("Realtime publish failed for %d messages", len(messages), exc_info=True)
+
+
+def publish_notifications(notifications):
+    publish([(user_channel(n.user_id), notification_message(n)) for n in notifications])
+
+
+def publish_timeline_events(events):
+    publish([(project_channel(e.project_id), timeline_message(e)) for e in events if e.pk is not None])
+
+
+# ------------------- Stream Tickets -------------------------
+def ticket_key(ticket):
+    return f"{get_config()['CHANNEL_PREFIX']}:ticket:{ticket}"
+
+
+def issue_ticket(validated_token):
+    """
+    A single-use ticket that opens one stream as the token's user within
+    ``TICKET_SECONDS``. ``EventSource`` can't send headers, and a bearer
+    token in the query string would end up in proxy access logs; a ticket
+    there is spent by the time anyone reads it.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(ticket_key(ticket), token_identity(validated_token), timeout=get_config()["TICKET_SECONDS"])
+    return ticket
+
+
+async def aredeem_ticket(ticket):
+    """The user a ticket was issued for, or None if it's unknown, expired or already used."""
+    key = ticket_key(ticket)
+    identity = await cache.aget(key)
+    # Whoever deletes the key first gets the stream.
+    if identity is None or not await cache.adelete(key):
+        return None
+    user_id, version = identity
+    return build_user(await auser_fields(user_id, version), version)
+
+
+# ------------------- Subscriber Hub -------------------------
+class Subscription:
+    """
+    One client's bounded inbox. When the client reads slower than events
+    arrive the inbox fills up; instead of blocking the hub (and every other
+    client) further messages are dropped and ``overflowed`` is set, and the
+    stream resyncs that client from the database.
+    """
+
+    def __init__(self, channels, maxsize):
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = asyncio.Event()
+
+    def deliver(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed.set()
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed.clear()
+
+
+class RealtimeHub:
+    """
+    Shares a single Redis pub/sub connection between all streams served by
+    one worker process. Channels are subscribed while at least one client
+    listens on them, and a reader task routes each message to the inboxes
+    of that channel's subscribers.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.loop = asyncio.get_running_loop()
+        self.subscribers = {}
+        self._pubsub = None
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, subscription):
+        async with self._lock:
+            if self._pubsub is None:
+                from redis import asyncio as aioredis
+
+                self._pubsub = aioredis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+            new = [c for c in subscription.channels if c not in self.subscribers]
+            for channel in subscription.channels:
+                self.subscribers.setdefault(channel, set()).add(subscription)
+            if new:
+                await self._pubsub.subscribe(*new)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, subscription):
+        async with self._lock:
+            idle = []
+            for channel in subscription.channels:
+                listeners = self.subscribers.get(channel, set())
+                listeners.discard(subscription)
+                if not listeners:
+                    self.subscribers.pop(channel, None)
+                    idle.append(channel)
+            if idle and self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(*idle)
+                except RedisError:
+                    logger.warning("Realtime unsubscribe failed", exc_info=True)
+
+    async def _read(self):
+        while self.subscribers:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except RedisError:
+                logger.exception("Realtime pub/sub connection lost; resubscribing")
+                await asyncio.sleep(1)
+                await self._resubscribe()
+                continue
+            if message is None:
+                continue
+            channel = message["channel"].decode()
+            for subscription in list(self.subscribers.get(channel, ())):
+                subscription.deliver(message["data"])
+
+    async def _resubscribe(self):
+        async with self._lock:
+            try:
+                await self._pubsub.reset()
+                if self.subscribers:
+                    await self._pubsub.subscribe(*self.subscribers)
+            except RedisError:
+                return
+            # Anything published while we were disconnected is gone; resync everyone.
+            for listeners in self.subscribers.values():
+                for subscription in listeners:
+                    subscription.overflowed.set()
+
+
+_hub = None
+
+
+def get_hub():
+    # Redis asyncio connections belong to the event loop that opened them.
+    global _hub
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub.loop is not loop:
+        _hub = RealtimeHub(get_config()["REDIS_URL"])
+    return _hub
+
+
+# ------------------- Event Stream -------------------------
+class StreamCursor:
+    """
+    Highest notification and timeline ids a client has seen, sent back as the
+    SSE event id (``"<notification_id>:<timeline_id>"``) so a reconnecting
+    client resumes through ``Last-Event-ID``.
+
+    Ids are handed out on insert, not on commit. A row whose transaction
+    commits after a higher id has already been sent is behind the cursor:
+    a connected client still gets it live (publishing waits for the commit),
+    but a catch-up after a reconnect or resync skips it. Lists refetched on
+    the ``resync`` event, or the next poll of the list endpoints, pick it up.
+    """
+
+    def __init__(self, notification=0, timeline=0):
+        self.notification = notification
+        self.timeline = timeline
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            notification, timeline = value.split(":")
+            return cls(int(notification), int(timeline))
+        except (AttributeError, ValueError):
+            return None
+
+    def advance(self, kind, ident):
+        if kind == "notification":
+            self.notification = max(self.notification, ident)
+        else:
+            self.timeline = max(self.timeline, ident)
+
+    def __str__(self):
+        return f"{self.notification}:{self.timeline}"
+
+
+async def current_cursor(user, project_ids):
+    notification = await Notification.objects.filter(user=user).aaggregate(last=Max("id"))
+    timeline = await TimelineEvent.objects.filter(project_id__in=project_ids).aaggregate(last=Max("id"))
+    return StreamCursor(notification["last"] or 0, timeline["last"] or 0)
+
+
+async def catch_up(user, project_ids, cursor, limit):
+    """Messages committed after ``cursor``, oldest first, or None when more than ``limit`` are missing."""
+    notifications = [
+        n async for n in Notification.objects.filter(user=user, id__gt=cursor.notification).order_by("id")[:limit + 1]
+    ]
+    events = [
+        e async for e in TimelineEvent.objects.filter(project_id__in=project_ids, id__gt=cursor.timeline)
+        .select_related("user").order_by("id")[:limit + 1]
+    ]
+    if len(notifications) > limit or len(events) > limit:
+        return None
+    messages = [notification_message(n) for n in notifications] + [timeline_message(e) for e in events]
+    return sorted(messages, key=lambda m: m["data"]["created_at"])
+
+
+def release_connection():
+    """
+    Give the stream's database connection back between queries. Django only
+    closes a request's connection when the response finishes, so otherwise
+    every open stream would keep one checked out of the pool for its life.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def format_sse(message, cursor):
+    return f"id: {cursor}\nevent: {message['type']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+
+
+async def event_stream(user, project_ids, cursor):
+    """
+    Server-sent events for ``user``'s notifications and the timelines of
+    ``project_ids``: a catch-up from ``cursor`` first, then live messages from
+    Redis, with a comment line every ``HEARTBEAT`` seconds so proxies keep
+    the connection open and dead clients are noticed.
+    """
+    config = get_config()
+    hub = get_hub()
+    subscription = Subscription(
+        [user_channel(user.pk)] + [project_channel(pk) for pk in project_ids], config["QUEUE_SIZE"]
+    )
+    if cursor is None:
+        cursor = await current_cursor(user, project_ids)
+    # Subscribe before the catch-up query so nothing committed in between is missed.
+    await hub.subscribe(subscription)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        resync = True
+
+        while True:
+            if resync:
+                subscription.drain()
+                seen = set()
+                messages = await catch_up(user, project_ids, cursor, config["CATCH_UP_LIMIT"])
+                if messages is None:
+                    # Too far behind to replay; tell the client to refetch its lists.
+                    cursor = await current_cursor(user, project_ids)
+                    yield f"id: {cursor}\nevent: resync\ndata: {{}}\n\n"
+                else:
+                    for message in messages:
+                        seen.add((message["type"], message["id"]))
+                        cursor.advance(message["type"], message["id"])
+                        yield format_sse(message, cursor)
+                await sync_to_async(release_connection)()
+                resync = False
+
+            inbox = asyncio.ensure_future(subscription.queue.get())
+            overflow = asyncio.ensure_future(subscription.overflowed.wait())
+            done, pending = await asyncio.wait(
+                {inbox, overflow}, timeout=config["HEARTBEAT"], return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            if overflow in done:
+                resync = True
+                continue
+            if inbox not in done:
+                yield ": ping\n\n"
+                continue
+
+            message = json.loads(inbox.result())
+            # Only messages published while the catch-up query ran can repeat.
+            if (message["type"], message["id"]) in seen:
+                continue
+            cursor.advance(message["type"], message["id"])
+            yield format_sse(message, cursor)
+    finally:
+        await hub.unsubscribe(subscription)
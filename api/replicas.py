@@ -0,0 +1,166 @@
+import contextvars
+import logging
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from redis import RedisError
+from rest_framework import viewsets
+from rest_framework.permissions import SAFE_METHODS
+
+from .instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+# Replica the current request's reads go to; None means the primary.
+_target = contextvars.ContextVar("read_replica", default=None)
+
+
+def get_config():
+    return {
+        "ENABLED": True,
+        # DATABASES aliases holding a copy of ``default``.
+        "ALIASES": [],
+        # How long after a write a user's reads stay on the primary, so they see
+        # their own changes. Keep it above the replicas' usual replay lag.
+        "PIN_SECONDS": 10,
+        "CACHE_ALIAS": "default",
+        **getattr(settings, "READ_REPLICAS", {}),
+    }
+
+
+def pin_key(user_id):
+    return f"db:pinned:{user_id}"
+
+
+# ------------------- Router -------------------------
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request (see
+    ``ReplicaReadMixin``) and everything else to ``default``: writes, reads
+    inside a transaction, and reads outside a replica-routed request (jobs,
+    commands, signals).
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _target.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in get_config()["ALIASES"] else None
+
+
+# ------------------- Routing -------------------------
+def route_reads(alias):
+    """Send this context's reads to ``alias`` (None for the primary). Returns a token for ``end_routing``."""
+    return _target.set(alias)
+
+
+def end_routing(token):
+    _target.reset(token)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, whatever the request was routed to."""
+    token = _target.set(None)
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+def pick(pinned):
+    if pinned:
+        count("replica_pinned")
+        return None
+    count("replica_read")
+    return random.choice(get_config()["ALIASES"])
+
+
+def choose_replica(user):
+    """
+    Replica alias for ``user``'s reads, or None while they're pinned to the
+    primary (or there are no replicas). If the pin can't be read from Redis
+    the read goes to the primary: it may be one of their own writes.
+    """
+    config = get_config()
+    if not config["ENABLED"] or not config["ALIASES"]:
+        return None
+    try:
+        return pick(user.is_authenticated and caches[config["CACHE_ALIAS"]].get(pin_key(user.pk)) is not None)
+    except RedisError:
+        count("replica_redis_error")
+        logger.warning("Could not read the replica pin; reading from the primary", exc_info=True)
+        return None
+
+
+async def achoose_replica(user):
+    config = get_config()
+    if not config["ENABLED"] or not config["ALIASES"]:
+        return None
+    try:
+        return pick(user.is_authenticated and await caches[config["CACHE_ALIAS"]].aget(pin_key(user.pk)) is not None)
+    except RedisError:
+        count("replica_redis_error")
+        logger.warning("Could not read the replica pin; reading from the primary", exc_info=True)
+        return None
+
+
+def pin(user):
+    """
+    Keep ``user``'s reads on the primary for ``PIN_SECONDS``, so they read
+    their own writes. A Redis error is logged rather than failing a write
+    that has already been made.
+    """
+    config = get_config()
+    if config["ENABLED"] and config["ALIASES"] and user.is_authenticated:
+        try:
+            caches[config["CACHE_ALIAS"]].set(pin_key(user.pk), 1, timeout=config["PIN_SECONDS"])
+        except RedisError:
+            count("replica_redis_error")
+            logger.warning("Could not pin user %s to the primary", user.pk, exc_info=True)
+
+
+# ------------------- Replica Read Mixin -------------------------
+class ReplicaReadMixin:
+    """
+    Serves a viewset's safe reads from a read replica: ``list`` and
+    ``retrieve``, or every safe action on a ``ReadOnlyModelViewSet``.
+
+    A successful request with any other method pins the user to the
+    primary for ``PIN_SECONDS``, so the reads that follow a write see it.
+    Authentication always runs against the primary.
+    """
+    replica_actions = ("list", "retrieve")
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        return isinstance(self, viewsets.ReadOnlyModelViewSet) or self.action in self.replica_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            self._replica_token = route_reads(choose_replica(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            self._replica_token = None
+            end_routing(token)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
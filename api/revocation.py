@@ -0,0 +1,125 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from redis import RedisError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from .instrumentation import count
+from .jobs import job
+
+logger = logging.getLogger(__name__)
+
+# Set once every unexpired blacklisted JTI has been loaded. Without it (a new
+# or flushed Redis) a miss proves nothing and the check falls back to the DB.
+# It expires after WARM_SECONDS, so whatever the mirror might have lost since
+# is reloaded from the blacklist table at least that often.
+WARM_KEY = "jwt:revoked:warm"
+
+
+def get_config():
+    return {
+        "ENABLED": True,
+        # Keep JTIs in a Redis that never evicts (see the "revocations" cache in
+        # settings): an evicted JTI under a live warm marker reads as not revoked.
+        "CACHE_ALIAS": "default",
+        "WARM_BATCH_SIZE": 1000,
+        "WARM_SECONDS": 24 * 60 * 60,
+        # One warm-up at a time; after this long (or once the marker expires)
+        # a cold check may queue another, so a failed one isn't the last.
+        "WARM_RETRY_SECONDS": 5 * 60,
+        **getattr(settings, "REVOCATION", {}),
+    }
+
+
+def revoked_key(jti):
+    return f"jwt:revoked:{jti}"
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(get_config()["CACHE_ALIAS"])
+
+
+# ------------------- Revocation Checks -------------------------
+def is_revoked(jti):
+    """
+    Whether the token ``jti`` has been blacklisted: one Redis round trip
+    (``EXISTS`` on the JTI's key and the warm marker), falling back to the
+    blacklist table while Redis is cold or unreachable.
+    """
+    config = get_config()
+    if config["ENABLED"]:
+        try:
+            warm, revoked = get_redis().pipeline(transaction=False).exists(WARM_KEY).exists(revoked_key(jti)).execute()
+            if revoked:
+                return True
+            if warm:
+                return False
+            count("revocation_cold")
+            warm_revocations.delay(idempotency_key="revocation-warm", idempotency_ttl=config["WARM_RETRY_SECONDS"])
+        except (RedisError, NotImplementedError):
+            count("revocation_redis_error")
+            logger.warning("Revocation check fell back to the database", exc_info=True)
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def remember(jti, exp):
+    """Mirror a blacklisted JTI into Redis until its token would have expired anyway."""
+    ttl = int(exp - time.time())
+    if ttl <= 0 or not get_config()["ENABLED"]:
+        return
+    try:
+        get_redis().set(revoked_key(jti), 1, ex=ttl)
+    except (RedisError, NotImplementedError):
+        logger.warning("Could not mirror revoked token %s to Redis", jti, exc_info=True)
+        try:
+            # A warm set missing this JTI would let the token through; go cold instead.
+            get_redis().delete(WARM_KEY)
+        except (RedisError, NotImplementedError):
+            pass
+
+
+@job(queue="default")
+def warm_revocations():
+    """Load every unexpired blacklisted JTI into Redis, then mark the set warm."""
+    config = get_config()
+    now = timezone.now()
+    blacklisted = BlacklistedToken.objects.filter(token__expires_at__gt=now).order_by("id")
+    client, after, loaded = get_redis(), 0, 0
+    while True:
+        batch = list(
+            blacklisted.filter(id__gt=after).values_list("id", "token__jti", "token__expires_at")[
+                :config["WARM_BATCH_SIZE"]
+            ]
+        )
+        if not batch:
+            break
+        pipe = client.pipeline(transaction=False)
+        for _, jti, expires_at in batch:
+            pipe.set(revoked_key(jti), 1, ex=max(int((expires_at - now).total_seconds()), 1))
+        pipe.execute()
+        after, loaded = batch[-1][0], loaded + len(batch)
+    client.set(WARM_KEY, 1, ex=config["WARM_SECONDS"])
+    return loaded
+
+
+# ------------------- Tokens -------------------------
+class RefreshToken(BaseRefreshToken):
+    """A refresh token whose blacklist lookups go through Redis (``is_revoked``) instead of the blacklist table."""
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[jwt_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        jti, exp = self.payload[jwt_settings.JTI_CLAIM], self.payload["exp"]
+        transaction.on_commit(lambda: remember(jti, exp))
+        return blacklisted
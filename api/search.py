@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F, Q
+from django.utils.html import escape
+
+from .models import Comment, Document, Project, Task
+
+# Must match the text search configuration used by the triggers in migration 0014.
+SEARCH_CONFIG = "english"
+# ts_headline copies the source text as it is, markup included. Matches are
+# marked with these private-use characters instead, and the snippet is
+# HTML-escaped before they become <mark> tags (see ``highlight``).
+START_SEL, STOP_SEL = "\ue000", "\ue001"
+
+
+def get_config():
+    return {
+        "DEFAULT_LIMIT": 20,
+        "MAX_LIMIT": 50,
+        "HEADLINE_OPTIONS": {"max_words": 35, "min_words": 15},
+        **getattr(settings, "SEARCH", {}),
+    }
+
+
+# ------------------- Searchable Types -------------------------
+# type -> (model, scopes, title field, snippet field, extra values). Scopes take
+# the ids of the user's projects. A type with several scopes (comments hang off a
+# project *or* a task) is searched once per scope and the results unioned, so
+# each arm can use its own index instead of OR-ing two joins over every match.
+SEARCHABLE = {
+    "project": (Project, [lambda ids: Q(id__in=ids)], "name", "description", ["id"]),
+    "task": (Task, [lambda ids: Q(project_id__in=ids)], "title", "description", ["id", "project_id"]),
+    "comment": (
+        Comment,
+        [lambda ids: Q(project_id__in=ids), lambda ids: Q(task__project_id__in=ids)],
+        None, "content", ["id", "project_id", "task_id"],
+    ),
+    "document": (Document, [lambda ids: Q(project_id__in=ids)], "name", "description", ["id", "project_id"]),
+}
+
+
+def highlight(headline):
+    """A ``ts_headline`` result as HTML: the user's text escaped, matches wrapped in ``<mark>``."""
+    if headline is None:
+        return None
+    return escape(headline).replace(START_SEL, "<mark>").replace(STOP_SEL, "</mark>")
+
+
+def search(user, text, types=None, limit=None):
+    """
+    Rank ``user``'s projects, tasks, comments and documents against ``text``
+    (web-search syntax: quoted phrases, ``or``, ``-exclude``).
+
+    Each type is one GIN-indexed ``@@`` match ordered by ``ts_rank`` and cut
+    to ``limit`` ids. Those are merged by rank and cut to ``limit`` again;
+    only the rows that survive are fetched with their highlighted snippets,
+    since ``ts_headline`` re-parses the whole text and costs far more per
+    row than the rank.
+
+    The user's project ids are looked up once and passed as a literal list:
+    joined through ``api_project`` instead, the planner repeats the GIN scan
+    for every project in a nested loop.
+
+    Titles and snippets are HTML: the user's text escaped, with each match
+    in ``<mark>``.
+    """
+    config = get_config()
+    limit = min(limit or config["DEFAULT_LIMIT"], config["MAX_LIMIT"])
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+
+    project_ids = list(Project.objects.filter(owner=user).values_list("id", flat=True))
+    if not project_ids:
+        return []
+
+    ranked = []
+    for kind in types or SEARCHABLE:
+        model, scopes, _, _, _ = SEARCHABLE[kind]
+        arms = [
+            model.objects.filter(scope(project_ids), search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query)).values("id", "rank")
+            for scope in scopes
+        ]
+        # A row can match more than one arm; fetch enough to still have ``limit`` distinct ids.
+        rows = arms[0].union(*arms[1:], all=True) if len(arms) > 1 else arms[0]
+        seen = set()
+        for row in rows.order_by("-rank", "-id")[:limit * len(arms)]:
+            if row["id"] not in seen:
+                seen.add(row["id"])
+                ranked.append((row["rank"], row["id"], kind))
+
+    ranked.sort(key=lambda hit: hit[0], reverse=True)
+    ranked = ranked[:limit]
+
+    details = {}
+    for kind in {hit[2] for hit in ranked}:
+        model, _, title_field, snippet_field, values = SEARCHABLE[kind]
+        markers = {"start_sel": START_SEL, "stop_sel": STOP_SEL}
+        annotations = {
+            "snippet": SearchHeadline(
+                snippet_field, query, config=SEARCH_CONFIG, **config["HEADLINE_OPTIONS"], **markers
+            ),
+        }
+        if title_field:
+            annotations["headline"] = SearchHeadline(
+                title_field, query, config=SEARCH_CONFIG, highlight_all=True, **markers
+            )
+        ids = [pk for _, pk, hit_kind in ranked if hit_kind == kind]
+        for row in model.objects.filter(id__in=ids).annotate(**annotations).values(*values, *annotations):
+            row["snippet"] = highlight(row["snippet"])
+            if "headline" in row:
+                row["title"] = highlight(row.pop("headline"))
+            details[kind, row["id"]] = row
+
+    return [
+        {"type": kind, **details[kind, pk], "rank": rank}
+        for rank, pk, kind in ranked if (kind, pk) in details
+    ]
@@ -1,14 +1,19 @@
 from rest_framework import serializers
-from .models import User, Project, Task, Document, Comment, TimelineEvent, Notification
+from .models import User, Project, Task, Document, DocumentUpload, Comment, TimelineEvent, Notification
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.conf import settings
+from .instrumentation import InstrumentedSerializerMixin, InstrumentedListSerializer
+from . import project_stats
+from .authentication import TOKEN_VERSION_CLAIM
+from .revocation import RefreshToken
 
 # ------------------- USER ------------------------- 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False, min_length=8)
 
     class Meta:
         model = User
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'email', 'role', 'is_active', 'is_staff', 'password']
         read_only_fields = ['id', 'is_staff', 'is_active']
 
@@ -23,11 +28,14 @@ class UserSerializer(serializers.ModelSerializer):
     
 # ------------------- TOKEN ------------------------- 
 class TokenSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         token['email'] = user.email
         token['role'] = user.role
+        token[TOKEN_VERSION_CLAIM] = user.token_version
         return token
 
     def validate(self, attrs):
@@ -37,29 +45,105 @@ class TokenSerializer(TokenObtainPairSerializer):
         return data
     
 # ------------------- PROJECT ------------------------- 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Project
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'name', 'description', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class ProjectStatsSerializer(ProjectSerializer):
+    """A project with its dashboard stats embedded (``?stats=1``)."""
+    stats = serializers.SerializerMethodField()
+
+    class Meta(ProjectSerializer.Meta):
+        fields = ProjectSerializer.Meta.fields + ['stats']
+
+    def get_stats(self, obj):
+        return project_stats.stats_for(obj)
+
+
 # ------------------- TASK ------------------------- 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Task
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'project', 'title', 'description', 'is_completed', 'assigned_to', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves primary keys from objects a bulk serializer preloaded into the context."""
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
+class TaskBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of tasks item by item, so one bad row doesn't reject the
+    whole batch. Projects and assignees referenced anywhere in the batch are
+    loaded with a single ``id__in`` query each.
+    """
+
+    def validate_items(self, items):
+        self.prefetch_related_objects(items)
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        return valid, errors
+
+    def prefetch_related_objects(self, items):
+        owner = self.context['request'].user
+        self.context['prefetched'] = {
+            'project': Project.objects.filter(owner=owner).in_bulk(collect_ids(items, 'project')),
+            'assigned_to': User.objects.in_bulk(collect_ids(items, 'assigned_to')),
+        }
+
+
+class BulkTaskSerializer(TaskSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+    class Meta(TaskSerializer.Meta):
+        list_serializer_class = TaskBulkListSerializer
+
+
+def collect_ids(items, key):
+    ids = set()
+    for item in items:
+        if isinstance(item, dict):
+            try:
+                ids.add(int(item.get(key)))
+            except (TypeError, ValueError):
+                pass
+    return ids
+
 # ------------------- DOCUMENT ------------------------- 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     file = serializers.FileField(write_only=True)
     file_url = serializers.SerializerMethodField(read_only=True)
+    download_url = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Document
-        fields = ['id', 'project', 'uploaded_by', 'file', 'file_url', 'name', 'description', 'uploaded_at']
-        read_only_fields = ['id', 'uploaded_by', 'uploaded_at', 'file_url']
+        list_serializer_class = InstrumentedListSerializer
+        fields = ['id', 'project', 'uploaded_by', 'file', 'file_url', 'download_url', 'name', 'description', 'uploaded_at']
+        read_only_fields = ['id', 'uploaded_by', 'uploaded_at', 'file_url', 'download_url']
 
     def validate_file(self, value):
         if not value:
@@ -67,16 +151,38 @@ class DocumentSerializer(serializers.ModelSerializer):
         return value
 
     def get_file_url(self, obj):
-        if not obj.file:
-            return None
-        return f"{settings.MEDIA_HOST}{obj.file.url}"
+        # Documents are no longer publicly served; kept as an alias for older clients.
+        return self.get_download_url(obj)
+
+    def get_download_url(self, obj):
+        return f"{settings.MEDIA_HOST}/api/documents/{obj.pk}/download/"
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$', required=False, write_only=True)
+
+    class Meta:
+        model = DocumentUpload
+        fields = ['id', 'project', 'name', 'description', 'filename', 'size', 'sha256', 'received_bytes', 'created_at']
+        read_only_fields = ['id', 'received_bytes', 'created_at']
+
+    def validate_project(self, value):
+        if value.owner_id != self.context['request'].user.pk:
+            raise serializers.ValidationError("Project not found.")
+        return value
+
+    def validate_size(self, value):
+        if value is not None and value < 0:
+            raise serializers.ValidationError("Size must be positive.")
+        return value
 
 # ------------------- COMMENT ------------------------- 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Comment
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'user', 'project', 'task', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
@@ -95,15 +201,21 @@ class CommentSerializer(serializers.ModelSerializer):
         return data
     
 # ------------------- TIMELINE ------------------------- 
-class TimelineEventSerializer(serializers.ModelSerializer):
+class TimelineEventSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
     class Meta:
         model = TimelineEvent
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'project', 'user', 'event_type', 'description', 'created_at']
 
 # ------------------- NOTIFICATION -------------------------   
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
+        list_serializer_class = InstrumentedListSerializer
         fields = ['id', 'message', 'is_read', 'created_at']
+
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
@@ -0,0 +1,211 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import authentication, extraction, instrumentation, realtime, response_cache, sync
+from .models import Blob, Comment, Document, Notification, Project, Task, TimelineEvent, User, task_counter_deltas
+
+
+# ------------------- Response Cache Invalidation -------------------------
+@receiver([post_save, post_delete], sender=Project)
+def invalidate_project(sender, instance, **kwargs):
+    response_cache.bump("user", instance.owner_id)
+    response_cache.bump("project", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Task)
+@receiver([post_save, post_delete], sender=Document)
+@receiver([post_save, post_delete], sender=TimelineEvent)
+def invalidate_project_children(sender, instance, **kwargs):
+    response_cache.bump("project", instance.project_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment(sender, instance, origin=None, **kwargs):
+    # In a cascade the project or task bumps it already; a user's is bumped in flush_user_cascade.
+    if not cascaded_from(origin, Project, Task, User):
+        response_cache.bump("project", instance.get_project_id())
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_notifications(sender, instance, **kwargs):
+    response_cache.bump("user", instance.user_id)
+
+
+# ------------------- Auth Cache Invalidation -------------------------
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    authentication.forget_user(instance.pk, instance.token_version)
+
+
+# ------------------- Unread Counters -------------------------
+@receiver(post_delete, sender=Notification)
+def release_unread(sender, instance, **kwargs):
+    if not instance.is_read:
+        Notification.objects.adjust_unread({instance.user_id: -1})
+
+
+# ------------------- Project Stats -------------------------
+def cascaded_from(origin, *models):
+    """Whether a delete started from an instance (or queryset) of one of ``models``."""
+    return isinstance(origin, models) or getattr(origin, "model", None) in models
+
+
+class UserCascade:
+    """Counter changes and deleted comments collected over one user's cascade delete (see ``user_cascade``)."""
+
+    def __init__(self):
+        self.deltas = defaultdict(Counter)
+        # (comment id, project id, task id): task comments' projects are looked up in one query at the end.
+        self.comments = []
+        self.deleted_projects = set()
+
+    def add(self, deltas):
+        for project_id, counters in deltas.items():
+            self.deltas[project_id].update(counters)
+
+
+def user_cascade(origin):
+    """
+    Deleting a user cascades to their projects and to everything they wrote
+    in other people's. Instead of one counter UPDATE (and, for task
+    comments, one project lookup and one tombstone INSERT) per row, the
+    changes are collected on the delete's origin and applied once the users
+    themselves are deleted (``flush_user_cascade``). None for any other delete.
+    """
+    if not cascaded_from(origin, User):
+        return None
+    return origin.__dict__.setdefault("_user_cascade", UserCascade())
+
+
+def adjust_counters(origin, deltas):
+    cascade = user_cascade(origin)
+    if cascade is None:
+        Project.objects.adjust_counters(deltas)
+    else:
+        cascade.add(deltas)
+
+
+@receiver(post_delete, sender=Task)
+def uncount_task(sender, instance, origin=None, **kwargs):
+    # Deleting a project cascades to its tasks, documents and comments; its counters go with it.
+    if not cascaded_from(origin, Project):
+        adjust_counters(origin, task_counter_deltas([((instance.project_id, instance.is_completed), None)]))
+
+
+@receiver(post_delete, sender=Document)
+def uncount_document(sender, instance, origin=None, **kwargs):
+    if not cascaded_from(origin, Project):
+        adjust_counters(origin, {instance.project_id: {"document_count": -1}})
+
+
+@receiver(pre_delete, sender=Comment)
+def resolve_comment_project(sender, instance, origin=None, **kwargs):
+    # A task's comments are deleted after the task itself; look the project up while the task still exists.
+    if isinstance(origin, Task) and origin.pk == instance.task_id:
+        instance._task_project = (origin.pk, origin.project_id)
+    elif not cascaded_from(origin, Project, User):
+        instance.get_project_id()
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Project):
+        return
+    cascade = user_cascade(origin)
+    if cascade is None:
+        Project.objects.adjust_counters({instance.get_project_id(): {"comment_count": -1}})
+    else:
+        cascade.comments.append((instance.pk, instance.project_id, instance.task_id))
+
+
+@receiver(post_delete, sender=Project)
+def forget_project_stats(sender, instance, origin=None, **kwargs):
+    cascade = user_cascade(origin)
+    if cascade is not None:
+        cascade.deleted_projects.add(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def flush_user_cascade(sender, instance, origin=None, **kwargs):
+    # Users are deleted after everything that cascades from them, so this is the last signal.
+    cascade = origin.__dict__.pop("_user_cascade", None) if cascaded_from(origin, User) else None
+    if cascade is None:
+        return
+    # Tasks in the user's own projects are gone by now; what's left is in other projects.
+    task_ids = {task_id for _, project_id, task_id in cascade.comments if project_id is None}
+    task_projects = dict(Task.objects.filter(pk__in=task_ids).values_list("id", "project_id")) if task_ids else {}
+    comments = []
+    for comment_id, project_id, task_id in cascade.comments:
+        project_id = project_id if project_id is not None else task_projects.get(task_id)
+        if project_id is not None and project_id not in cascade.deleted_projects:
+            cascade.deltas[project_id]["comment_count"] -= 1
+            comments.append((comment_id, project_id))
+    deltas = {
+        project_id: counters for project_id, counters in cascade.deltas.items()
+        if project_id not in cascade.deleted_projects
+    }
+    Project.objects.adjust_counters(deltas)
+    response_cache.bump("project", *deltas)
+    sync.record_deletions("comment", comments)
+
+
+# ------------------- Sync Tombstones -------------------------
+# A deleted user's own projects, and everything in them, get no tombstones:
+# the only client that could ask for them is gone. Their comments in other
+# people's projects are buried by flush_user_cascade.
+@receiver(post_delete, sender=Project)
+def bury_project(sender, instance, origin=None, **kwargs):
+    if not cascaded_from(origin, User):
+        sync.record_deletion("project", instance.pk, instance.pk, instance.owner_id)
+
+
+@receiver(post_delete, sender=Task)
+def bury_task(sender, instance, origin=None, **kwargs):
+    if not cascaded_from(origin, Project, User):
+        sync.record_deletion("task", instance.pk, instance.project_id)
+
+
+@receiver(post_delete, sender=Comment)
+def bury_comment(sender, instance, origin=None, **kwargs):
+    if not cascaded_from(origin, Project, Task, User):
+        sync.record_deletion("comment", instance.pk, instance.get_project_id())
+
+
+# ------------------- Realtime Push -------------------------
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_notifications([instance]))
+
+
+@receiver(post_save, sender=TimelineEvent)
+def push_timeline_event(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_timeline_events([instance]))
+
+
+# ------------------- Blob References -------------------------
+@receiver(post_delete, sender=Document)
+def release_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
+# ------------------- Text Extraction -------------------------
+@receiver(post_save, sender=Document)
+def queue_text_extraction(sender, instance, **kwargs):
+    # Keyed on the blob, so re-saves and duplicate uploads of the same bytes extract once.
+    if instance.blob_id and extraction.get_config()["ON_UPLOAD"]:
+        extraction.extract_document_text.delay(
+            instance.blob_id, idempotency_key=f"extract:{instance.blob_id}:{extraction.EXTRACTOR_VERSION}"
+        )
+
+
+# ------------------- Database Connections -------------------------
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    instrumentation.note_connection(connection)
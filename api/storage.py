@@ -0,0 +1,95 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = "blobs"
+
+
+def blob_name(sha256):
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def blob_sha256(name):
+    """The SHA-256 a content-addressed file name was derived from, or None for legacy names."""
+    if name and name.startswith(f"{BLOB_PREFIX}/"):
+        return os.path.basename(name)
+    return None
+
+
+def hash_content(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ------------------- Content-addressed Storage -------------------------
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, under a name derived from its SHA-256.
+
+    The requested name is ignored: the content is hashed first and, if a blob
+    with that hash already exists, nothing is written and the existing name is
+    returned. Callers lock the blob's row first (``Blob.objects.lock``) so
+    that existing file can't be collected before they reference it. New blobs
+    are written to a temporary name and renamed into place, so concurrent
+    uploads of the same bytes are harmless. Names that don't start with
+    ``blobs/`` (documents stored before deduplication) are still readable.
+    """
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return self.save_blob(content, hash_content(content))
+
+    def save_blob(self, content, sha256):
+        name = blob_name(sha256)
+        if self.exists(name):
+            self.touch(name)
+            return name
+
+        temp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def touch(self, name):
+        # Reusing a file whose row may not have committed yet: keep gc_blobs'
+        # sweep of row-less files from treating it as a stale orphan.
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def adopt_file(self, path, sha256):
+        """
+        Hard-link an already-hashed local file into the store (copying only
+        across filesystems); a no-op if the blob exists. ``path`` is left for
+        the caller to remove.
+        """
+        name = blob_name(sha256)
+        target = self.path(name)
+        if os.path.exists(target):
+            self.touch(name)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp = f"{target}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(path, temp)
+            except OSError:
+                shutil.copyfile(path, temp)
+            os.replace(temp, target)
+        return name
+
+
+def get_document_storage():
+    return document_storage
+
+
+# Outside MEDIA_ROOT: documents are only ever served through the authorized
+# download view (X-Accel-Redirect to nginx's internal /protected/ location).
+document_storage = ContentAddressedStorage(location=settings.PRIVATE_MEDIA_ROOT)
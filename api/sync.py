@@ -0,0 +1,176 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from urllib import parse
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Project, Task, Tombstone
+from .serializers import CommentSerializer, ProjectSerializer, TaskSerializer
+
+
+def get_config():
+    return {
+        # Most rows returned per stream per request; clients follow has_more.
+        "PAGE_SIZE": 500,
+        # Checkpoints never move past now - SETTLE_SECONDS, so a write whose
+        # transaction commits up to this long after its updated_at is still seen.
+        # updated_at (and deleted_at) are stamped by the app when the row is
+        # saved, not at commit: a row written by a transaction that stays open
+        # longer than this can commit behind a checkpoint already handed out,
+        # and clients holding it won't see the row until it changes again or
+        # they do a full sync. Keep it above the longest write transaction.
+        "SETTLE_SECONDS": 5,
+        # Tombstones are pruned after this long (manage.py prune_sync_tombstones);
+        # older tokens get 410 and must do a full sync.
+        "TOMBSTONE_DAYS": 30,
+        **getattr(settings, "SYNC", {}),
+    }
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class ExpiredToken(Exception):
+    pass
+
+
+# ------------------- Streams -------------------------
+# stream -> (scopes, timestamp field, queryset to load rows from, serializer).
+# Scopes take the user and the ids of their projects; like search, a stream
+# with several scopes is scanned once per scope, each arm on its own
+# ``(<scope>, <timestamp>, id)`` index, and the keys merged.
+STREAMS = {
+    "projects": (
+        [lambda user, ids: Project.objects.filter(owner=user)],
+        "updated_at", Project.objects.all(), ProjectSerializer,
+    ),
+    "tasks": (
+        [lambda user, ids: Task.objects.filter(project_id__in=ids)],
+        "updated_at", Task.objects.all(), TaskSerializer,
+    ),
+    "comments": (
+        [lambda user, ids: Comment.objects.filter(project_id__in=ids),
+         lambda user, ids: Comment.objects.filter(task__project_id__in=ids)],
+        "updated_at", Comment.objects.select_related("user"), CommentSerializer,
+    ),
+    "deleted": (
+        [lambda user, ids: Tombstone.objects.filter(owner_id=user.pk)],
+        "deleted_at", Tombstone.objects.all(), None,
+    ),
+}
+
+
+# ------------------- Tokens -------------------------
+def encode_token(positions):
+    querystring = parse.urlencode({
+        stream: f"{timestamp.isoformat()}|{pk}" for stream, (timestamp, pk) in positions.items()
+    })
+    return urlsafe_b64encode(querystring.encode("ascii")).decode("ascii")
+
+
+def decode_token(token):
+    """``{stream: (timestamp, id)}``: the last row of each stream the client has seen."""
+    try:
+        tokens = parse.parse_qs(urlsafe_b64decode(token.encode("ascii")).decode("ascii"), strict_parsing=True)
+        positions = {}
+        for stream in STREAMS:
+            timestamp, pk = tokens[stream][0].split("|")
+            positions[stream] = (parse_datetime(timestamp), int(pk))
+            if positions[stream][0] is None or positions[stream][0].tzinfo is None:
+                raise ValueError(timestamp)
+    except (KeyError, TypeError, ValueError) as exc:
+        raise InvalidToken("Invalid sync token") from exc
+    return positions
+
+
+# ------------------- Delta Sync -------------------------
+def scan(arms, field, position, limit):
+    """Up to ``limit + 1`` ``(timestamp, id)`` keys after ``position``, oldest first, merged across ``arms``."""
+    keys = set()
+    for queryset in arms:
+        if position is not None:
+            timestamp, pk = position
+            queryset = queryset.filter(**{f"{field}__gte": timestamp}).filter(
+                Q(**{f"{field}__gt": timestamp}) | Q(id__gt=pk)
+            )
+        keys.update(queryset.order_by(field, "id").values_list(field, "id")[:limit + 1])
+    return sorted(keys)[:limit + 1]
+
+
+def changes(user, token=None, context=None):
+    """
+    Everything in ``user``'s projects created, updated or deleted since
+    ``token`` (everything, for no token), plus the token to pass next time.
+
+    Each stream is a forward keyset scan over ``(updated_at, id)`` (or
+    ``deleted_at`` for tombstones), so a refresh costs the size of the delta.
+    A stream that doesn't fit in one page checkpoints at its last row and sets
+    ``has_more``. Otherwise it checkpoints at the settle horizon: rows newer
+    than that are sent again next time, which is harmless for upserts and
+    catches transactions that committed after this read, as long as they
+    committed within ``SETTLE_SECONDS`` of stamping their rows.
+
+    Children deleted along with their project (or comments with their task)
+    get no tombstones of their own; the parent's implies them.
+    """
+    config = get_config()
+    now = timezone.now()
+    horizon = (now - timedelta(seconds=config["SETTLE_SECONDS"]), 0)
+    if token:
+        positions = decode_token(token)
+        if positions["deleted"][0] < now - timedelta(days=config["TOMBSTONE_DAYS"]):
+            raise ExpiredToken("Sync token expired; do a full sync")
+    else:
+        # A client with nothing has nothing to delete.
+        positions = {stream: None for stream in STREAMS}
+        positions["deleted"] = horizon
+
+    project_ids = list(Project.objects.filter(owner=user).values_list("id", flat=True))
+    limit = config["PAGE_SIZE"]
+    payload, checkpoints, has_more = {}, {}, False
+    for stream, (scopes, field, rows, serializer) in STREAMS.items():
+        position = positions[stream]
+        keys = scan([scope(user, project_ids) for scope in scopes], field, position, limit)
+        page = keys[:limit]
+        if len(keys) > limit:
+            has_more = True
+            checkpoints[stream] = page[-1]
+        else:
+            checkpoints[stream] = max(position, horizon) if position is not None else horizon
+
+        objects = rows.in_bulk([pk for _, pk in page]) if page else {}
+        objects = [objects[pk] for _, pk in page if pk in objects]
+        if serializer is not None:
+            payload[stream] = serializer(objects, many=True, context=context).data
+        else:
+            deleted = {f"{kind}s": [] for kind, _ in Tombstone.KIND_CHOICES}
+            for tombstone in objects:
+                deleted[f"{tombstone.kind}s"].append(tombstone.object_id)
+            payload[stream] = deleted
+
+    return {**payload, "next": encode_token(checkpoints), "has_more": has_more}
+
+
+def record_deletion(kind, object_id, project_id, owner_id=None):
+    """Leave a tombstone for a deleted row of ``kind`` in ``project_id`` (owned by ``owner_id``, looked up if None)."""
+    if owner_id is None:
+        owner_id = Project.objects.filter(pk=project_id).values_list("owner_id", flat=True).first()
+    if owner_id is not None:
+        Tombstone.objects.create(owner_id=owner_id, kind=kind, object_id=object_id, project_id=project_id)
+
+
+def record_deletions(kind, deletions):
+    """``record_deletion`` for many ``(object_id, project_id)`` pairs: one owner lookup, one INSERT."""
+    deletions = list(deletions)
+    if not deletions:
+        return
+    projects = Project.objects.filter(pk__in={project_id for _, project_id in deletions})
+    owners = dict(projects.values_list("id", "owner_id"))
+    Tombstone.objects.bulk_create([
+        Tombstone(owner_id=owners[project_id], kind=kind, object_id=object_id, project_id=project_id)
+        for object_id, project_id in deletions if project_id in owners
+    ])
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from base64 import b64encode
+from contextlib import nullcontext
+from datetime import timedelta
+from unittest import mock, skipIf, skipUnless
+from urllib import parse
 
-# Create your tests here.
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from redis.exceptions import RedisError, ResponseError
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import (
+    authentication, extraction, fanout, jobs, login, realtime, replicas, response_cache, revocation, search, sync,
+)
+from .access_log import ACCESS_FIELDS, JsonLinesFormatter, QueuedRotatingFileHandler
+from .async_views import AsyncLoginView, AsyncTimelineListView, NotificationStreamView
+from .event_sink import BufferedEventSink
+from .extraction import TextSink
+from .management.commands.explain_task_filters import CASES, Command as ExplainTaskFilters, plan_indexes
+from .middleware.rate_limiting import RateLimitingMiddleware
+from .models import (
+    Blob, BlobText, Comment, Document, DocumentUpload, Notification, Project, Task, TimelineEvent, Tombstone, User,
+)
+from .pagination import KeysetPagination
+from .serializers import TokenSerializer
+from .storage import blob_name, blob_sha256, document_storage
+from .utils import log_events
+from .views import TaskViewSet, TimelineViewSet
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {TokenSerializer.get_token(user).access_token}")
+    return client
+
+
+# ------------------- Access Log -------------------------
+class AccessLogTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.handler = QueuedRotatingFileHandler(os.path.join(root, "access.jsonl"))
+        self.handler.setFormatter(JsonLinesFormatter())
+        self.addCleanup(self.handler.close)
+        self.path = os.path.join(root, f"access.{os.getpid()}.jsonl")
+        patcher = mock.patch.object(logging.getLogger("api.access"), "handlers", [self.handler])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_record_per_request(self):
+        user = User.objects.create_user(email="access@example.com")
+        response = api_client(user).get("/api/projects/", REMOTE_ADDR="203.0.113.7")
+        self.handler.close()
+
+        with open(self.path, encoding="utf-8") as log:
+            lines = log.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(set(record), {"ts", "level", "msg", *ACCESS_FIELDS})
+        self.assertEqual(
+            {field: record[field] for field in ("ip", "method", "path", "route", "status", "user_id", "level", "msg")},
+            {
+                "ip": "203.0.113.7", "method": "GET", "path": "/api/projects/", "route": "project-list",
+                "status": response.status_code, "user_id": user.pk, "level": "INFO", "msg": "request",
+            },
+        )
+        self.assertGreaterEqual(record["latency_ms"], 0)
+
+    def test_close_writes_the_queue_and_stops_the_writer(self):
+        logger = logging.getLogger("api.access")
+        for i in range(1200):  # more than two write batches
+            logger.info("request", extra={"path": f"/{i}"})
+        writer = self.handler._thread
+        self.assertTrue(writer.is_alive())
+
+        self.handler.close()
+        self.assertFalse(writer.is_alive())
+        with open(self.path, encoding="utf-8") as log:
+            self.assertEqual([json.loads(line)["path"] for line in log], [f"/{i}" for i in range(1200)])
+        self.handler.close()  # again, as logging.shutdown would
+
+
+# ------------------- Timeline Event Sink -------------------------
+class BufferedEventSinkTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        self.sink = BufferedEventSink(batch_size=10, spool_path=os.path.join(spool_dir, "spool.jsonl"))
+        self.user = User.objects.create_user(email="sink@example.com")
+        self.project = Project.objects.create(name="sink", owner=self.user)
+
+    def event(self, description):
+        return TimelineEvent(project=self.project, user=self.user, event_type="task_created", description=description)
+
+    def replayed(self):
+        return sorted(TimelineEvent.objects.filter(description__startswith="spooled").values_list("description", flat=True))
+
+    def test_failed_replay_keeps_spooled_and_new_events(self):
+        self.sink._spool([self.event("spooled 1")])
+        self.sink._buffer = [self.event("spooled 2")]
+        with mock.patch.object(TimelineEvent.objects, "bulk_record", side_effect=DatabaseError("down")), \
+                self.assertLogs("api.event_sink", "ERROR"):
+            self.sink.flush()
+        self.assertTrue(os.path.exists(self.sink.replaying_path))
+
+        self.sink._spool([self.event("spooled 3")])
+        self.sink.flush()
+        self.assertEqual(self.replayed(), ["spooled 1", "spooled 2", "spooled 3"])
+        self.assertFalse(os.path.exists(self.sink.replaying_path))
+
+    def test_failed_cache_bump_keeps_later_chunks(self):
+        self.sink.batch_size = 2
+        self.sink._buffer = [self.event(f"buffered {i}") for i in range(5)]
+        with mock.patch.object(response_cache, "bump", side_effect=RedisError("down")), \
+                self.assertLogs("api.event_sink", "ERROR"):
+            self.sink.flush()
+        self.assertEqual(TimelineEvent.objects.filter(description__startswith="buffered").count(), 5)
+        self.assertEqual(self.sink._buffer, [])
+
+
+# ------------------- Rate Limiting -------------------------
+class RateLimitingTests(TestCase):
+    WINDOW = 60
+
+    def setUp(self):
+        self.limiter = RateLimitingMiddleware(lambda request: None)
+        self.limiter.config = {**self.limiter.config, "FAST_PATH_RATIO": 0.5, "FAST_PATH_MAX_PENDING": 5}
+        self.key = f"rl:test:{uuid.uuid4().hex}"
+        clock = mock.patch("api.middleware.rate_limiting.time")
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.window_start = 1_000_000 * self.WINDOW
+        self.clock.time.return_value = self.window_start + 1.0
+
+    def allowed(self, attempts, limit):
+        return sum(self.limiter.hit(self.key, limit, self.WINDOW)[0] for _ in range(attempts))
+
+    def test_concurrent_hits_allow_exactly_limit(self):
+        results, lock = [], threading.Lock()
+
+        def client():
+            allowed = self.allowed(40, limit=100)
+            with lock:
+                results.append(allowed)
+
+        threads = [threading.Thread(target=client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(results), 100)
+
+    def test_fast_path_hits_are_counted_after_the_window_rolls_over(self):
+        # One synced check, then four fast-path hits that only this process knows about.
+        self.assertEqual(self.allowed(5, limit=10), 5)
+        self.clock.time.return_value = self.window_start + self.WINDOW
+        # At the very start of the next window, all five previous hits still count.
+        self.assertEqual(self.allowed(10, limit=10), 5)
+
+
+# ------------------- List Query Counts -------------------------
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+@override_settings(RESPONSE_CACHE={"ENABLED": False})  # count the queries that build the page, not cache hits
+class ListQueryCountTests(TestCase):
+    """A list page costs the same queries for one row as for many: no per-row lookups."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="owner@example.com")
+        self.project = Project.objects.create(name="queries", owner=self.owner)
+        self.blob = Blob.objects.create(sha256="1" * 64, size=1, ref_count=0)
+        self.client = api_client(self.owner)
+        self.rows = 0
+
+    def add_rows(self, count):
+        """``count`` more rows of every listed kind, each by (or for) a different user."""
+        for i in range(self.rows, self.rows + count):
+            author = User.objects.create_user(email=f"author{i}@example.com")
+            Comment.objects.create(project=self.project, user=author, content=f"comment {i}")
+            TimelineEvent.objects.create(
+                project=self.project, user=author, event_type="comment_added", description=f"event {i}"
+            )
+            Task.objects.create(project=self.project, title=f"task {i}", assigned_to=author, is_completed=bool(i % 2))
+            # bulk_create: a saved Document would look for its file in storage.
+            Document.objects.bulk_create([Document(
+                project=self.project, uploaded_by=author, file=blob_name(self.blob.pk), blob=self.blob, name=f"doc {i}"
+            )])
+            Notification.objects.create(user=self.owner, message=f"notification {i}")
+            Project.objects.create(name=f"project {i}", owner=self.owner)
+        self.rows += count
+
+    def assertConstantQueries(self, path, extra=0):
+        """The page at ``path`` lists every added row (plus ``extra``) in the same number of queries. Returns it."""
+        self.add_rows(1)
+        self.client.get(path)  # resolves the token's user once
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(path)
+        self.assertEqual(len(response.json()["results"]), 1 + extra)
+
+        self.add_rows(9)
+        with self.assertNumQueries(len(single)):
+            response = self.client.get(path)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 10 + extra)
+        return results
+
+    def assertAuthors(self, results):
+        self.assertEqual({row["user"] for row in results}, {f"author{i}@example.com" for i in range(10)})
+
+    def test_comment_list(self):
+        self.assertAuthors(self.assertConstantQueries(f"/api/comments/?project={self.project.id}"))
+
+    def test_timeline_list(self):
+        self.assertAuthors(self.assertConstantQueries(f"/api/timeline/?project={self.project.id}"))
+
+    def test_task_list(self):
+        self.assertConstantQueries("/api/tasks/")
+
+    def test_filtered_task_list(self):
+        self.assertConstantQueries(f"/api/tasks/?project={self.project.id}&ordering=-updated_at")
+
+    def test_project_list(self):
+        self.assertConstantQueries("/api/projects/", extra=1)
+
+    def test_project_list_with_stats(self):
+        self.assertConstantQueries("/api/projects/?stats=1", extra=1)
+
+    def test_project_stats(self):
+        self.assertConstantQueries("/api/projects/stats/", extra=1)
+
+    def test_document_list(self):
+        self.assertConstantQueries("/api/documents/")
+
+    def test_notification_list(self):
+        self.assertConstantQueries("/api/notifications/")
+
+
+class ListScopingTests(TestCase):
+    """Comments and timeline events only show up for the owner of their project."""
+
+    def setUp(self):
+        owner = User.objects.create_user(email="owner@example.com")
+        self.project = Project.objects.create(name="private", owner=owner)
+        task = Task.objects.create(project=self.project, title="private task")
+        Comment.objects.create(project=self.project, user=owner, content="on the project")
+        self.task_comment = Comment.objects.create(task=task, user=owner, content="on the task")
+        TimelineEvent.objects.create(project=self.project, user=owner, event_type="task_created", description="created")
+        self.owner = api_client(owner)
+        self.stranger = api_client(User.objects.create_user(email="stranger@example.com"))
+
+    def test_timeline_of_another_users_project_is_empty(self):
+        path = f"/api/timeline/?project={self.project.id}"
+        self.assertEqual(len(self.owner.get(path).json()["results"]), 1)
+        self.assertEqual(self.stranger.get(path).json()["results"], [])
+
+    def test_comments_of_another_users_project_are_hidden(self):
+        for path in (f"/api/comments/?project={self.project.id}", f"/api/comments/?task={self.task_comment.task_id}"):
+            with self.subTest(path=path):
+                self.assertEqual(len(self.owner.get(path).json()["results"]), 1)
+                self.assertEqual(self.stranger.get(path).json()["results"], [])
+        self.assertEqual(self.stranger.get(f"/api/comments/{self.task_comment.id}/").status_code, 404)
+
+
+# ------------------- Keyset Pagination -------------------------
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="pages@example.com")
+        project = Project.objects.create(name="pages", owner=user)
+        now = timezone.now()
+        # Runs of equal timestamps, so pages have to break ties on id.
+        for minutes in (3, 3, 3, 2, 2, 1, 1):
+            event = TimelineEvent.objects.create(project=project, user=user, event_type="task_created", description="x")
+            TimelineEvent.objects.filter(pk=event.pk).update(created_at=now - timedelta(minutes=minutes))
+        self.queryset = TimelineEvent.objects.all()
+        self.newest_first = list(self.queryset.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def paginate(self, url):
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(self.queryset, Request(APIRequestFactory().get(url)))
+        return [event.pk for event in page], paginator.get_next_link(), paginator.get_previous_link()
+
+    def cursor(self, pk, reverse=False):
+        paginator = KeysetPagination()
+        paginator.base_url, paginator.field = "http://testserver/events/", "created_at"
+        return paginator.encode_cursor(TimelineEvent.objects.get(pk=pk), reverse=reverse)
+
+    def test_walks_forward_and_back_across_ties(self):
+        pages, url = [], "/events/?page_size=2"
+        while url:
+            ids, url, previous = self.paginate(url)
+            self.assertEqual(previous is None, not pages)
+            pages.append((ids, previous))
+        self.assertEqual([pk for ids, _ in pages for pk in ids], self.newest_first)
+        self.assertEqual([len(ids) for ids, _ in pages], [2, 2, 2, 1])
+
+        # Each previous link leads back to exactly the page before it.
+        for (expected, _), (_, previous) in zip(pages, pages[1:]):
+            ids, following, _ = self.paginate(previous)
+            self.assertEqual(ids, expected)
+            self.assertIsNotNone(following)
+
+    def test_page_past_the_end_has_no_links(self):
+        self.assertEqual(self.paginate(self.cursor(self.newest_first[-1])), ([], None, None))
+        self.assertEqual(self.paginate(self.cursor(self.newest_first[0], reverse=True))[0], [])
+
+    def test_bad_cursors_are_not_found(self):
+        def encode(querystring):
+            return b64encode(querystring.encode()).decode()
+
+        for cursor in ("not base64!", encode("p=yesterday&i=1"), encode("i=1"), encode("p=2024-01-01T00:00:00Z&i=x"),
+                       encode("p=2024-01-01T00:00:00Z&i=1&r=maybe"), encode("p=&i=1")):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.paginate(f"/events/?{parse.urlencode({'cursor': cursor})}")
+
+    def test_page_size_setting_is_read_per_request(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "PAGE_SIZE": 3}):
+            ids, _, _ = self.paginate("/events/")
+        self.assertEqual(ids, self.newest_first[:3])
+
+
+# ------------------- Response Cache -------------------------
+class ResponseCacheTests(TestCase):
+    def test_bump_waits_for_commit(self):
+        scope = ("project", uuid.uuid4().hex)
+        with self.captureOnCommitCallbacks(execute=True):
+            response_cache.bump(*scope)
+            self.assertEqual(response_cache.get_versions([scope]), [0])
+        self.assertEqual(response_cache.get_versions([scope]), [1])
+
+
+# ------------------- Chunked Uploads -------------------------
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = mock.patch.dict(document_storage.__dict__, {"base_location": root, "location": root})
+        storage.start()
+        self.addCleanup(storage.stop)
+        config = override_settings(DOCUMENT_UPLOADS={"STAGING_DIR": os.path.join(root, "uploads"), "X_ACCEL_REDIRECT": False})
+        config.enable()
+        self.addCleanup(config.disable)
+        extraction = mock.patch("api.extraction.extract_document_text.delay")  # text extraction isn't under test
+        extraction.start()
+        self.addCleanup(extraction.stop)
+
+        self.owner = User.objects.create_user(email="uploader@example.com")
+        self.project = Project.objects.create(name="uploads", owner=self.owner)
+        self.client = api_client(self.owner)
+
+    def start(self, **fields):
+        response = self.client.post("/api/documents/uploads/", {
+            "project": self.project.id, "name": "report", "filename": "report.txt", **fields,
+        }, format="json")
+        self.upload_id = response.json()["id"]
+
+    def put(self, offset, data):
+        return self.client.generic(
+            "PUT", f"/api/documents/uploads/{self.upload_id}/", data,
+            content_type="application/octet-stream", HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def complete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/documents/uploads/{self.upload_id}/complete/")
+
+    def test_parts_are_stored_outside_media_root(self):
+        self.start(size=10)
+        self.assertEqual(self.put(0, b"hello").json()["received_bytes"], 5)
+        self.assertEqual(self.put(0, b"again").status_code, 409)
+        self.assertEqual(self.put(5, b"world").json()["received_bytes"], 10)
+
+        response = self.complete()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("/media/", response.json()["file_url"])
+        document = Document.objects.get(pk=response.json()["id"])
+        self.assertTrue(document_storage.path(document.file.name).startswith(document_storage.location))
+        self.assertEqual(b"".join(self.client.get(f"/api/documents/{document.pk}/download/").streaming_content), b"helloworld")
+        self.assertFalse(os.path.exists(os.path.join(document_storage.location, "uploads", f"{self.upload_id}.part")))
+
+    def test_failed_completion_keeps_the_upload(self):
+        self.start()
+        self.put(0, b"helloworld")
+        with mock.patch.object(Document.objects, "create", side_effect=DatabaseError("down")), \
+                self.assertRaises(DatabaseError):
+            self.complete()
+        self.assertTrue(DocumentUpload.objects.filter(pk=self.upload_id).exists())
+        # The staged bytes now back a blob: no more writes, but completion can be retried.
+        self.assertEqual(self.put(10, b"!").status_code, 409)
+        self.assertEqual(self.complete().status_code, 201)
+
+    def test_identical_documents_share_one_blob(self):
+        for name in ("first.txt", "second.txt"):
+            response = self.client.post("/api/documents/", {
+                "project": self.project.id, "name": name, "file": SimpleUploadedFile(name, b"same bytes"),
+            })
+            self.assertEqual(response.status_code, 201)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(set(Document.objects.values_list("file", flat=True)), {f"blobs/{blob.sha256[:2]}/{blob.sha256[2:4]}/{blob.sha256}"})
+
+
+# ------------------- Async List Views -------------------------
+class AdminTimelineViewSet(TimelineViewSet):
+    permission_classes = [IsAdminUser]
+
+
+class AdminTimelineListView(AsyncTimelineListView):
+    viewset_class = AdminTimelineViewSet
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class AsyncListViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="async@example.com")
+        self.project = Project.objects.create(name="async", owner=self.user)
+        for i in range(3):
+            TimelineEvent.objects.create(project=self.project, user=self.user, event_type="task_created", description=f"event {i}")
+        self.auth = f"Bearer {TokenSerializer.get_token(self.user).access_token}"
+        stranger = User.objects.create_user(email="stranger@example.com")
+        self.stranger_auth = f"Bearer {TokenSerializer.get_token(stranger).access_token}"
+
+    async def get(self, view_class, **headers):
+        request = AsyncRequestFactory().get("/api/timeline/", {"project": self.project.id}, headers=headers)
+        return await view_class.as_view()(request)
+
+    async def test_requires_authentication(self):
+        response = await self.get(AsyncTimelineListView)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_runs_the_viewset_permissions(self):
+        response = await self.get(AdminTimelineListView, authorization=self.auth)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_matches_the_sync_list(self):
+        response = await self.get(AsyncTimelineListView, authorization=self.auth)
+        self.assertEqual(response.status_code, 200)
+
+        request = APIRequestFactory().get("/api/timeline/", {"project": self.project.id}, HTTP_AUTHORIZATION=self.auth)
+        expected = await sync_to_async(TimelineViewSet.as_view({"get": "list"}))(request)
+        self.assertEqual(json.loads(response.content), json.loads(expected.rendered_content))
+
+    async def test_hides_another_users_project(self):
+        response = await self.get(AsyncTimelineListView, authorization=self.stranger_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"], [])
+
+
+# ------------------- Notification Stream -------------------------
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="stream@example.com")
+        self.own = Project.objects.create(name="own", owner=self.user)
+        other = User.objects.create_user(email="other@example.com")
+        self.foreign = Project.objects.create(name="foreign", owner=other)
+        self.client = api_client(self.user)
+        stream = mock.patch("api.realtime.event_stream", side_effect=lambda user, project_ids, cursor: iter([]))
+        self.event_stream = stream.start()
+        self.addCleanup(stream.stop)
+
+    async def open(self, **params):
+        request = AsyncRequestFactory().get("/api/notifications/stream/", params)
+        return await NotificationStreamView.as_view()(request)
+
+    async def test_ticket_opens_one_stream(self):
+        response = await sync_to_async(self.client.post)("/api/notifications/stream/ticket/")
+        ticket = response.json()["ticket"]
+        self.assertEqual((await self.open(ticket=ticket)).status_code, 200)
+        self.assertEqual(self.event_stream.call_args.args[0].pk, self.user.pk)
+        self.assertEqual((await self.open(ticket=ticket)).status_code, 401)
+
+    async def test_requested_projects_are_limited_to_the_users_own(self):
+        ticket = await sync_to_async(self.client.post)("/api/notifications/stream/ticket/")
+        response = await self.open(ticket=ticket.json()["ticket"], project=[self.own.id, self.foreign.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.event_stream.call_args.args[1], [self.own.id])
+
+    async def test_rejects_non_integer_project_ids(self):
+        ticket = await sync_to_async(self.client.post)("/api/notifications/stream/ticket/")
+        response = await self.open(ticket=ticket.json()["ticket"], project="abc")
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeHub:
+    async def subscribe(self, subscription):
+        pass
+
+    async def unsubscribe(self, subscription):
+        pass
+
+
+@skipIf(connection.vendor == "sqlite", "in-memory SQLite test databases ignore close()")
+@override_settings(REALTIME={"HEARTBEAT": 0.01})
+class NotificationStreamConnectionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="streams@example.com")
+        Project.objects.create(name="streamed", owner=self.user)
+        hub = mock.patch("api.realtime.get_hub", return_value=FakeHub())
+        hub.start()
+        self.addCleanup(hub.stop)
+
+    async def test_open_streams_hold_no_connections(self):
+        # One more stream than the pool holds, each on its own thread like an ASGI request.
+        pool = settings.DATABASES["default"]["OPTIONS"].get("pool") or {}
+        streams = pool.get("max_size", 10) + 1
+        opened, done, finished = [], asyncio.Event(), asyncio.Event()
+
+        async def open_stream():
+            async with ThreadSensitiveContext():
+                stream = realtime.event_stream(self.user, [], None)
+                self.assertTrue((await anext(stream)).startswith("retry:"))
+                self.assertEqual(await anext(stream), ": ping\n\n")  # past the catch-up
+                opened.append(await sync_to_async(lambda: connection.connection is None)())
+                if len(opened) == streams:
+                    done.set()
+                await finished.wait()
+                await stream.aclose()
+
+        async def request():
+            await done.wait()
+            async with ThreadSensitiveContext():
+                # With the pool used up this would wait out DB_POOL_TIMEOUT and fail.
+                users = await User.objects.acount()
+            finished.set()
+            return users
+
+        *_, users = await asyncio.wait_for(
+            asyncio.gather(*(open_stream() for _ in range(streams)), request()), timeout=10
+        )
+        self.assertEqual(opened, [True] * streams)
+        self.assertEqual(users, 1)
+
+
+# ------------------- Login -------------------------
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="login@example.com")
+        self.released = threading.Event()
+        self.pool = login.HashPool(workers=1, max_pending=1)
+        self.addCleanup(self.pool.close)
+        self.addCleanup(self.released.set)  # cleanups run last-in first-out: unblock, then close
+        self.pool._authenticate = self.hash
+        patcher = mock.patch.object(login, "_hash_pool", self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hash(self, request, email, password):
+        """Stands in for ``authenticate`` on the pool's thread, holding it until ``released``."""
+        self.released.wait(5)
+        return self.user if password == "correct horse" else None
+
+    def submit(self):
+        return self.pool.submit(None, self.user.email, "correct horse")
+
+    def assertSlotFreed(self):
+        # A slot comes back in the future's done callback, just after its result is set.
+        for _ in range(100):
+            try:
+                return self.submit()
+            except login.LoginBusy:
+                time.sleep(0.01)
+        self.fail("no login slot came back")
+
+    def post(self, password="correct horse"):
+        return self.client.post("/api/users/login/", {"email": self.user.email, "password": password}, format="json")
+
+    def test_pool_admits_workers_plus_pending(self):
+        held = [self.submit(), self.submit()]
+        with self.assertRaises(login.LoginBusy):
+            self.submit()
+        self.released.set()
+        self.assertEqual([future.result(5) for future in held], [self.user, self.user])
+        self.assertEqual(self.assertSlotFreed().result(5), self.user)
+
+    def test_saturated_pool_answers_503(self):
+        self.submit(), self.submit()
+        response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_login(self):
+        self.released.set()
+        self.assertEqual(self.post("wrong").status_code, 401)
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["email"], self.user.email)
+
+    @override_settings(LOGIN={"TIMEOUT": 0.05})
+    def test_slow_hash_times_out_with_503(self):
+        self.submit()  # holds the only hash thread
+        started = time.monotonic()
+        response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("timed out", response.json()["detail"])
+        self.assertLess(time.monotonic() - started, 2)
+        # The queued hash was cancelled, so its slot is free again straight away.
+        self.submit()
+
+    @override_settings(LOGIN={"TIMEOUT": 0.05})
+    async def test_async_slow_hash_times_out_with_503(self):
+        self.submit()
+        credentials = {"email": self.user.email, "password": "correct horse"}
+        request = AsyncRequestFactory().post("/api/users/login/", credentials, content_type="application/json")
+        response = await AsyncLoginView.as_view()(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("timed out", json.loads(response.content)["detail"])
+
+    def test_issue_tokens(self):
+        with mock.patch.object(login.jwt_settings, "UPDATE_LAST_LOGIN", True):
+            tokens = login.issue_tokens(self.user)
+        self.assertEqual(str(AccessToken(tokens["access"])["user_id"]), str(self.user.pk))
+        self.assertEqual(str(RefreshToken(tokens["refresh"])["user_id"]), str(self.user.pk))
+        self.assertEqual((tokens["email"], tokens["role"]), (self.user.email, self.user.role))
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).last_login)
+
+    # A fast hasher: what matters is how many hashes each attempt costs.
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_wrong_password_and_unknown_email_cost_one_hash(self):
+        self.user.set_password("correct horse")
+        self.user.save()
+        hasher = type(get_hasher())
+        attempts = [(self.user.email, "correct horse"), (self.user.email, "wrong"), ("nobody@example.com", "x")]
+        for email, password in attempts:
+            with self.subTest(email=email, password=password), \
+                    mock.patch.object(hasher, "encode", autospec=True, side_effect=hasher.encode) as encode:
+                authenticate(None, email=email, password=password)
+                self.assertEqual(encode.call_count, 1)
+
+
+# ------------------- Auth Cache -------------------------
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="cached@example.com")
+        self.key = authentication.cache_key(self.user.pk, self.user.token_version)
+        self.cache = caches[authentication.get_config()["CACHE_ALIAS"]]
+        authentication.get_local_cache().clear()
+        self.addCleanup(authentication.get_local_cache().clear)
+        self.addCleanup(self.cache.delete, self.key)
+
+    def fields(self):
+        return authentication.user_fields(self.user.pk, self.user.token_version)
+
+    def test_forgotten_entry_is_not_refilled(self):
+        self.assertTrue(self.fields()["is_active"])
+        with self.captureOnCommitCallbacks(execute=True):
+            authentication.forget_user(self.user.pk, self.user.token_version)
+        # A miss that read the user before the change tries to put it back.
+        self.assertFalse(self.cache.add(self.key, {"is_active": True}))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.fields()["is_active"])
+        self.assertEqual(self.cache.get(self.key), authentication.FORGOTTEN)
+
+    def test_redis_errors_fall_back_to_the_database(self):
+        with mock.patch.object(self.cache, "get", side_effect=RedisError("down")), \
+                self.assertLogs("api.authentication", "WARNING"):
+            self.assertEqual(self.fields()["email"], "cached@example.com")
+
+    async def test_async_redis_errors_fall_back_to_the_database(self):
+        with mock.patch.object(self.cache, "aget", side_effect=RedisError("down")), \
+                self.assertLogs("api.authentication", "WARNING"):
+            fields = await authentication.auser_fields(self.user.pk, self.user.token_version)
+        self.assertEqual(fields["email"], "cached@example.com")
+
+
+# ------------------- Unread Counters -------------------------
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="unread@example.com")
+
+    def unread(self):
+        return User.objects.values_list("unread_notification_count", flat=True).get(pk=self.user.pk)
+
+    def test_full_user_save_keeps_the_counter(self):
+        stale = User.objects.get(pk=self.user.pk)
+        Notification.objects.bulk_notify([Notification(user=self.user, message=f"n{i}") for i in range(2)])
+        stale.first_name = "Renamed"
+        stale.save()
+        self.assertEqual(self.unread(), 2)
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, "Renamed")
+
+    def test_saving_read_state_moves_the_counter(self):
+        notification = Notification.objects.create(user=self.user, message="hello")
+        self.assertEqual(self.unread(), 1)
+        notification.is_read = True
+        notification.save()
+        self.assertEqual(self.unread(), 0)
+        notification = Notification.objects.get(pk=notification.pk)
+        notification.is_read = False
+        notification.save(update_fields=["is_read"])
+        self.assertEqual(self.unread(), 1)
+
+
+# ------------------- Notification Fan-out -------------------------
+@override_settings(JOBS={"MODE": "eager"})
+class FanoutModeTests(TestCase):
+    """Every fan-out mode turns the same timeline activity into the same notifications."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="fanout-owner@example.com")
+        self.assignee = User.objects.create_user(email="fanout-assignee@example.com")
+        self.actor = User.objects.create_user(email="fanout-actor@example.com")
+        self.project = Project.objects.create(name="Fanout", owner=self.owner)
+        # Outside a test transaction these would recycle the worker thread's connection.
+        for target in ("api.fanout.close_old_connections", "api.jobs.close_old_connections"):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def notify(self, mode):
+        """Log a burst of activity through a ``mode`` fan-out and return what was delivered, then forget it."""
+        fanout_ = fanout.build_fanout({"MODE": mode, "WINDOW": 60})
+        with mock.patch.object(fanout, "_fanout", fanout_), self.captureOnCommitCallbacks(execute=True):
+            log_events([
+                *[(self.project, self.actor, "comment_added", f"comment {i}") for i in range(3)],
+                (self.project, self.actor, "task_updated", "Launch", [self.assignee.pk]),
+                (self.project, self.owner, "task_created", "Own task"),
+            ])
+        with self.captureOnCommitCallbacks(execute=True):  # runs the job a failed chunk was requeued as
+            fanout_.close()
+        delivered = sorted(Notification.objects.values_list("user__email", "message"))
+        unread = dict(User.objects.values_list("email", "unread_notification_count"))
+        Notification.objects.all().delete()
+        User.objects.update(unread_notification_count=0)
+        return delivered, unread
+
+    def test_modes_deliver_the_same_notifications(self):
+        expected = self.notify("sync")
+        self.assertEqual(expected[0], [
+            ("fanout-assignee@example.com", "Fanout: Launch"),
+            ("fanout-owner@example.com", "3 new comments on Fanout"),
+            ("fanout-owner@example.com", "Fanout: Launch"),
+        ])
+        for mode in ("queue", "background"):
+            with self.subTest(mode=mode):
+                self.assertEqual(self.notify(mode), expected)
+
+    def test_background_write_failure_is_requeued(self):
+        expected = self.notify("sync")
+        bulk_notify = Notification.objects.bulk_notify
+        calls = []
+
+        def fail_once(notifications):
+            calls.append(len(notifications))
+            if len(calls) == 1:
+                raise DatabaseError("connection lost")
+            return bulk_notify(notifications)
+
+        with mock.patch.object(Notification.objects, "bulk_notify", fail_once), self.assertLogs("api.fanout", "ERROR"):
+            self.assertEqual(self.notify("background"), expected)
+        self.assertEqual(calls, [3, 3])
+
+
+# ------------------- Project Stats -------------------------
+class ProjectStatsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="stats-owner@example.com")
+        self.project = Project.objects.create(name="Stats", owner=self.owner)
+        self.task = Task.objects.create(project=self.project, title="Task")
+
+    def stats(self):
+        return Project.objects.values("task_count", "comment_count", "document_count").get(pk=self.project.pk)
+
+    def test_full_project_save_keeps_the_counters(self):
+        stale = Project.objects.get(pk=self.project.pk)
+        Task.objects.create(project=self.project, title="Another")
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(self.stats()["task_count"], 2)
+        self.assertEqual(Project.objects.get(pk=self.project.pk).name, "Renamed")
+
+    def test_deleting_a_user_adjusts_other_projects_once(self):
+        member = User.objects.create_user(email="stats-member@example.com")
+        own = Project.objects.create(name="Own", owner=member)
+        Comment.objects.create(user=member, task=Task.objects.create(project=own, title="Own task"), content="mine")
+        for i in range(3):
+            Comment.objects.create(user=member, task=self.task, content=f"on task {i}")
+            Comment.objects.create(user=member, project=self.project, content=f"on project {i}")
+        Comment.objects.create(user=self.owner, task=self.task, content="stays")
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with mock.patch.dict(document_storage.__dict__, {"base_location": root, "location": root}), \
+                mock.patch("api.extraction.extract_document_text.delay"):
+            Document.objects.create(
+                project=self.project, uploaded_by=member, name="notes.txt",
+                file=SimpleUploadedFile("notes.txt", b"notes"),
+            )
+        self.assertEqual(self.stats(), {"task_count": 1, "comment_count": 7, "document_count": 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            member.delete()
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "api_project"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.stats(), {"task_count": 1, "comment_count": 1, "document_count": 0})
+        # Only the comments left in the owner's project are buried, in one INSERT.
+        inserts = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "api_tombstone"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            set(Tombstone.objects.values_list("owner_id", "kind", "project_id")),
+            {(self.owner.pk, "comment", self.project.pk)},
+        )
+        self.assertEqual(Tombstone.objects.count(), 6)
+
+
+# ------------------- Bulk Tasks -------------------------
+class BulkTaskTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="bulk-owner@example.com")
+        self.assignee = User.objects.create_user(email="bulk-assignee@example.com")
+        self.project = Project.objects.create(name="bulk", owner=self.owner)
+        self.other = Project.objects.create(name="bulk-other", owner=self.owner)
+        self.foreign = Project.objects.create(name="foreign", owner=self.assignee)
+        self.client = api_client(self.owner)
+        self.logged = []
+        patcher = mock.patch("api.views.log_events", side_effect=self.log_events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log_events(self, events):
+        events = list(events)
+        self.logged.extend((project.pk, event_type, notify) for project, _, event_type, _, notify in events)
+        log_events(events)
+
+    def counters(self, *projects):
+        rows = Project.objects.in_bulk([project.pk for project in projects])
+        return [(rows[project.pk].task_count, rows[project.pk].completed_task_count) for project in projects]
+
+    def versions(self, *projects):
+        return response_cache.get_versions([("project", project.pk) for project in projects])
+
+    def send(self, method, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)("/api/tasks/bulk/", items, format="json")
+
+    def test_create(self):
+        before = self.versions(self.project, self.other)
+        response = self.send("post", [
+            {"project": self.project.pk, "title": "one", "assigned_to": self.assignee.pk},
+            {"project": self.project.pk, "title": "two", "is_completed": True},
+            {"project": self.foreign.pk, "title": "not mine"},
+            {"project": self.other.pk, "title": "three"},
+            {"project": self.project.pk},
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([task["title"] for task in body["created"]], ["one", "two", "three"])
+        errors = [(error["index"], list(error["errors"])) for error in body["errors"]]
+        self.assertEqual(errors, [(2, ["project"]), (4, ["title"])])
+        self.assertFalse(Task.objects.filter(project=self.foreign).exists())
+        self.assertEqual(self.counters(self.project, self.other, self.foreign), [(2, 1), (1, 0), (0, 0)])
+        self.assertEqual(self.versions(self.project, self.other), [version + 1 for version in before])
+        self.assertEqual(self.logged, [
+            (self.project.pk, "task_created", [self.assignee.pk]),
+            (self.project.pk, "task_created", [None]),
+            (self.other.pk, "task_created", [None]),
+        ])
+
+    def test_update_moves_counters(self):
+        done = Task.objects.create(project=self.project, title="done", is_completed=True)
+        moving = Task.objects.create(project=self.project, title="moving")
+        before = self.versions(self.project, self.other)
+
+        response = self.send("patch", [
+            {"id": done.pk, "is_completed": False},
+            {"id": moving.pk, "project": self.other.pk, "is_completed": True},
+            {"id": done.pk + moving.pk + 1000, "title": "missing"},
+            {"id": moving.pk, "project": self.foreign.pk},
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(sorted(task["id"] for task in body["updated"]), [done.pk, moving.pk])
+        self.assertEqual([error["index"] for error in body["errors"]], [2, 3])
+        self.assertEqual(self.counters(self.project, self.other), [(1, 0), (1, 1)])
+        self.assertEqual(self.versions(self.project, self.other), [version + 1 for version in before])
+        self.assertEqual(sorted(event_type for _, event_type, _ in self.logged), ["task_updated"] * 2)
+
+    def test_all_invalid_changes_nothing(self):
+        before = self.versions(self.project)
+        for method, items in (("post", [{"project": self.foreign.pk, "title": "x"}, {"title": "no project"}]),
+                              ("patch", [{"id": 0, "title": "missing"}])):
+            with self.subTest(method=method):
+                response = self.send(method, items)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(len(response.json()["errors"]), len(items))
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(self.counters(self.project, self.foreign), [(0, 0), (0, 0)])
+        self.assertEqual(self.versions(self.project), before)
+        self.assertEqual(self.logged, [])
+
+    def test_failed_write_leaves_no_rows_or_counts(self):
+        items = [{"project": self.project.pk, "title": f"t{i}", "is_completed": bool(i % 2)} for i in range(3)]
+        with mock.patch("api.views.log_events", side_effect=DatabaseError("lost")), self.assertRaises(DatabaseError):
+            self.send("post", items)
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(self.counters(self.project), [(0, 0)])
+
+    def test_rejects_malformed_batches(self):
+        for items in ({"project": self.project.pk, "title": "not a list"}, []):
+            with self.subTest(items=items):
+                self.assertEqual(self.send("post", items).status_code, 400)
+        with mock.patch.object(TaskViewSet, "bulk_max_items", 2):
+            response = self.send("post", [{"project": self.project.pk, "title": f"t{i}"} for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+
+# ------------------- Search -------------------------
+@skipUnless(connection.vendor == "postgresql", "full-text search needs PostgreSQL")
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="searcher@example.com")
+        self.project = Project.objects.create(name="Apollo", owner=self.owner)
+        other = User.objects.create_user(email="stranger@example.com")
+        Task.objects.create(project=Project.objects.create(name="Launch pad", owner=other), title="Launch day")
+
+    def hits(self, text, **kwargs):
+        return [(hit["type"], hit["id"]) for hit in search.search(self.owner, text, **kwargs)]
+
+    def test_ranks_title_matches_first_within_the_users_projects(self):
+        described = Task.objects.create(project=self.project, title="Checklist", description="before the launch")
+        titled = Task.objects.create(project=self.project, title="Launch rehearsal")
+        comment = Comment.objects.create(user=self.owner, task=titled, content="launch moved to friday")
+        self.assertEqual(self.hits("launch")[0], ("task", titled.pk))
+        self.assertEqual(
+            set(self.hits("launch")), {("task", titled.pk), ("task", described.pk), ("comment", comment.pk)}
+        )
+        self.assertEqual(self.hits("launch", types=["comment"]), [("comment", comment.pk)])
+
+    def test_triggers_keep_vectors_current(self):
+        task = Task.objects.create(project=self.project, title="Draft agenda")
+        task.title = "Final agenda"
+        task.save()
+        self.assertEqual(self.hits("final"), [("task", task.pk)])
+        self.assertEqual(self.hits("draft"), [])
+
+        blob = Blob.objects.create(sha256="0" * 64, size=1, ref_count=1)
+        document = Document.objects.bulk_create([
+            Document(project=self.project, uploaded_by=self.owner, file=blob_name(blob.pk), blob=blob, name="notes.txt")
+        ])[0]
+        sink = TextSink(max_bytes=1024, index_chars=1024)
+        sink.write("quarterly revenue figures")
+        extraction.save_text(blob.pk, sink, BlobText.EXTRACTED, "")
+        self.assertEqual(self.hits("revenue"), [("document", document.pk)])
+
+    def test_snippets_escape_the_users_markup(self):
+        Task.objects.create(
+            project=self.project, title="<script>alert(1)</script> launch", description="<b>launch</b>"
+        )
+        (hit,) = search.search(self.owner, "launch")
+        self.assertEqual(hit["title"], "&lt;script&gt;alert(1)&lt;/script&gt; <mark>launch</mark>")
+        self.assertIn("<mark>launch</mark>", hit["snippet"])
+        self.assertNotIn("<b>", hit["snippet"])
+
+
+# ------------------- Delta Sync -------------------------
+@override_settings(SYNC={"PAGE_SIZE": 2, "SETTLE_SECONDS": 5, "TOMBSTONE_DAYS": 30})
+class SyncTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="sync-owner@example.com")
+        self.project = Project.objects.create(name="sync", owner=self.owner)
+        self.client = api_client(self.owner)
+        self.now = timezone.now()
+
+    def stamp(self, obj, seconds_ago):
+        """Backdate ``obj`` as if it were last saved ``seconds_ago`` seconds ago."""
+        type(obj).objects.filter(pk=obj.pk).update(updated_at=self.now - timedelta(seconds=seconds_ago))
+
+    def sync(self, token=None):
+        response = self.client.get("/api/sync/", {"since": token} if token else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def sync_all(self, token=None):
+        """Follow ``has_more`` to the end; the pages, and the token to sync from next time."""
+        pages = [self.sync(token)]
+        while pages[-1]["has_more"]:
+            pages.append(self.sync(pages[-1]["next"]))
+        return pages, pages[-1]["next"]
+
+    def ids(self, pages, stream):
+        return [row["id"] for page in pages for row in page[stream]]
+
+    def test_comment_scopes_are_merged_in_order(self):
+        task = Task.objects.create(project=self.project, title="scoped")
+        stranger = User.objects.create_user(email="sync-stranger@example.com")
+        Comment.objects.create(project=Project.objects.create(name="other", owner=stranger), user=stranger, content="x")
+        comments = []
+        for i in range(5):
+            # Alternate the project and task arms, oldest first.
+            parent = {"task": task} if i % 2 else {"project": self.project}
+            comment = Comment.objects.create(user=self.owner, content=f"c{i}", **parent)
+            self.stamp(comment, 100 - i)
+            comments.append(comment.pk)
+
+        pages, _ = self.sync_all()
+        self.assertEqual(self.ids(pages, "comments"), comments)
+        self.assertEqual([len(page["comments"]) for page in pages], [2, 2, 1])
+
+    def test_equal_timestamps_page_without_skips_or_repeats(self):
+        tasks = [Task.objects.create(project=self.project, title=f"t{i}") for i in range(5)]
+        Task.objects.update(updated_at=self.now - timedelta(seconds=60))
+
+        pages, _ = self.sync_all()
+        self.assertEqual(self.ids(pages, "tasks"), [task.pk for task in tasks])
+        self.assertEqual([page["has_more"] for page in pages], [True, True, False])
+
+    def test_checkpoint_stops_at_the_settle_horizon(self):
+        settled, recent = (Task.objects.create(project=self.project, title=title) for title in ("settled", "recent"))
+        self.stamp(settled, 60)
+        self.stamp(recent, 1)
+
+        first = self.sync()
+        self.assertFalse(first["has_more"])
+        self.assertEqual([row["id"] for row in first["tasks"]], [settled.pk, recent.pk])
+        timestamp, _ = sync.decode_token(first["next"])["tasks"]
+        self.assertLessEqual(timestamp, timezone.now() - timedelta(seconds=5))
+
+        # Inside the settle window: sent again in case an older write commits behind it.
+        second = self.sync(first["next"])
+        self.assertEqual([row["id"] for row in second["tasks"]], [recent.pk])
+
+    def test_delete_between_syncs_is_reported(self):
+        task = Task.objects.create(project=self.project, title="doomed")
+        Comment.objects.create(task=task, user=self.owner, content="goes with it")
+        _, token = self.sync_all()
+
+        task_id = task.pk
+        task.delete()
+        pages, _ = self.sync_all(token)
+        self.assertEqual(pages[0]["deleted"], {"projects": [], "tasks": [task_id], "comments": []})
+        self.assertEqual(pages[0]["tasks"], [])
+
+    def test_first_sync_reports_no_deletions(self):
+        Task.objects.create(project=self.project, title="doomed").delete()
+        Tombstone.objects.update(deleted_at=self.now - timedelta(seconds=60))
+        self.assertEqual(self.sync()["deleted"], {"projects": [], "tasks": [], "comments": []})
+
+    def test_deleted_commenter_leaves_tombstones_for_the_project_owner(self):
+        commenter = User.objects.create_user(email="sync-commenter@example.com")
+        comment = Comment.objects.create(project=self.project, user=commenter, content="bye")
+        _, token = self.sync_all()
+
+        commenter.delete()
+        self.assertEqual(self.sync(token)["deleted"]["comments"], [comment.pk])
+
+    def test_record_deletions(self):
+        other = Project.objects.create(name="other", owner=User.objects.create_user(email="sync-other@example.com"))
+        with self.assertNumQueries(2):
+            sync.record_deletions("comment", [(1, self.project.pk), (2, other.pk), (3, other.pk + 1000)])
+        self.assertEqual(
+            sorted(Tombstone.objects.values_list("owner_id", "object_id", "project_id")),
+            [(self.owner.pk, 1, self.project.pk), (other.owner_id, 2, other.pk)],
+        )
+        with self.assertNumQueries(0):
+            sync.record_deletions("comment", [])
+
+    def test_expired_token_is_gone(self):
+        stale = self.now - timedelta(days=31)
+        token = sync.encode_token({stream: (stale, 0) for stream in sync.STREAMS})
+        response = self.client.get("/api/sync/", {"since": token})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["reset"])
+
+    def test_invalid_token_is_rejected(self):
+        for token in ("not-a-token", sync.encode_token({"tasks": (self.now, 1)})):
+            with self.subTest(token=token):
+                self.assertEqual(self.client.get("/api/sync/", {"since": token}).status_code, 400)
+
+
+# ------------------- Text Extraction -------------------------
+class TextExtractionTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = mock.patch.dict(document_storage.__dict__, {"base_location": root, "location": root})
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def blob(self, data=None):
+        """A referenced blob holding ``data``, or one whose file is missing."""
+        if data is None:
+            return Blob.objects.create(sha256=uuid.uuid4().hex * 2, size=1, ref_count=1)
+        sha256 = blob_sha256(document_storage.save("upload", ContentFile(data)))
+        return Blob.objects.create(sha256=sha256, size=len(data), ref_count=1)
+
+    def test_sink_truncates_on_a_character_boundary(self):
+        sink = TextSink(max_bytes=5, index_chars=3)
+        sink.write("ab")
+        sink.write("cd\u00e9f")  # the two-byte é would end at byte 6
+        sink.write("more")
+        self.assertTrue(sink.truncated)
+        self.assertEqual(sink.text_bytes, 4)
+        self.assertEqual(zlib.decompress(sink.content()).decode("utf-8"), "abcd")
+        self.assertEqual(sink.index_text(), "abc")
+
+    def test_sink_keeps_short_text_whole(self):
+        sink = TextSink(max_bytes=100, index_chars=100)
+        for piece in ("h\u00e9llo ", "", "world"):
+            sink.write(piece)
+        self.assertFalse(sink.truncated)
+        self.assertEqual(zlib.decompress(sink.content()).decode("utf-8"), "h\u00e9llo world")
+        self.assertEqual(sink.text_bytes, len("h\u00e9llo world".encode("utf-8")))
+
+    def test_statuses(self):
+        cases = [(b"plain words", BlobText.EXTRACTED), (b"\x00\x01binary", BlobText.UNSUPPORTED)]
+        for data, status in [*cases, (None, BlobText.FAILED)]:
+            with self.subTest(status=status):
+                blob = self.blob(data)
+                with self.assertLogs("api.extraction", "WARNING") if data is None else nullcontext():
+                    self.assertEqual(extraction.extract_blob(blob.pk), status)
+                text = BlobText.objects.get(pk=blob.pk)
+                self.assertEqual(text.status, status)
+                self.assertEqual(bool(text.error), status == BlobText.FAILED)
+        self.assertEqual(extraction.read_text(BlobText.objects.get(status=BlobText.EXTRACTED)), "plain words")
+
+    def test_extracted_blob_is_skipped_and_failed_one_retried(self):
+        done = self.blob(b"done")
+        extraction.extract_blob(done.pk)
+        with mock.patch.object(document_storage, "open") as open_:
+            self.assertEqual(extraction.extract_blob(done.pk), BlobText.EXTRACTED)
+        open_.assert_not_called()
+
+        failed = self.blob()
+        with self.assertLogs("api.extraction", "WARNING"):
+            self.assertEqual(extraction.extract_blob(failed.pk), BlobText.FAILED)
+        self.assertEqual(list(extraction.pending_blobs()), [])
+        self.assertEqual(list(extraction.pending_blobs(retry_failed=True)), [failed])
+
+        # The file turns up (e.g. storage was briefly unavailable): the next attempt succeeds.
+        with mock.patch.object(document_storage, "open", return_value=ContentFile(b"late", name="late")):
+            self.assertEqual(extraction.extract_blob(failed.pk), BlobText.EXTRACTED)
+        self.assertEqual(BlobText.objects.get(pk=failed.pk).error, "")
+
+    def test_failed_job_raises_so_the_worker_retries_it(self):
+        with self.assertRaises(extraction.ExtractionFailed), self.assertLogs("api.extraction", "WARNING"):
+            extraction.extract_document_text(self.blob().pk)
+        extraction.extract_document_text(self.blob(b"fine").pk)
+
+    def test_command_retries_failed_blobs_only_when_asked(self):
+        with self.assertLogs("api.extraction", "WARNING"):
+            extraction.extract_blob(self.blob().pk)
+        self.blob(b"new")
+        for args, expected in (([], "Would extract 1 blobs"), (["--retry-failed"], "Would extract 2 blobs")):
+            out = io.StringIO()
+            call_command("extract_documents", "--dry-run", *args, stdout=out)
+            self.assertEqual(out.getvalue().strip(), expected)
+
+
+# ------------------- Job Queue -------------------------
+@override_settings(JOBS={"KEY_PREFIX": "jobs-test"})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        try:
+            self.redis = jobs.get_redis()
+        except NotImplementedError:
+            self.skipTest("needs the django-redis cache backend")
+        self.key = uuid.uuid4().hex
+        self.addCleanup(self.redis.delete, jobs.redis_key("default", "ready"), jobs.redis_key("idem", self.key))
+
+    def payload(self):
+        return {"id": uuid.uuid4().hex, "queue": "default", "idempotency_key": self.key}
+
+    def test_duplicate_is_dropped(self):
+        self.assertTrue(jobs.push(self.payload()))
+        self.assertFalse(jobs.push(self.payload()))
+        self.assertEqual(self.redis.llen(jobs.redis_key("default", "ready")), 1)
+
+    def test_failed_push_releases_the_key(self):
+        self.redis.set(jobs.redis_key("default", "ready"), "not a list")
+        with self.assertRaises(ResponseError):
+            jobs.push(self.payload())
+        self.redis.delete(jobs.redis_key("default", "ready"))
+        self.assertTrue(jobs.push(self.payload()))
+
+    def test_redis_outage_after_commit_drops_the_job_quietly(self):
+        with mock.patch.object(jobs, "get_redis", side_effect=RedisError("down")), \
+                self.assertLogs("api.jobs", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue("api.extraction.extract_document_text", [1], idempotency_key=self.key)
+        self.assertTrue(jobs.push(self.payload()))
+
+    def test_revocation_warm_up_key_expires_in_minutes(self):
+        key = jobs.redis_key("idem", "revocation-warm")
+        self.addCleanup(self.redis.delete, key, revocation.WARM_KEY)
+        self.redis.delete(revocation.WARM_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(revocation.is_revoked(uuid.uuid4().hex))
+        self.assertTrue(0 < self.redis.ttl(key) <= revocation.get_config()["WARM_RETRY_SECONDS"])
+
+
+# ------------------- Task Filter Indexes -------------------------
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans need PostgreSQL")
+class TaskFilterIndexTests(TestCase):
+    """Every board filter in explain_task_filters.CASES is planned on the index meant for it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Several owners, each with a few projects and a team of assignees;
+        # mostly completed history with a small open set and little recent
+        # activity, like long-lived boards.
+        now = timezone.now()
+        members = User.objects.bulk_create(User(email=f"member{i}@example.com") for i in range(40))
+        owners = members[:10]
+        projects = Project.objects.bulk_create(
+            Project(name=f"board {i}", owner=owners[i % len(owners)]) for i in range(30)
+        )
+        Task.objects.bulk_create(
+            Task(project=projects[i % len(projects)], title=f"task {i}", is_completed=i % 10 != 0,
+                 assigned_to=members[i % 37] if i % 5 else None)
+            for i in range(20_000)
+        )
+        Task.objects.update(updated_at=now - timedelta(days=30))
+        Task.objects.filter(pk__in=Task.objects.order_by("-pk").values("pk")[:200]).update(updated_at=now)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE api_task")
+            cursor.execute("ANALYZE api_project")
+        cls.user = owners[0]
+        cls.project = projects[0].pk
+
+    def test_each_filter_uses_its_index(self):
+        recent = (timezone.now() - timedelta(minutes=5)).isoformat()
+        for params, intended in CASES:
+            params = {key: value.format(project=self.project, user=self.user.pk, recent=recent) for key, value in params.items()}
+            with self.subTest(params=params):
+                indexes, seq_scan = plan_indexes(ExplainTaskFilters().explain(self.user, params))
+                self.assertFalse(seq_scan)
+                self.assertIn(intended, indexes)
+
+
+# ------------------- Read Replicas -------------------------
+# A SQLite stand-in for a replica, registered before the test databases are
+# set up: it gets the schema but, unlike a TEST MIRROR, none of the primary's
+# rows, so what a request sees shows where it read.
+REPLICA = "replica_test"
+connections.settings.setdefault(REPLICA, connections.configure_settings({
+    DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+    REPLICA: {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+})[REPLICA])
+
+
+@override_settings(
+    READ_REPLICAS={"ENABLED": True, "ALIASES": [REPLICA], "PIN_SECONDS": 60, "CACHE_ALIAS": "default"},
+    RESPONSE_CACHE={"ENABLED": False},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """A TransactionTestCase, since reads inside a transaction stay on the primary."""
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="replica@example.com")
+        self.project = Project.objects.create(name="replicated", owner=self.owner)
+        self.client = api_client(self.owner)
+        self.addCleanup(caches["default"].delete, replicas.pin_key(self.owner.pk))
+
+    def project_names(self):
+        return [project["name"] for project in self.client.get("/api/projects/").json()["results"]]
+
+    def test_reads_move_to_the_primary_after_a_write(self):
+        self.assertEqual(self.project_names(), [])
+        response = self.client.post("/api/tasks/", {"project": self.project.pk, "title": "pins"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.project_names(), ["replicated"])
+
+    def test_redis_errors_fall_back_to_the_primary(self):
+        cache = caches["default"]
+        with mock.patch.object(cache, "get", side_effect=RedisError("down")), \
+                mock.patch.object(cache, "set", side_effect=RedisError("down")), \
+                self.assertLogs("api.replicas", "WARNING"):
+            self.assertIsNone(replicas.choose_replica(self.owner))
+            replicas.pin(self.owner)
@@ -0,0 +1,133 @@
+import fcntl
+import hashlib
+import mimetypes
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .models import Blob
+from .storage import document_storage
+
+
+def get_config():
+    return {
+        "STAGING_DIR": os.path.join(settings.PRIVATE_MEDIA_ROOT, "uploads"),
+        "MAX_PART_SIZE": 16 * 1024 * 1024,
+        "CHUNK_SIZE": 256 * 1024,
+        "X_ACCEL_REDIRECT": True,
+        "X_ACCEL_PREFIX": "/protected/",
+        **getattr(settings, "DOCUMENT_UPLOADS", {}),
+    }
+
+
+# ------------------- Chunked Uploads -------------------------
+def staging_path(upload):
+    return os.path.join(get_config()["STAGING_DIR"], f"{upload.pk}.part")
+
+
+def start_upload(upload):
+    os.makedirs(get_config()["STAGING_DIR"], exist_ok=True)
+    open(staging_path(upload), "wb").close()
+
+
+@contextmanager
+def locked_staging(upload):
+    """
+    Open the staged file under an exclusive lock, so only one request at a
+    time writes to or completes an upload. Doesn't wait: raises
+    ``BlockingIOError`` if another request holds the lock.
+    """
+    with open(staging_path(upload), "r+b") as staged:
+        fcntl.flock(staged, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        yield staged
+
+
+def is_linked(staged):
+    """
+    True once a completion has linked the staged file into the blob store
+    (see ``finish_upload``). Its bytes are a blob's from then on and must not
+    be written to, even if that completion rolled back.
+    """
+    return os.fstat(staged.fileno()).st_nlink > 1
+
+
+def write_part(staged, stream, offset, length):
+    """
+    Stream ``length`` bytes from ``stream`` into the staged file at
+    ``offset``, a chunk at a time. Anything left over from an interrupted
+    earlier attempt at this offset is overwritten.
+    Returns the SHA-256 hex digest of the part.
+    """
+    chunk_size = get_config()["CHUNK_SIZE"]
+    digest = hashlib.sha256()
+    remaining = length
+
+    staged.seek(offset)
+    staged.truncate()
+    while remaining > 0:
+        chunk = stream.read(min(chunk_size, remaining))
+        if not chunk:
+            raise IOError("Request body ended before Content-Length bytes were received")
+        staged.write(chunk)
+        digest.update(chunk)
+        remaining -= len(chunk)
+    staged.flush()
+
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """SHA-256 of a file, read in bounded-size chunks."""
+    chunk_size = get_config()["CHUNK_SIZE"]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def finish_upload(upload):
+    """
+    Link the staged file into the content-addressed store without copying
+    it. The staged copy is removed only once the surrounding transaction
+    commits, so a rollback leaves the upload intact to retry.
+    Returns ``(storage_name, sha256)``.
+    """
+    source = staging_path(upload)
+    sha256 = hash_file(source)
+    Blob.objects.lock(sha256)
+    name = document_storage.adopt_file(source, sha256)
+    transaction.on_commit(lambda: discard_upload(upload))
+    return name, sha256
+
+
+def discard_upload(upload):
+    try:
+        os.remove(staging_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+# ------------------- Downloads -------------------------
+def download_response(document):
+    """
+    Hand the transfer to nginx with ``X-Accel-Redirect`` so the worker is
+    released immediately; fall back to a streamed ``FileResponse`` when not
+    running behind nginx.
+    """
+    config = get_config()
+    # Blob names are bare hashes; name the download after the document instead.
+    filename = os.path.basename(document.name) or os.path.basename(document.file.name)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if config["X_ACCEL_REDIRECT"]:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{config['X_ACCEL_PREFIX']}{document.file.name}"
+        response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+        return response
+
+    return FileResponse(document.file.open("rb"), as_attachment=True, filename=filename, content_type=content_type)
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, ProjectViewSet, TaskViewSet, DocumentViewSet, CommentViewSet, TimelineViewSet, NotificationViewSet
+from .views import UserViewSet, ProjectViewSet, TaskViewSet, DocumentViewSet, CommentViewSet, TimelineViewSet, NotificationViewSet, MetricsViewSet, SearchViewSet, SyncViewSet
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -10,7 +12,26 @@ router.register(r'documents', DocumentViewSet, basename='documents')
 router.register(r'comments', CommentViewSet, basename='comment')
 router.register(r'timeline', TimelineViewSet, basename='timeline')
 router.register(r'notifications', NotificationViewSet, basename='notifications')
+router.register(r'_metrics', MetricsViewSet, basename='metrics')
+router.register(r'search', SearchViewSet, basename='search')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('api/', include(router.urls)),  
 ]
+
+# Under ASGI the hot read-only lists and login run as native async views (same URLs, same responses).
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import (
+        AsyncLoginView, AsyncNotificationListView, AsyncProjectListView, AsyncTaskListView, AsyncTimelineListView,
+        NotificationStreamView,
+    )
+
+    urlpatterns = [
+        path('api/users/login/', csrf_exempt(AsyncLoginView.as_view()), name='user-login'),
+        path('api/projects/', csrf_exempt(AsyncProjectListView.as_view()), name='project-list'),
+        path('api/tasks/', csrf_exempt(AsyncTaskListView.as_view()), name='task-list'),
+        path('api/timeline/', AsyncTimelineListView.as_view(), name='timeline-list'),
+        path('api/notifications/', AsyncNotificationListView.as_view(), name='notifications-list'),
+        path('api/notifications/stream/', NotificationStreamView.as_view(), name='notifications-stream'),
+    ] + urlpatterns
@@ -1,11 +1,27 @@
+from .event_sink import get_event_sink
+from .fanout import get_fanout
 from .models import TimelineEvent
 
 # ------------------- Event Logging -------------------------
-def log_event(project, user, event_type, description):
-    TimelineEvent.objects.create(
-        project=project,
-        user=user,
-        event_type=event_type,
-        description=description
+def log_event(project, user, event_type, description, notify=()):
+    """
+    Record a timeline event and notify the project owner about it. ``notify``
+    adds other user ids to tell (e.g. the task assignee); the acting user is
+    never notified of their own change.
+    """
+    log_events([(project, user, event_type, description, notify)])
+
+
+def log_events(events):
+    """Log several ``(project, user, event_type, description[, notify])`` events as one batch."""
+    events = [(*event, ()) if len(event) == 4 else tuple(event) for event in events]
+    get_event_sink().emit_many(
+        TimelineEvent(
+            project=project,
+            user=user,
+            event_type=event_type,
+            description=description
+        )
+        for project, user, event_type, description, _ in events
     )
-    
\ No newline at end of file
+    get_fanout().notify(events)
@@ -1,15 +1,24 @@
 from rest_framework import status, viewsets
-from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .serializers import UserSerializer, TokenSerializer, ProjectSerializer, TaskSerializer, DocumentSerializer, CommentSerializer, TimelineEventSerializer, NotificationSerializer
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .serializers import UserSerializer, ProjectSerializer, ProjectStatsSerializer, TaskSerializer, BulkTaskSerializer, DocumentSerializer, DocumentUploadSerializer, CommentSerializer, TimelineEventSerializer, NotificationSerializer, NotificationMarkReadSerializer, collect_ids
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets, permissions
-from .models import Project, Task, Document, Comment, TimelineEvent, Notification
+from .models import Project, Task, Document, DocumentUpload, Comment, TimelineEvent, Notification, task_counter_deltas
 from django.contrib.auth import get_user_model
-from .utils import log_event
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .utils import log_event, log_events
+from .instrumentation import connection_stats, route_histograms
+from .replicas import ReplicaReadMixin
+from .response_cache import CachedListMixin
+from . import jobs, login, project_stats, realtime, response_cache, search, sync, uploads
+from .revocation import RefreshToken
+from .storage import blob_name
 
 # ------------------- USER View ------------------------- 
 class UserViewSet(viewsets.ViewSet):
@@ -25,14 +34,13 @@ class UserViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def login(self, request):
-        email = request.data.get("email")
-        password = request.data.get("password")
-        user = authenticate(request, email=email, password=password)
+        try:
+            user = login.verify(request, request.data.get("email"), request.data.get("password"))
+        except login.LoginBusy as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
 
         if user:
-            serializer = TokenSerializer(data={"email": email, "password": password})
-            serializer.is_valid(raise_exception=True)
-            return Response(serializer.validated_data, status=status.HTTP_200_OK)
+            return Response(login.issue_tokens(user), status=status.HTTP_200_OK)
 
         return Response({"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
     
@@ -48,12 +56,41 @@ class UserViewSet(viewsets.ViewSet):
         
 
 # ------------------- PROJECT View ------------------------- 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(ReplicaReadMixin, CachedListMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated] 
 
+    def wants_stats(self):
+        return self.action == "stats" or self.request.query_params.get("stats") in ("1", "true")
+
+    def get_cache_scopes(self, request):
+        # Stats change with every task/comment/document write, none of which bump the user scope.
+        if self.wants_stats():
+            return None
+        return super().get_cache_scopes(request)
+
     def get_queryset(self):
-        return Project.objects.filter(owner=self.request.user)
+        queryset = Project.objects.filter(owner=self.request.user)
+        if self.wants_stats():
+            queryset = project_stats.with_stats(queryset, exact=self.request.query_params.get("exact") in ("1", "true"))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.wants_stats():
+            return ProjectStatsSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Dashboard stats for every project, a page at a time, from one query:
+        task and completed counts, completion ratio, documents, comments and
+        last activity. ``?exact=1`` computes them live instead of reading the
+        counters.
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        data = [{"id": project.pk, "name": project.name, **project_stats.stats_for(project)} for project in page]
+        return self.get_paginated_response(data)
 
     def perform_create(self, serializer):
         project = serializer.save(owner=self.request.user)
@@ -66,12 +103,74 @@ class ProjectViewSet(viewsets.ModelViewSet):
 
 
 # ------------------- TASK View ------------------------- 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # ?ordering= -> keyset pagination column; pages are always newest first.
+    ordering_fields = {"-created_at": "created_at", "-updated_at": "updated_at"}
+
+    @property
+    def cursor_field(self):
+        ordering = self.request.query_params.get("ordering", "-created_at")
+        if ordering not in self.ordering_fields:
+            raise ValidationError({"ordering": f"Expected one of: {', '.join(self.ordering_fields)}"})
+        return self.ordering_fields[ordering]
 
     def get_queryset(self):
-        return Task.objects.filter(project__owner=self.request.user)
+        queryset = Task.objects.filter(project__owner=self.request.user)
+        if self.action == "list":
+            queryset = self.filter_tasks(queryset, self.request.query_params)
+        return queryset
+
+    def filter_tasks(self, queryset, params):
+        """
+        Board filters: ``project``, ``assigned_to`` (a user id, ``me`` or
+        ``none``), ``is_completed`` and ``updated_since`` (ISO 8601). Each
+        combination is served by one of the indexes in ``Task.Meta``; see
+        ``manage.py explain_task_filters``.
+        """
+        errors = {}
+        if "project" in params:
+            try:
+                queryset = queryset.filter(project_id=int(params["project"]))
+            except ValueError:
+                errors["project"] = "Expected a project id"
+
+        if "assigned_to" in params:
+            assignee = params["assigned_to"]
+            if assignee == "me":
+                queryset = queryset.filter(assigned_to=self.request.user)
+            elif assignee == "none":
+                queryset = queryset.filter(assigned_to__isnull=True)
+            elif assignee.isdigit():
+                queryset = queryset.filter(assigned_to_id=int(assignee))
+            else:
+                errors["assigned_to"] = "Expected a user id, 'me' or 'none'"
+
+        if "is_completed" in params:
+            value = params["is_completed"].lower()
+            if value in ("true", "1"):
+                queryset = queryset.filter(is_completed=True)
+            elif value in ("false", "0"):
+                queryset = queryset.filter(is_completed=False)
+            else:
+                errors["is_completed"] = "Expected true or false"
+
+        if "updated_since" in params:
+            try:
+                since = parse_datetime(params["updated_since"])
+            except ValueError:  # well-formed but out of range, e.g. month 13
+                since = None
+            if since is None:
+                errors["updated_since"] = "Expected an ISO 8601 datetime"
+            else:
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+                queryset = queryset.filter(updated_at__gte=since)
+
+        if errors:
+            raise ValidationError(errors)
+        return queryset
 
     def perform_create(self, serializer):
         task = serializer.save()
@@ -79,7 +178,8 @@ class TaskViewSet(viewsets.ModelViewSet):
             task.project,
             self.request.user,
             "task_created",
-            f"Task '{task.title}' was created"
+            f"Task '{task.title}' was created",
+            notify=[task.assigned_to_id]
         )
 
     @action(detail=True, methods=['post'], url_path='assign')
@@ -102,18 +202,142 @@ class TaskViewSet(viewsets.ModelViewSet):
                 task.project,
                 self.request.user,
                 "task_updated",
-                f"Task '{task.title}' was assigned to {user.email}"
+                f"Task '{task.title}' was assigned to {user.email}",
+                notify=[user.pk]
             )
 
             return Response({"detail": "Task assigned successfully"}, status=status.HTTP_200_OK)
         except Task.DoesNotExist:
             return Response({"detail": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # ---- bulk endpoints ----
+    bulk_max_items = 5000
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return None, Response({"detail": "Expected a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return None, Response(
+                {"detail": f"At most {self.bulk_max_items} items per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return items, None
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        items, error = self.get_bulk_items(request)
+        if error:
+            return error
+        if request.method == 'PATCH':
+            return self.bulk_update_tasks(request, items)
+        return self.bulk_create_tasks(request, items)
+
+    def bulk_create_tasks(self, request, items):
+        serializer = BulkTaskSerializer(many=True, context=self.get_serializer_context())
+        valid, errors = serializer.validate_items(items)
+
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create([Task(**attrs) for _, attrs in valid])
+            Project.objects.adjust_counters(task_counter_deltas((None, task.counted_state()) for task in tasks))
+            response_cache.bump("project", *(task.project_id for task in tasks))
+            log_events(
+                (task.project, request.user, "task_created", f"Task '{task.title}' was created", [task.assigned_to_id])
+                for task in tasks
+            )
+
+        return Response(
+            {"created": TaskSerializer(tasks, many=True).data, "errors": errors},
+            status=status.HTTP_201_CREATED if tasks else status.HTTP_400_BAD_REQUEST
+        )
+
+    def bulk_update_tasks(self, request, items):
+        serializer = BulkTaskSerializer(many=True, partial=True, context=self.get_serializer_context())
+        valid, errors = serializer.validate_items(items)
+        tasks = self.get_queryset().select_related("project").in_bulk(collect_ids(items, "id"))
+
+        updated, fields = {}, {"updated_at"}
+        now = timezone.now()
+        for index, attrs in valid:
+            task_id = collect_ids([items[index]], "id")
+            task = tasks.get(task_id.pop()) if task_id else None
+            if task is None:
+                errors.append({"index": index, "errors": {"id": ["Task not found."]}})
+                continue
+            for field, value in attrs.items():
+                setattr(task, field, value)
+                fields.add(field)
+            task.updated_at = now
+            updated[task.pk] = task
+
+        with transaction.atomic():
+            Task.objects.bulk_update(updated.values(), fields)
+            Project.objects.adjust_counters(
+                task_counter_deltas((task._counted, task.counted_state()) for task in updated.values())
+            )
+            response_cache.bump("project", *(task.project_id for task in updated.values()))
+            log_events(
+                (task.project, request.user, "task_updated", f"Task '{task.title}' was updated", [task.assigned_to_id])
+                for task in updated.values()
+            )
+
+        errors.sort(key=lambda error: error["index"])
+        return Response(
+            {"updated": TaskSerializer(updated.values(), many=True).data, "errors": errors},
+            status=status.HTTP_200_OK if updated else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, methods=['post'], url_path='bulk/assign')
+    def bulk_assign(self, request):
+        items, error = self.get_bulk_items(request)
+        if error:
+            return error
+
+        User = get_user_model()
+        tasks = self.get_queryset().select_related("project").in_bulk(collect_ids(items, "task"))
+        users = User.objects.in_bulk(collect_ids(items, "user_id"))
+
+        assigned, errors = {}, []
+        now = timezone.now()
+        for index, item in enumerate(items):
+            task_id = collect_ids([item], "task")
+            user_id = collect_ids([item], "user_id")
+            if not task_id or not user_id:
+                errors.append({"index": index, "errors": {"detail": ["task and user_id are required"]}})
+                continue
+            task, user = tasks.get(task_id.pop()), users.get(user_id.pop())
+            if task is None:
+                errors.append({"index": index, "errors": {"task": ["Task not found"]}})
+                continue
+            if user is None:
+                errors.append({"index": index, "errors": {"user_id": ["User not found"]}})
+                continue
+            task.assigned_to = user
+            task.updated_at = now
+            assigned[task.pk] = task
+
+        with transaction.atomic():
+            Task.objects.bulk_update(assigned.values(), ["assigned_to", "updated_at"])
+            response_cache.bump("project", *(task.project_id for task in assigned.values()))
+            log_events(
+                (
+                    task.project, request.user, "task_updated",
+                    f"Task '{task.title}' was assigned to {task.assigned_to.email}", [task.assigned_to_id]
+                )
+                for task in assigned.values()
+            )
+
+        return Response(
+            {"assigned": list(assigned), "errors": errors},
+            status=status.HTTP_200_OK if assigned else status.HTTP_400_BAD_REQUEST
+        )
         
 
 # ------------------- DOCUMENT View ------------------------- 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_field = "uploaded_at"
 
     def get_queryset(self):
         return Document.objects.filter(project__owner=self.request.user)
@@ -127,15 +351,142 @@ class DocumentViewSet(viewsets.ModelViewSet):
             f"Document '{doc.name}' uploaded"
         )
 
+    @action(detail=True, methods=['get'], url_path='download')
+    def download(self, request, pk=None):
+        return uploads.download_response(self.get_object())
+
+    # ---- resumable chunked uploads ----
+    # POST uploads/ -> GET|PUT uploads/<id>/ (Upload-Offset header, raw body) -> POST uploads/<id>/complete/
+    def get_upload(self, request, upload_id):
+        return DocumentUpload.objects.filter(pk=upload_id, uploaded_by=request.user).first()
+
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def start_upload(self, request):
+        serializer = DocumentUploadSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        sha256 = serializer.validated_data.pop("sha256", None)
+
+        # Skip the transfer when this user already stored identical bytes. Limited to the
+        # user's own blobs so a bare hash can't be used to claim someone else's file.
+        if sha256 and Document.objects.filter(blob_id=sha256, project__owner=request.user).exists():
+            data = serializer.validated_data
+            doc = Document.objects.create(
+                project=data["project"],
+                uploaded_by=request.user,
+                file=blob_name(sha256),
+                name=data["name"],
+                description=data.get("description", ""),
+            )
+            log_event(
+                doc.project,
+                request.user,
+                "document_uploaded",
+                f"Document '{doc.name}' uploaded"
+            )
+            return Response({"deduplicated": True, "document": DocumentSerializer(doc).data}, status=status.HTTP_201_CREATED)
+
+        upload = serializer.save(uploaded_by=request.user)
+        uploads.start_upload(upload)
+        return Response(DocumentUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'put'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})')
+    def upload_part(self, request, upload_id=None):
+        upload = self.get_upload(request, upload_id)
+        if not upload:
+            return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'GET':
+            return Response(DocumentUploadSerializer(upload).data, status=status.HTTP_200_OK)
+
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+            length = int(request.headers.get("Content-Length", ""))
+        except ValueError:
+            return Response({"detail": "Upload-Offset and Content-Length headers are required"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < length <= uploads.get_config()["MAX_PART_SIZE"]:
+            return Response({"detail": "Invalid part size"}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size is not None and offset + length > upload.size:
+            return Response({"detail": "Part exceeds declared size"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only the staged file is locked while the body streams in. The row is
+        # advanced afterwards with a conditional UPDATE, so no transaction or
+        # row lock is held for as long as the client takes to send the part.
+        try:
+            with uploads.locked_staging(upload) as staged:
+                received_bytes = DocumentUpload.objects.filter(pk=upload.pk).values_list("received_bytes", flat=True).first()
+                if received_bytes is None:
+                    return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+                if offset != received_bytes or uploads.is_linked(staged):
+                    return Response({"detail": "Offset mismatch", "received_bytes": received_bytes}, status=status.HTTP_409_CONFLICT)
+                try:
+                    part_sha256 = uploads.write_part(staged, request.stream, offset, length)
+                except IOError:
+                    return Response({"detail": "Incomplete part", "received_bytes": received_bytes}, status=status.HTTP_400_BAD_REQUEST)
+                advanced = DocumentUpload.objects.filter(pk=upload.pk, received_bytes=offset).update(
+                    received_bytes=offset + length, updated_at=timezone.now()
+                )
+        except BlockingIOError:
+            return Response({"detail": "Another part of this upload is being written"}, status=status.HTTP_409_CONFLICT)
+        except FileNotFoundError:
+            return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not advanced:
+            return Response({"detail": "Offset mismatch"}, status=status.HTTP_409_CONFLICT)
+
+        return Response({"received_bytes": offset + length, "part_sha256": part_sha256}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})/complete')
+    def complete_upload(self, request, upload_id=None):
+        upload = self.get_upload(request, upload_id)
+        if not upload:
+            return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if upload.received_bytes == 0 or (upload.size is not None and upload.received_bytes != upload.size):
+            return Response({"detail": "Upload is incomplete", "received_bytes": upload.received_bytes}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Parts take the same lock, so the staged bytes can't change while they're
+        # hashed. The staged file is linked (not moved) into the blob store and
+        # only removed once the Document has committed.
+        try:
+            with uploads.locked_staging(upload):
+                with transaction.atomic():
+                    if not DocumentUpload.objects.filter(pk=upload.pk, received_bytes=upload.received_bytes).delete()[0]:
+                        return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+                    name, sha256 = uploads.finish_upload(upload)
+                    doc = Document.objects.create(
+                        project=upload.project,
+                        uploaded_by=request.user,
+                        file=name,
+                        name=upload.name,
+                        description=upload.description,
+                    )
+                    log_event(
+                        doc.project,
+                        request.user,
+                        "document_uploaded",
+                        f"Document '{doc.name}' uploaded"
+                    )
+        except BlockingIOError:
+            return Response({"detail": "A part of this upload is still being written"}, status=status.HTTP_409_CONFLICT)
+        except FileNotFoundError:
+            return Response({"detail": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = DocumentSerializer(doc).data
+        data["sha256"] = sha256
+        return Response(data, status=status.HTTP_201_CREATED)
+
 # ------------------- COMMENT View ------------------------- 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         task_id = self.request.query_params.get('task')
         project_id = self.request.query_params.get('project')
-        queryset = Comment.objects.all()
+        # CommentSerializer.user renders User.__str__ (the email); join it instead of one query per row.
+        # Only comments in the user's own projects, directly or through a task.
+        owned = Project.objects.filter(owner=self.request.user).values('id')
+        queryset = Comment.objects.filter(Q(project__in=owned) | Q(task__project__in=owned))
+        queryset = queryset.select_related('user').only(
+            'id', 'project', 'task', 'content', 'created_at', 'updated_at', 'user__email'
+        )
 
         if task_id:
             queryset = queryset.filter(task__id=task_id)
@@ -151,23 +502,34 @@ class CommentViewSet(viewsets.ModelViewSet):
             project,
             self.request.user,
             "comment_added",
-            f"Comment added: '{comment.content[:50]}'"
+            f"Comment added: '{comment.content[:50]}'",
+            notify=[comment.task.assigned_to_id] if comment.task_id else ()
         )
 
 # ------------------- TIMELINE View ------------------------- 
-class TimelineViewSet(viewsets.ReadOnlyModelViewSet):
+class TimelineViewSet(ReplicaReadMixin, CachedListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TimelineEventSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_cache_scopes(self, request):
+        project_id = request.query_params.get("project")
+        return [("project", project_id)] if project_id else None
+
     def get_queryset(self):
         project_id = self.request.query_params.get("project")
         if not project_id:
             return TimelineEvent.objects.none()
         
-        return TimelineEvent.objects.filter(project__id=project_id).order_by('-created_at')
+        # TimelineEventSerializer.user renders the email; fetch it in the same query.
+        return (
+            TimelineEvent.objects.filter(project__id=project_id, project__owner=self.request.user)
+            .select_related('user')
+            .only('id', 'project', 'event_type', 'description', 'created_at', 'user__email')
+            .order_by('-created_at')
+        )
 
 # ------------------- NOTIFICATION View ------------------------- 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(ReplicaReadMixin, CachedListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -176,11 +538,98 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=True, methods=['put'], url_path='mark_read')
     def mark_read(self, request, pk=None):
-        notification = self.get_object()  
+        # A single UPDATE scoped to the user instead of fetch + full save().
+        try:
+            updated = Notification.objects.mark_read(request.user, ids=[int(pk)])
+        except ValueError:
+            raise NotFound
+        if not updated:
+            self.get_object()  # 404 unless it exists and was already read
 
-        if notification.user != request.user:
-            return Response({"detail": "Not allowed."}, status=status.HTTP_403_FORBIDDEN)
-        
-        notification.is_read = True
-        notification.save()
+        # Queryset updates skip post_save, so invalidate the cached list here.
+        response_cache.bump("user", request.user.pk)
         return Response({"message": "Notification marked as read."}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='mark_read')
+    def mark_read_bulk(self, request):
+        serializer = NotificationMarkReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = Notification.objects.mark_read(request.user, ids=serializer.validated_data["ids"])
+        response_cache.bump("user", request.user.pk)
+        return Response({"updated": updated, "unread": self.get_unread_count()}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='mark_all_read')
+    def mark_all_read(self, request):
+        updated = Notification.objects.mark_read(request.user)
+        response_cache.bump("user", request.user.pk)
+        return Response({"updated": updated, "unread": self.get_unread_count()}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='stream/ticket')
+    def stream_ticket(self, request):
+        # EventSource can't set headers: clients open /api/notifications/stream/?ticket=<ticket> instead.
+        return Response({"ticket": realtime.issue_ticket(request.auth)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='unread_count')
+    def unread_count(self, request):
+        return Response({"unread": self.get_unread_count()}, status=status.HTTP_200_OK)
+
+    def get_unread_count(self):
+        # Primary-key read of the denormalized counter; never counts notification rows.
+        return (
+            get_user_model().objects.filter(pk=self.request.user.pk)
+            .values_list("unread_notification_count", flat=True).first() or 0
+        )
+
+# ------------------- METRICS View ------------------------- 
+class MetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response(route_histograms.snapshot(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def jobs(self, request):
+        return Response(jobs.queue_depths(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def db(self, request):
+        return Response(connection_stats(), status=status.HTTP_200_OK)
+
+# ------------------- SEARCH View ------------------------- 
+class SearchViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"detail": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        types = [t for t in request.query_params.get("type", "").split(",") if t] or None
+        unknown = set(types or ()) - set(search.SEARCHABLE)
+        if unknown:
+            return Response(
+                {"detail": f"Unknown type: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", 0)) or None
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search.search(request.user, text, types=types, limit=limit)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+# ------------------- SYNC View ------------------------- 
+class SyncViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            payload = sync.changes(request.user, request.query_params.get("since"), {"request": request})
+        except sync.InvalidToken as exc:
+            return Response({"since": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except sync.ExpiredToken as exc:
+            return Response({"detail": str(exc), "reset": True}, status=status.HTTP_410_GONE)
+        return Response(payload, status=status.HTTP_200_OK)
@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# SERVER_MODE=asgi runs the Django ASGI app under uvicorn workers so the
+# async list views and middleware don't hold a thread per request;
+# SERVER_MODE=wsgi keeps the classic threaded WSGI workers for comparison.
+server_mode = os.getenv("SERVER_MODE", "asgi")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+accesslog = None
+
+if server_mode == "asgi":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "projectmanagement.asgi:application"
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", 4))
+    wsgi_app = "projectmanagement.wsgi:application"